@@ -1,23 +1,97 @@
 import os
 import uuid
-import threading
+import shutil
 import time
 import urllib.parse
-from flask import Flask, request, render_template, jsonify, send_file
+from flask import Flask, request, render_template, jsonify, Response
 from werkzeug.utils import secure_filename
 from config import config
 from utils.file_utils import FileUtils
 from utils.compression import CompressionHandler
 from utils.image_processor import ImageProcessor
 from utils.pdf_generator import PDFGenerator
+from utils.file_sender import FileSender
+from utils.zip_packager import ZipStream
+from utils.checkpoint import TaskCheckpoint
+from utils.batch_executor import PipelinedBatchExecutor
+from utils.album_cache import get_album_cache
+from utils.single_flight import SingleFlight
+from utils.page_pipeline import PageConvertPipeline
+from utils.task_store import SharedTaskStore
+from utils.worker_lifecycle import task_tracker
+from utils.metrics import metrics, SystemMetrics
+from utils.memory_budget import get_memory_budget
+from utils.artifact_index import ArtifactIndex, ArtifactJanitor, path_size
+from utils.disk_budget import DiskBudget
+from utils.scratch_pool import ScratchPool
+from utils.extraction_guard import ExtractionGuard, ResourceLimitExceeded
+from utils.stored_members import StoredMemberIndex
+from utils.archive_index import ArchiveIndex, ThumbnailCache, make_thumbnail
 
 # 创建Flask应用
 app = Flask(__name__)
 app.config.from_object(config['default'])
 
-# 全局变量存储处理状态
-processing_status = {}
-processing_results = {}
+# 结果文件发送器（支持X-Accel-Redirect / X-Sendfile卸载）
+file_sender = FileSender.from_config(app.config)
+
+# 全局变量存储处理状态（多个工作进程之间通过状态文件共享）
+processing_status = SharedTaskStore('processing_status', app.config['TASK_STATE_FOLDER'])
+processing_results = SharedTaskStore('processing_results', app.config['TASK_STATE_FOLDER'])
+
+# 任务产物索引和后台清理（有检查点的任务正在执行，其产物不会被清理）
+artifact_janitor = ArtifactJanitor.from_config(
+    app.config,
+    is_pinned=lambda task_id: TaskCheckpoint.exists(task_id, app.config['CHECKPOINT_FOLDER'])
+)
+artifact_index = artifact_janitor.index
+
+def release_task_state(task_id, *stores):
+    """任务结束后将最终状态写入文件并移出内存，状态文件作为产物登记，按保留时间清理"""
+    for store in stores:
+        state_path = store.release(task_id)
+        if state_path:
+            artifact_index.register(state_path, task_id, ArtifactIndex.KIND_STATE, os.path.getsize(state_path))
+
+def touch_artifacts(file_paths):
+    """记录结果文件所在目录被访问（延长保留时间）"""
+    for directory in {os.path.dirname(path) for path in file_paths}:
+        artifact_index.touch(directory)
+
+# 磁盘空间预留（任务开始写入前按估算的峰值占用预留）
+disk_budget = DiskBudget.from_config(app.config)
+
+def disk_full_response(amounts):
+    """
+    磁盘空间不足时的响应（507 Insufficient Storage）
+
+    Args:
+        amounts: 各卷需要的字节数 {路径: 字节数}
+    """
+    required_bytes = sum(amounts.values())
+    return jsonify({
+        'error': f'磁盘空间不足，任务预计需要 {required_bytes / (1024 * 1024):.1f} MB',
+        'required_bytes': required_bytes,
+        'available_bytes': max(0, min(disk_budget.available(path) for path in amounts))
+    }), 507
+
+def reserve_disk_space(task_id, amounts, on_wait=None):
+    """为任务在各卷上预留磁盘空间 {路径: 字节数}，空间不足时等待（最长 DISK_WAIT_TIMEOUT 秒）"""
+    return disk_budget.reserve(
+        task_id, amounts,
+        timeout=app.config.get('DISK_WAIT_TIMEOUT', 1800),
+        on_wait=on_wait
+    )
+
+def record_disk_written(task_id, *paths):
+    """报告任务目录已占用的空间，预留中只保留尚未写入的部分"""
+    disk_budget.update_written(task_id, {path: path_size(path) for path in paths if os.path.exists(path)})
+
+# 临时工作目录池（按任务估算大小选择tmpfs或大容量磁盘）
+scratch_pool = ScratchPool.from_config(app.config)
+
+# 合并相同的进行中任务（相同JM漫画或相同压缩包），后提交的请求直接使用正在执行的任务（多个工作进程共用）
+inflight_jobs = SingleFlight.from_config(app.config)
 
 class ProcessingTask:
     """处理任务类"""
@@ -46,8 +120,28 @@ class ProcessingTask:
             'error': self.error
         }
 
-def process_compressed_file(task_id, file_path, output_dir):
-    """处理压缩文件的主函数"""
+def estimate_archive_footprint(file_path):
+    """从压缩包元数据估算处理时的磁盘占用峰值（无法读取元数据时返回None）"""
+    return CompressionHandler().estimate_disk_footprint(
+        file_path,
+        convert_ratio=app.config.get('DISK_CONVERT_RATIO', 3.0),
+        nested_ratio=app.config.get('DISK_NESTED_ARCHIVE_RATIO', 2.0)
+    )
+
+def archive_disk_amounts(footprint, temp_dir, output_dir):
+    """压缩包任务各卷的预留大小：解压和转换在临时目录所在的卷，PDF在输出目录所在的卷"""
+    return {temp_dir: footprint['scratch_bytes'], output_dir: footprint['output_bytes']}
+
+def process_compressed_file(task_id, file_path, output_dir, footprint=None):
+    """
+    处理压缩文件的主函数（支持从检查点恢复）
+    
+    Args:
+        task_id: 任务ID
+        file_path: 上传的压缩包路径
+        output_dir: 输出目录
+        footprint: 估算的磁盘占用（None时在这里从压缩包元数据估算）
+    """
     task = ProcessingTask(task_id)
     processing_status[task_id] = {
         'status': '等待开始',
@@ -56,55 +150,92 @@ def process_compressed_file(task_id, file_path, output_dir):
         'error': None
     }
     
+    # 记录已完成的阶段，进程重启后可以继续
+    checkpoint = TaskCheckpoint.load_or_create(
+        task_id,
+        app.config['CHECKPOINT_FOLDER'],
+        TaskCheckpoint.KIND_ARCHIVE,
+        {'file_path': file_path, 'output_dir': output_dir}
+    )
+    
     try:
-        # 步骤1: 创建临时目录
-        task.update_status("创建临时目录", 5, "初始化")
-        temp_dir = os.path.join(app.config['TEMP_FOLDER'], f"temp_{task_id}")
-        os.makedirs(temp_dir, exist_ok=True)
-        
-        # 步骤2: 递归解压
-        task.update_status("开始解压文件", 10, "解压")
-        compression_handler = CompressionHandler()
-        compression_handler.set_status_callback(
-            lambda msg, prog=None: task.update_status(msg, prog, "解压")
-        )
-        
-        extracted_files = compression_handler.recursive_extract(file_path, temp_dir)
+        if footprint is None and os.path.exists(file_path):
+            footprint = estimate_archive_footprint(file_path)
         
-        if not extracted_files:
-            task.update_status("解压失败，没有找到文件", 100, "错误")
-            task.error = "解压失败，没有找到文件"
+        # 步骤1: 创建临时目录（按估算大小选择临时目录所在的卷，恢复时使用原来的目录）
+        task.update_status("创建临时目录", 5, "初始化")
+        temp_dir = checkpoint.params.get('temp_dir')
+        if temp_dir:
+            os.makedirs(temp_dir, exist_ok=True)
+        else:
+            temp_dir = scratch_pool.allocate(task_id, footprint['scratch_bytes'] if footprint else 0)
+            checkpoint.params['temp_dir'] = temp_dir
+            checkpoint.save()
+        artifact_index.register(temp_dir, task_id, ArtifactIndex.KIND_TEMP)
+        
+        # 开始解压前在临时目录和输出目录所在的卷上预留磁盘空间，空间不足时等待其他任务完成
+        if footprint and not reserve_disk_space(
+            task_id, archive_disk_amounts(footprint, temp_dir, output_dir),
+            on_wait=lambda available: task.update_status("磁盘空间不足，等待其他任务完成", 0, "等待磁盘空间")
+        ):
+            task.error = "磁盘空间不足"
+            task.update_status("磁盘空间不足，任务已取消", 100, "错误")
             return
         
-        task.update_status(f"解压完成，找到 {len(extracted_files)} 个文件", 30, "解压完成")
-        
-        # 步骤3: 收集和排序图片
-        task.update_status("收集图片文件", 40, "图片处理")
         image_processor = ImageProcessor()
         image_processor.set_status_callback(
             lambda msg, prog=None: task.update_status(msg, prog, "图片处理")
         )
         
-        image_groups = image_processor.collect_and_sort_images(temp_dir)
-        
-        if not image_groups:
-            task.update_status("没有找到图片文件", 100, "错误")
-            task.error = "没有找到图片文件"
-            return
-        
-        task.update_status(f"找到 {len(image_groups)} 个包含图片的文件夹", 50, "图片收集完成")
-        
-        # 步骤4: 处理图片
-        task.update_status("处理图片文件", 60, "图片优化")
-        processed_image_groups = {}
-        for folder_path, image_paths in image_groups.items():
-            processed_images = image_processor.process_image_group(image_paths, temp_dir)
-            processed_image_groups[folder_path] = processed_images
-        
-        task.update_status("图片处理完成", 70, "图片处理完成")
-        
-        # 步骤5: 生成PDF
-        task.update_status("生成PDF文件", 80, "PDF生成")
+        image_groups = checkpoint.get_stage(TaskCheckpoint.STAGE_EXTRACTED)
+        stored_members = None
+        if image_groups and os.path.isdir(temp_dir):
+            if checkpoint.params.get('stored_members'):
+                stored_members = StoredMemberIndex.from_dict(checkpoint.params['stored_members'])
+            task.update_status("从检查点恢复，跳过解压", 50, "图片收集完成")
+        else:
+            # 步骤2: 递归解压
+            task.update_status("开始解压文件", 10, "解压")
+            compression_handler = CompressionHandler(
+                ExtractionGuard.from_config(app.config),
+                zip_workers=app.config.get('ZIP_EXTRACT_WORKERS'),
+                zip_parallel_min_bytes=app.config.get('ZIP_PARALLEL_MIN_BYTES', 16 * 1024 * 1024),
+                reference_stored=app.config.get('ZIP_REFERENCE_STORED', False)
+            )
+            compression_handler.set_status_callback(
+                lambda msg, prog=None: task.update_status(msg, prog, "解压")
+            )
+            
+            extracted_files = compression_handler.recursive_extract(file_path, temp_dir)
+            
+            if not extracted_files:
+                task.update_status("解压失败，没有找到文件", 100, "错误")
+                task.error = "解压失败，没有找到文件"
+                return
+            
+            task.update_status(f"解压完成，找到 {len(extracted_files)} 个文件", 30, "解压完成")
+            
+            # 步骤3: 收集和排序图片
+            task.update_status("收集图片文件", 40, "图片处理")
+            # 未压缩存储的JPEG没有写入临时目录，生成PDF时从上传的压缩包直接读取
+            stored_members = compression_handler.stored_members
+            image_groups = image_processor.collect_and_sort_images(
+                temp_dir, extra_files=stored_members.paths() if stored_members else None
+            )
+            
+            if not image_groups:
+                task.update_status("没有找到图片文件", 100, "错误")
+                task.error = "没有找到图片文件"
+                return
+            
+            if stored_members:
+                checkpoint.params['stored_members'] = stored_members.to_dict()
+            checkpoint.mark_stage(TaskCheckpoint.STAGE_EXTRACTED, image_groups)
+            record_disk_written(task_id, temp_dir)
+            task.update_status(f"找到 {len(image_groups)} 个包含图片的文件夹", 50, "图片收集完成")
+        
+        # 步骤4/5: 逐个文件夹处理图片并生成PDF，每个PDF生成后立即可下载
+        task.update_status("处理图片并生成PDF", 60, "PDF生成")
         pdf_generator = PDFGenerator()
         pdf_generator.set_status_callback(
             lambda msg, prog=None: task.update_status(msg, prog, "PDF生成")
@@ -113,48 +244,86 @@ def process_compressed_file(task_id, file_path, output_dir):
         # 创建PDF输出目录
         pdf_output_dir = os.path.join(output_dir, f"pdfs_{task_id}")
         os.makedirs(pdf_output_dir, exist_ok=True)
+        artifact_index.register(pdf_output_dir, task_id, ArtifactIndex.KIND_OUTPUT)
         
-        # 生成PDF
-        generated_pdfs = pdf_generator.generate_pdfs_by_folder(
-            processed_image_groups, 
-            pdf_output_dir,
-            base_name="converted"
+        # 先登记结果集，PDF生成后逐个加入
+        result = {'pdf_files': [], 'complete': False}
+        processing_results[task_id] = result
+        pdf_generator.set_pdf_callback(
+            lambda folder_name, pdf_path: result['pdf_files'].append(pdf_path)
         )
         
+        generated_pdfs = {}
+        total_groups = len(image_groups)
+        for i, (folder_path, image_paths) in enumerate(image_groups.items()):
+            folder_state = checkpoint.get_folder(folder_path)
+            
+            # 该文件夹的PDF已在上次运行中生成
+            if folder_state.get('pdf') and os.path.exists(folder_state['pdf']):
+                generated_pdfs[folder_path] = folder_state['pdf']
+                result['pdf_files'].append(folder_state['pdf'])
+                continue
+            
+            task.update_status(f"处理文件夹 {i + 1}/{total_groups}", 60 + int(30 * i / total_groups), "图片优化")
+            processed_images = folder_state.get('images')
+            if not processed_images or not all(
+                    os.path.exists(p) or (stored_members and p in stored_members) for p in processed_images):
+                # 每个文件夹单独的转换目录，避免不同文件夹的同名图片互相覆盖
+                converted_dir = os.path.join(temp_dir, '_converted', str(i))
+                os.makedirs(converted_dir, exist_ok=True)
+                processed_images = image_processor.process_image_group(
+                    image_paths, converted_dir, passthrough=stored_members
+                )
+                checkpoint.set_folder_images(folder_path, processed_images)
+            
+            folder_pdfs = pdf_generator.generate_pdfs_by_folder(
+                {folder_path: processed_images},
+                pdf_output_dir,
+                base_name="converted",
+                stored_members=stored_members
+            )
+            for pdf_path in folder_pdfs.values():
+                generated_pdfs[folder_path] = pdf_path
+                checkpoint.set_folder_pdf(folder_path, pdf_path)
+            record_disk_written(task_id, temp_dir, pdf_output_dir)
+        
         if not generated_pdfs:
             task.update_status("PDF生成失败", 100, "错误")
             task.error = "PDF生成失败"
             return
         
-        task.update_status(f"成功生成 {len(generated_pdfs)} 个PDF文件", 90, "PDF生成完成")
-        
-        # 步骤6: 打包结果
-        task.update_status("打包结果文件", 95, "打包")
-        zip_output_path = os.path.join(output_dir, f"result_{task_id}.zip")
-        
-        if pdf_generator.create_pdf_package(list(generated_pdfs.values()), zip_output_path):
-            task.result_files = [zip_output_path]
-            task.update_status("处理完成", 100, "完成")
-        else:
-            task.update_status("打包失败", 100, "错误")
-            task.error = "打包失败"
-        
-        # 存储结果
-        processing_results[task_id] = {
-            'pdf_files': list(generated_pdfs.values()),
-            'zip_file': zip_output_path if os.path.exists(zip_output_path) else None
-        }
-        
+        # 完整ZIP包在下载时由PDF文件按需生成，不在任务中提前打包
+        artifact_index.register(
+            pdf_output_dir, task_id, ArtifactIndex.KIND_OUTPUT,
+            sum(os.path.getsize(p) for p in generated_pdfs.values() if os.path.exists(p))
+        )
+        result['complete'] = True
+        task.result_files = list(generated_pdfs.values())
+        task.update_status("处理完成", 100, "完成")
+        
+    except ResourceLimitExceeded as e:
+        # 疑似压缩炸弹：立即停止，已解压的文件在下面删除
+        task.error = f"压缩包超出资源限制: {e}"
+        task.update_status(task.error, 100, "错误")
     except Exception as e:
         task.update_status(f"处理失败: {str(e)}", 100, "错误")
         task.error = str(e)
     finally:
+        # 任务正常结束或失败时删除检查点；进程崩溃时不会执行到这里，检查点和文件都会保留
+        checkpoint.remove()
+        inflight_jobs.release(task_id)
+        disk_budget.release(task_id)
+        scratch_pool.release(task_id)
+        release_task_state(task_id, processing_status, processing_results)
+        
         # 清理临时文件（保留输出文件供下载）
         try:
             # 清理上传文件和临时解压目录
             FileUtils.safe_remove(file_path)  # 删除上传的原始文件
             if 'temp_dir' in locals():
                 FileUtils.safe_remove(temp_dir)  # 删除临时解压目录
+            # 更新保留下来的产物（输出目录、失败时的部分结果）的实际大小
+            artifact_index.refresh_sizes(task_id)
         except Exception as cleanup_error:
             print(f"清理临时文件失败: {cleanup_error}")
 
@@ -176,6 +345,8 @@ def dashboard():
 @app.route('/upload', methods=['POST'])
 def upload_file():
     """文件上传接口"""
+    task_id = None
+    started = False
     try:
         # 检查文件是否存在
         if 'file' not in request.files:
@@ -194,13 +365,17 @@ def upload_file():
         # 创建必要的目录
         FileUtils.create_directories()
         
+        # 上传文件本身放不下时直接拒绝
+        if request.content_length and disk_budget.available(app.config['UPLOAD_FOLDER']) < request.content_length:
+            return disk_full_response({app.config['UPLOAD_FOLDER']: request.content_length})
+        
         # 生成任务ID
         task_id = str(uuid.uuid4())
         
-        # 保存上传的文件
+        # 保存上传的文件（边保存边计算哈希）
         filename = secure_filename(file.filename)
         file_path = os.path.join(app.config['UPLOAD_FOLDER'], f"{task_id}_{filename}")
-        file.save(file_path)
+        file_hash = FileUtils.save_with_hash(file, file_path)
         
         # 检查文件大小
         file_size = FileUtils.get_file_size(file_path)
@@ -208,14 +383,29 @@ def upload_file():
             os.remove(file_path)
             return jsonify({'error': '文件大小超过1GB限制'}), 400
         
-        # 启动后台处理任务
+        # 相同的压缩包正在处理时，直接使用正在执行的任务
+        owner_id, is_new = inflight_jobs.claim(f"archive:{file_hash}", task_id)
+        if not is_new:
+            os.remove(file_path)
+            return jsonify({
+                'task_id': owner_id,
+                'message': '相同文件正在处理，已加入现有任务'
+            })
+        
+        # 按压缩包元数据估算磁盘占用峰值，其他任务释放空间后也放不下时直接拒绝
         output_dir = app.config['OUTPUT_FOLDER']
-        thread = threading.Thread(
-            target=process_compressed_file,
-            args=(task_id, file_path, output_dir)
-        )
-        thread.daemon = True
-        thread.start()
+        footprint = estimate_archive_footprint(file_path)
+        if footprint:
+            amounts = archive_disk_amounts(footprint, scratch_pool.choose(footprint['scratch_bytes']), output_dir)
+            if not disk_budget.can_ever_fit(amounts):
+                os.remove(file_path)
+                return disk_full_response(amounts)
+        
+        artifact_index.register(file_path, task_id, ArtifactIndex.KIND_UPLOAD, os.path.getsize(file_path))
+        
+        # 启动后台处理任务（空间暂时不足时任务等待其他任务释放空间）
+        task_tracker.start_thread(process_compressed_file, (task_id, file_path, output_dir, footprint))
+        started = True
         
         return jsonify({
             'task_id': task_id,
@@ -224,6 +414,10 @@ def upload_file():
         
     except Exception as e:
         return jsonify({'error': f'上传失败: {str(e)}'}), 500
+    finally:
+        # 任务没有启动时（拒绝或出错）释放对压缩包哈希的登记，任务启动后由任务结束时释放
+        if task_id and not started:
+            inflight_jobs.release(task_id)
 
 @app.route('/status/<task_id>')
 def get_status(task_id):
@@ -231,12 +425,13 @@ def get_status(task_id):
     if task_id in processing_status:
         status_info = processing_status[task_id]
         
-        # 检查是否完成且有结果
-        if status_info['status'] == '处理完成' and task_id in processing_results:
+        # 已生成的PDF在处理过程中即可下载，完整ZIP包需等待全部完成
+        if task_id in processing_results:
             result = processing_results[task_id]
-            status_info['download_url'] = f'/download/{task_id}'
             status_info['pdf_count'] = len(result.get('pdf_files', []))
             status_info['pdf_list_url'] = f'/download/list/{task_id}'
+            if status_info['status'] == '处理完成':
+                status_info['download_url'] = f'/download/{task_id}'
         
         return jsonify(status_info)
     else:
@@ -244,14 +439,16 @@ def get_status(task_id):
 
 @app.route('/download/<task_id>')
 def download_result(task_id):
-    """下载处理结果（ZIP包）"""
+    """下载处理结果（ZIP包，由已生成的PDF文件按需生成，不在磁盘上保存ZIP）"""
     if task_id in processing_results:
         result = processing_results[task_id]
-        zip_file = result.get('zip_file')
+        pdf_files = [f for f in result.get('pdf_files', []) if os.path.exists(f)]
         
-        if zip_file and os.path.exists(zip_file):
-            filename = f"converted_pdfs_{task_id}.zip"
-            return send_file(zip_file, as_attachment=True, download_name=filename)
+        if pdf_files and result.get('complete', True):
+            touch_artifacts(pdf_files)
+            return file_sender.send_stream(
+                ZipStream(pdf_files), f"converted_pdfs_{task_id}.zip", mimetype='application/zip'
+            )
     
     return jsonify({'error': '文件不存在或尚未完成'}), 404
 
@@ -265,8 +462,9 @@ def download_single_pdf(task_id, pdf_index):
         if 0 <= pdf_index < len(pdf_files):
             pdf_file = pdf_files[pdf_index]
             if os.path.exists(pdf_file):
+                touch_artifacts([pdf_file])
                 filename = os.path.basename(pdf_file)
-                return send_file(pdf_file, as_attachment=True, download_name=filename)
+                return file_sender.send(pdf_file, filename)
     
     return jsonify({'error': 'PDF文件不存在'}), 404
 
@@ -275,7 +473,7 @@ def list_pdf_files(task_id):
     """获取PDF文件列表"""
     if task_id in processing_results:
         result = processing_results[task_id]
-        pdf_files = result.get('pdf_files', [])
+        pdf_files = list(result.get('pdf_files', []))
         
         file_list = []
         for i, pdf_file in enumerate(pdf_files):
@@ -288,24 +486,127 @@ def list_pdf_files(task_id):
                 }
                 file_list.append(file_info)
         
-        return jsonify({'pdf_files': file_list})
+        return jsonify({
+            'pdf_files': file_list,
+            'complete': result.get('complete', True)
+        })
     
     return jsonify({'error': '任务不存在'}), 404
 
-@app.route('/cleanup', methods=['POST'])
-def cleanup_files():
-    """清理临时文件"""
+# 转换前预览（页面索引各进程共享，缩略图缓存在进程内）
+preview_indexes = SharedTaskStore('preview_indexes', app.config['TASK_STATE_FOLDER'])
+thumbnail_cache = ThumbnailCache(
+    max_items=app.config.get('PREVIEW_CACHE_MAX_ITEMS', 256),
+    max_bytes=app.config.get('PREVIEW_CACHE_MAX_BYTES', 32 * 1024 * 1024)
+)
+
+def preview_page_list(preview_id, archive_index):
+    return [
+        {
+            'index': page['index'],
+            'name': page['name'],
+            'folder': page['folder'],
+            'size': page['size'],
+            'thumb_url': f"/preview/{preview_id}/thumb/{page['index']}"
+        }
+        for page in archive_index.pages
+    ]
+
+def load_preview_index(preview_id):
+    """读取预览的页面索引（预览不存在或压缩包已被清理时返回None）"""
+    data = preview_indexes.get(preview_id)
+    if not data or not os.path.exists(data['file_path']):
+        return None
+    return ArchiveIndex.from_dict(data)
+
+@app.route('/preview', methods=['POST'])
+def create_preview():
+    """上传压缩包并读取页面列表（只读取压缩包目录，不解压）"""
     try:
-        # 清理上传文件
-        FileUtils.cleanup_old_files(app.config['UPLOAD_FOLDER'])
+        if 'file' not in request.files or request.files['file'].filename == '':
+            return jsonify({'error': '没有选择文件'}), 400
         
-        # 清理临时文件
-        FileUtils.cleanup_old_files(app.config['TEMP_FOLDER'])
+        file = request.files['file']
+        if not FileUtils.allowed_file(file.filename, app.config['ALLOWED_EXTENSIONS']):
+            return jsonify({'error': '不支持的文件格式'}), 400
+        
+        FileUtils.create_directories()
+        if request.content_length and disk_budget.available(app.config['UPLOAD_FOLDER']) < request.content_length:
+            return disk_full_response({app.config['UPLOAD_FOLDER']: request.content_length})
+        
+        preview_id = str(uuid.uuid4())
+        file_path = os.path.join(app.config['UPLOAD_FOLDER'], f"{preview_id}_{secure_filename(file.filename)}")
+        file.save(file_path)
         
-        # 清理输出文件（保留时间更长）
-        FileUtils.cleanup_old_files(app.config['OUTPUT_FOLDER'], hours_old=48)
+        try:
+            archive_index = ArchiveIndex.build(file_path)
+        except Exception as e:
+            os.remove(file_path)
+            return jsonify({'error': f'无法读取压缩包目录: {str(e)}'}), 400
+        
+        artifact_index.register(file_path, preview_id, ArtifactIndex.KIND_UPLOAD, os.path.getsize(file_path))
+        preview_indexes[preview_id] = archive_index.to_dict()
+        release_task_state(preview_id, preview_indexes)
+        
+        return jsonify({
+            'preview_id': preview_id,
+            'total': len(archive_index.pages),
+            'pages': preview_page_list(preview_id, archive_index)
+        })
         
-        return jsonify({'message': '清理完成'})
+    except Exception as e:
+        return jsonify({'error': f'预览失败: {str(e)}'}), 500
+
+@app.route('/preview/<preview_id>/pages')
+def get_preview_pages(preview_id):
+    """获取预览的页面列表（按自然顺序）"""
+    archive_index = load_preview_index(preview_id)
+    if archive_index is None:
+        return jsonify({'error': '预览不存在或已过期'}), 404
+    artifact_index.touch(archive_index.file_path)
+    return jsonify({
+        'preview_id': preview_id,
+        'total': len(archive_index.pages),
+        'pages': preview_page_list(preview_id, archive_index)
+    })
+
+@app.route('/preview/<preview_id>/thumb/<int:index>')
+def get_preview_thumbnail(preview_id, index):
+    """获取单个页面的缩略图（只解压该页面，结果缓存）"""
+    max_width, max_height = app.config.get('PREVIEW_THUMB_SIZE', (240, 340))
+    width = min(request.args.get('w', max_width, type=int), 1024)
+    height = min(request.args.get('h', max_height, type=int), 1024)
+    if width <= 0 or height <= 0:
+        return jsonify({'error': '缩略图尺寸无效'}), 400
+    
+    # 先确认预览仍然存在（其他进程清理后，本进程缓存的缩略图也不再返回）
+    archive_index = load_preview_index(preview_id)
+    if archive_index is None:
+        thumbnail_cache.discard_prefix(preview_id)
+        return jsonify({'error': '预览不存在或已过期'}), 404
+    
+    cache_key = (preview_id, index, width, height)
+    thumbnail = thumbnail_cache.get(cache_key)
+    if thumbnail is None:
+        if not 0 <= index < len(archive_index.pages):
+            return jsonify({'error': '页面不存在'}), 404
+        if archive_index.pages[index]['size'] > app.config.get('PREVIEW_MAX_PAGE_BYTES', 64 * 1024 * 1024):
+            return jsonify({'error': '页面过大，无法预览'}), 413
+        try:
+            thumbnail = make_thumbnail(archive_index.read_page(index), (width, height))
+        except Exception as e:
+            return jsonify({'error': f'生成缩略图失败: {str(e)}'}), 500
+        thumbnail_cache.put(cache_key, thumbnail)
+    artifact_index.touch(archive_index.file_path)
+    
+    return Response(thumbnail, mimetype='image/jpeg', headers={'Cache-Control': 'private, max-age=3600'})
+
+@app.route('/cleanup', methods=['POST'])
+def cleanup_files():
+    """立即执行一次产物清理（过期产物，以及磁盘空间不足时最近最少使用的产物）"""
+    try:
+        stats = artifact_janitor.run_once()
+        return jsonify({'message': '清理完成', **stats})
     except Exception as e:
         return jsonify({'error': f'清理失败: {str(e)}'}), 500
 
@@ -319,13 +620,115 @@ def cleanup_task_files(task_id):
             app.config['TEMP_FOLDER'],
             app.config['OUTPUT_FOLDER']
         )
+        for temp_dir in scratch_pool.find_task_dirs(task_id):
+            FileUtils.safe_remove(temp_dir)
+        for store in (processing_status, processing_results, jm_processing_tasks, jm_processing_results,
+                      preview_indexes):
+            store.pop(task_id, None)
+        thumbnail_cache.discard_prefix(task_id)
         return jsonify({'message': f'任务 {task_id} 文件清理完成'})
     except Exception as e:
         return jsonify({'error': f'清理失败: {str(e)}'}), 500
 
+# 系统运行指标（各工作进程定期写入，/api/system 汇总）
+metrics_store = SharedTaskStore('metrics', app.config['TASK_STATE_FOLDER'])
+metrics.register_gauge('active_tasks', lambda: task_tracker.active)
+metrics.register_gauge('memory_reserved_bytes', lambda: get_memory_budget().used)
+
+# 进程指标超过该时间未更新视为进程已退出
+METRICS_STALE_SECONDS = 10
+
+@app.before_request
+def start_background_services():
+    """处理请求的工作进程启动指标写入和产物清理线程（fork后的进程首次处理请求时启动）"""
+    metrics.start_publisher(metrics_store)
+    artifact_janitor.start()
+
+@app.route('/api/system')
+def system_status():
+    """系统状态：排队数量、活动任务、各阶段吞吐量、磁盘占用和缓存命中率"""
+    now = time.time()
+    snapshots = [metrics.snapshot()]
+    for pid in list(metrics_store):
+        if pid == str(os.getpid()):
+            continue
+        snapshot = metrics_store.get(pid)
+        if not snapshot:
+            continue
+        if now - snapshot.get('updated', 0) > METRICS_STALE_SECONDS:
+            if now - snapshot.get('updated', 0) > METRICS_STALE_SECONDS * 6:
+                metrics_store.pop(pid, None)
+            continue
+        snapshots.append(snapshot)
+    
+    summary = SystemMetrics.aggregate(snapshots)
+    counters = summary['counters']
+    gauges = summary['gauges']
+    
+    def rate(name, scale=1):
+        return round(counters.get(name, {}).get('rate', 0) / scale, 2)
+    
+    def total(name):
+        return counters.get(name, {}).get('total', 0)
+    
+    # 命中统计由共享缓存目录的所有进程共同累加，不按进程汇总
+    album_cache = get_album_cache()
+    cache_stats = album_cache.get_stats()
+    cache_lookups = cache_stats['hits'] + cache_stats['misses']
+    
+    # 磁盘占用来自产物索引登记的大小，不遍历目录
+    sizes = artifact_index.bytes_by_kind()
+    disk = {
+        name: sizes.get(kind, 0)
+        for name, kind in (
+            ('uploads', ArtifactIndex.KIND_UPLOAD),
+            ('outputs', ArtifactIndex.KIND_OUTPUT),
+            ('download', ArtifactIndex.KIND_DOWNLOAD),
+            ('temp', ArtifactIndex.KIND_TEMP)
+        )
+    }
+    disk['cache'] = album_cache.total_bytes()
+    usage = shutil.disk_usage(os.getcwd())
+    
+    return jsonify({
+        'workers': len(snapshots),
+        'active_tasks': gauges.get('active_tasks', 0),
+        'queue_depth': gauges.get('queued_items', 0) + gauges.get('queued_pages', 0),
+        'throughput': {
+            'download_pages_per_sec': rate('download_pages'),
+            'download_mb_per_sec': rate('download_bytes', 1024 * 1024),
+            'convert_pages_per_sec': rate('convert_pages'),
+            'pdf_pages_per_sec': rate('pdf_pages'),
+            'pdf_mb_per_sec': rate('pdf_bytes', 1024 * 1024)
+        },
+        'totals': {
+            'download_pages': total('download_pages'),
+            'download_bytes': total('download_bytes'),
+            'convert_pages': total('convert_pages'),
+            'pdf_pages': total('pdf_pages'),
+            'pdf_bytes': total('pdf_bytes')
+        },
+        'disk': {
+            'directories': disk,
+            'free_bytes': usage.free,
+            'total_bytes': usage.total
+        },
+        'cache': {
+            'hits': cache_stats['hits'],
+            'misses': cache_stats['misses'],
+            'hit_ratio': round(cache_stats['hits'] / cache_lookups, 3) if cache_lookups else None
+        },
+        'memory_reserved_bytes': gauges.get('memory_reserved_bytes', 0),
+        'window_seconds': metrics.window
+    })
+
 # JM漫画下载相关路由
-jm_processing_tasks = {}
-jm_processing_results = {}
+jm_processing_tasks = SharedTaskStore('jm_processing_tasks', app.config['TASK_STATE_FOLDER'])
+jm_processing_results = SharedTaskStore('jm_processing_results', app.config['TASK_STATE_FOLDER'])
+
+# 同一漫画同时只下载一次（批量任务内重复的ID、单个任务与批量任务中的相同漫画）
+# 其他工作进程正在下载时等待其完成，之后直接使用缓存中的图片
+jm_downloads = SingleFlight.from_config(app.config)
 
 @app.route('/jm')
 def jm_comic_page():
@@ -343,9 +746,24 @@ def download_jm_comic():
         if not jm_id or not jm_id.isdigit():
             return jsonify({'error': '无效的JM漫画ID'}), 400
         
+        # 未缓存的漫画需要下载，磁盘放不下时直接拒绝
+        if not get_album_cache().has_pdf(jm_id):
+            amounts = jm_disk_amounts(setup_download_directory())
+            if not disk_budget.can_ever_fit(amounts):
+                return disk_full_response(amounts)
+        
         # 生成任务ID
         task_id = f"jm_{jm_id}_{str(uuid.uuid4())[:8]}"
         
+        # 相同漫画正在处理时，直接使用正在执行的任务
+        owner_id, is_new = inflight_jobs.claim(f"jm:{jm_id}", task_id)
+        if not is_new:
+            return jsonify({
+                'task_id': owner_id,
+                'message': '该漫画正在处理，已加入现有任务',
+                'jm_id': jm_id
+            })
+        
         # 保存任务信息
         jm_processing_tasks[task_id] = {
             'jm_id': jm_id,
@@ -357,12 +775,7 @@ def download_jm_comic():
         }
         
         # 启动后台下载任务
-        thread = threading.Thread(
-            target=process_jm_comic_task,
-            args=(task_id, jm_id, task_type)
-        )
-        thread.daemon = True
-        thread.start()
+        task_tracker.start_thread(process_jm_comic_task, (task_id, jm_id, task_type))
         
         return jsonify({
             'task_id': task_id,
@@ -392,14 +805,16 @@ def get_jm_status(task_id):
 
 @app.route('/download/jm/result/<task_id>')
 def download_jm_result(task_id):
-    """下载JM漫画处理结果"""
+    """下载JM漫画处理结果（ZIP包，由已生成的PDF文件按需生成，不在磁盘上保存ZIP）"""
     if task_id in jm_processing_results:
         result = jm_processing_results[task_id]
-        zip_file = result.get('zip_file')
+        pdf_files = [f['path'] for f in result.get('files', []) if os.path.exists(f['path'])]
         
-        if zip_file and os.path.exists(zip_file):
-            filename = f"jm_comic_{task_id}.zip"
-            return send_file(zip_file, as_attachment=True, download_name=filename)
+        if pdf_files:
+            touch_artifacts(pdf_files)
+            return file_sender.send_stream(
+                ZipStream(pdf_files), f"jm_comic_{task_id}.zip", mimetype='application/zip'
+            )
     
     return jsonify({'error': '文件不存在或尚未完成'}), 404
 
@@ -415,15 +830,20 @@ def download_jm_file(task_id, filename):
         
         for file_info in files:
             if file_info['filename'] == decoded_filename and os.path.exists(file_info['path']):
-                return send_file(file_info['path'],
-                               as_attachment=True,
-                               download_name=file_info['filename'])
+                touch_artifacts([file_info['path']])
+                return file_sender.send(file_info['path'], file_info['filename'])
     
     return jsonify({'error': '文件不存在'}), 404
 
 def process_jm_comic_task(task_id, jm_id, task_type):
-    """处理JM漫画下载任务"""
+    """处理JM漫画下载任务（下载完成后记录检查点，重启后无需重新下载）"""
     task = jm_processing_tasks[task_id]
+    checkpoint = TaskCheckpoint.load_or_create(
+        task_id,
+        app.config['CHECKPOINT_FOLDER'],
+        TaskCheckpoint.KIND_JM,
+        {'jm_id': jm_id, 'task_type': task_type}
+    )
     
     try:
         # 步骤1: 下载漫画
@@ -435,114 +855,63 @@ def process_jm_comic_task(task_id, jm_id, task_type):
         from run import download_jm_comic
         download_dir = setup_download_directory()
         
-        comic_dir = os.path.join(download_dir, f"jm_{jm_id}")
-        os.makedirs(comic_dir, exist_ok=True)
-        
-        task['current_step'] = f'下载漫画 {jm_id}'
-        task['progress'] = 20
-        
-        # 调用下载函数，使用配置中的重试次数
-        max_retry = app.config.get('JM_MAX_RETRY', 3)
-        zip_path = download_jm_comic(jm_id, download_dir, max_retry=max_retry)
-        
-        if not zip_path or not os.path.exists(zip_path):
-            task['status'] = '失败'
-            task['error'] = '漫画下载失败'
-            return
-        
-        task['progress'] = 40
-        task['current_step'] = '下载完成，开始处理'
-        
-        # 步骤2: 处理为PDF
-        from utils.compression import CompressionHandler
-        from utils.image_processor import ImageProcessor
-        from utils.pdf_generator import PDFGenerator
-        
-        temp_dir = os.path.join(app.config['TEMP_FOLDER'], f"jm_temp_{task_id}")
-        os.makedirs(temp_dir, exist_ok=True)
+        # 任务结束前缓存条目不会被淘汰或替换删除
+        get_album_cache().pin(jm_id, task_id)
         
-        # 解压
-        task['current_step'] = '解压文件'
-        task['progress'] = 50
-        
-        compression_handler = CompressionHandler()
-        extracted_files = compression_handler._extract_zip(zip_path, temp_dir)
-        
-        if not extracted_files:
-            task['status'] = '失败'
-            task['error'] = '解压失败'
+        # 已缓存PDF的漫画直接发布结果，无需下载和转换
+        cached_pdf = get_album_cache().get_pdf(jm_id)
+        if cached_pdf:
+            jm_processing_results[task_id] = publish_jm_pdf(task_id, jm_id, cached_pdf, task, download_dir)
+            task['status'] = '完成'
             return
         
-        # 收集图片
-        task['current_step'] = '处理图片'
-        task['progress'] = 60
+        # 下载前预留磁盘空间（页数在下载前未知，按配置的单本漫画大小估算）
+        def on_disk_wait(available):
+            task['status'] = '等待磁盘空间'
+            task['current_step'] = '磁盘空间不足，等待其他任务完成'
         
-        image_processor = ImageProcessor()
-        image_groups = image_processor.collect_and_sort_images(temp_dir)
-        
-        if not image_groups:
+        temp_dir = scratch_pool.allocate(task_id, estimate_jm_footprint()['scratch_bytes'])
+        if not reserve_disk_space(task_id, jm_disk_amounts(download_dir, temp_dir), on_disk_wait):
             task['status'] = '失败'
-            task['error'] = '没有找到图片文件'
+            task['error'] = '磁盘空间不足'
             return
+        task['status'] = '下载中'
         
-        # 生成PDF
-        task['current_step'] = '生成PDF'
-        task['progress'] = 70
-        
-        pdf_generator = PDFGenerator()
-        output_dir = os.path.join(download_dir, f"output_{task_id}")
-        os.makedirs(output_dir, exist_ok=True)
-        
-        generated_pdfs = pdf_generator.generate_pdfs_by_folder(
-            image_groups,
-            output_dir,
-            base_name=f"jm_{jm_id}"
-        )
-        
-        task['progress'] = 80
+        comic_dir = os.path.join(download_dir, f"jm_{jm_id}")
+        os.makedirs(comic_dir, exist_ok=True)
+        artifact_index.register(comic_dir, task_id, ArtifactIndex.KIND_DOWNLOAD)
         
-        # 打包结果
-        task['current_step'] = '打包结果'
+        task['current_step'] = f'下载漫画 {jm_id}'
+        task['progress'] = 20
         
-        if generated_pdfs:
-            # 创建ZIP包
-            zip_output_path = os.path.join(download_dir, f"jm_{jm_id}_result.zip")
+        # 下载完成的图片立即开始转换
+        pipeline = create_page_pipeline(task_id)
+        
+        image_files = checkpoint.get_stage(TaskCheckpoint.STAGE_DOWNLOADED)
+        if not image_files or not all(os.path.exists(p) for p in image_files):
+            # 调用下载函数，使用配置中的重试次数
+            max_retry = app.config.get('JM_MAX_RETRY', 3)
+            image_files = jm_downloads.do(
+                f"jm:{jm_id}", download_jm_comic, jm_id, download_dir, max_retry=max_retry,
+                page_retry_callback=make_page_retry_callback(task),
+                page_callback=pipeline.submit
+            )
             
-            if pdf_generator.create_pdf_package(list(generated_pdfs.values()), zip_output_path):
-                task['status'] = '完成'
-                task['progress'] = 100
-                task['current_step'] = '处理完成'
-                
-                # 存储结果
-                result_files = []
-                for pdf_path in generated_pdfs.values():
-                    if os.path.exists(pdf_path):
-                        result_files.append({
-                            'filename': os.path.basename(pdf_path),
-                            'path': pdf_path,
-                            'size': os.path.getsize(pdf_path),
-                            'download_url': f'/download/jm/file/{task_id}/{urllib.parse.quote(os.path.basename(pdf_path))}'
-                        })
-                
-                jm_processing_results[task_id] = {
-                    'files': result_files,
-                    'zip_file': zip_output_path,
-                    'total_size': sum(f['size'] for f in result_files)
-                }
-                
-                # 清理临时文件
-                try:
-                    os.remove(zip_path)
-                    if os.path.exists(temp_dir):
-                        import shutil
-                        shutil.rmtree(temp_dir)
-                except:
-                    pass
-                
+            if not image_files:
+                task['status'] = '失败'
+                task['error'] = '漫画下载失败'
                 return
+            
+            checkpoint.mark_stage(TaskCheckpoint.STAGE_DOWNLOADED, image_files)
+            record_disk_written(task_id, comic_dir, pipeline.output_dir)
         
-        task['status'] = '失败'
-        task['error'] = 'PDF生成失败'
+        # 步骤2: 处理为PDF
+        result = convert_jm_album(task_id, jm_id, image_files, task, download_dir, pipeline)
+        if result:
+            jm_processing_results[task_id] = result
+            task['status'] = '完成'
+        else:
+            task['status'] = '失败'
         
     except Exception as e:
         task['status'] = '失败'
@@ -550,8 +919,165 @@ def process_jm_comic_task(task_id, jm_id, task_type):
         import traceback
         traceback.print_exc()
     finally:
+        checkpoint.remove()
+        inflight_jobs.release(task_id)
+        disk_budget.release(task_id)
+        scratch_pool.release(task_id)
+        if 'pipeline' in locals():
+            pipeline.close()
+            FileUtils.safe_remove(pipeline.output_dir)
+        release_jm_album(jm_id, task_id, setup_download_directory())
+        # 更新保留下来的产物（输出目录、下载失败时的图片目录）的实际大小
+        artifact_index.refresh_sizes(task_id)
         # 更新最终状态
         jm_processing_tasks[task_id] = task
+        release_task_state(task_id, jm_processing_tasks, jm_processing_results)
+
+def make_page_retry_callback(task_info):
+    """
+    创建图片重试回调，将每张图片的重试次数写入任务状态
+    
+    任务状态中 page_retries 为 {图片: 重试次数}，retried_pages 为重试过的图片数量。
+    """
+    def on_page_retry(page_name, attempt, error):
+        page_retries = task_info.setdefault('page_retries', {})
+        page_retries[page_name] = attempt
+        task_info['retried_pages'] = len(page_retries)
+        task_info['last_retry_error'] = str(error)
+    
+    return on_page_retry
+
+def estimate_jm_footprint():
+    """
+    估算单本JM漫画的磁盘占用（下载前页数未知，按 JM_ESTIMATED_ALBUM_BYTES 估算）
+    
+    与压缩包相同按 图片 + 图片 × DISK_CONVERT_RATIO × 2 拆分：
+    转换后的图片在临时目录，下载的图片和PDF在下载目录。
+    """
+    album_bytes = app.config.get('JM_ESTIMATED_ALBUM_BYTES', 0)
+    convert_ratio = app.config.get('DISK_CONVERT_RATIO', 3.0)
+    scratch_bytes = int(album_bytes * convert_ratio / (1 + convert_ratio * 2))
+    return {
+        'scratch_bytes': scratch_bytes,
+        'output_bytes': album_bytes - scratch_bytes,
+        'estimated_bytes': album_bytes
+    }
+
+def jm_disk_amounts(download_dir, temp_dir=None):
+    """单本JM漫画各卷的预留大小（temp_dir为None时使用按估算大小将会选择的临时目录卷）"""
+    footprint = estimate_jm_footprint()
+    temp_dir = temp_dir or scratch_pool.choose(footprint['scratch_bytes'])
+    return {temp_dir: footprint['scratch_bytes'], download_dir: footprint['output_bytes']}
+
+def create_page_pipeline(task_id, owner_id=None):
+    """
+    创建任务的图片转换流水线（转换后的图片保存在任务临时目录中）
+    
+    Args:
+        task_id: 任务ID
+        owner_id: 执行中的顶层任务ID（批量任务ID），默认为 task_id
+    """
+    temp_dir = scratch_pool.allocate(task_id, estimate_jm_footprint()['scratch_bytes'])
+    artifact_index.register(temp_dir, owner_id or task_id, ArtifactIndex.KIND_TEMP)
+    return PageConvertPipeline(
+        temp_dir,
+        max_workers=app.config.get('JM_PAGE_CONVERT_WORKERS', 2)
+    )
+
+def convert_jm_album(task_id, jm_id, image_files, task_info, download_dir, pipeline=None):
+    """
+    将下载好的JM漫画图片转换为PDF并加入缓存
+    
+    Args:
+        task_id: 任务ID
+        jm_id: JM漫画ID
+        image_files: 已排序的图片路径列表
+        task_info: 任务状态字典（会被更新）
+        download_dir: 下载目录
+        pipeline: 下载过程中已开始转换的流水线，为None时在这里转换全部图片
+    
+    Returns:
+        dict: 结果信息，失败时返回None（错误信息写入 task_info['error']）
+    """
+    task_info['progress'] = 40
+    task_info['current_step'] = '下载完成，等待图片转换'
+    
+    if pipeline is None:
+        pipeline = create_page_pipeline(task_id)
+    
+    try:
+        # 大部分图片已在下载过程中转换完成，这里只等待最后几张
+        converted_images = pipeline.finish(image_files)
+        
+        # 生成PDF
+        task_info['current_step'] = '生成PDF'
+        task_info['progress'] = 70
+        
+        pdf_generator = PDFGenerator()
+        output_dir = os.path.join(download_dir, f"output_{task_id}")
+        os.makedirs(output_dir, exist_ok=True)
+        
+        pdf_path = os.path.join(output_dir, f"jm_{jm_id}.pdf")
+        if not pdf_generator.generate_pdf_from_images(converted_images, pdf_path):
+            task_info['error'] = 'PDF生成失败'
+            return None
+    finally:
+        FileUtils.safe_remove(pipeline.output_dir)
+    
+    # 加入缓存，之后请求同一漫画时直接使用
+    try:
+        get_album_cache().put_pdf(jm_id, pdf_path)
+    except Exception as e:
+        print(f"写入缓存失败: {e}")
+    
+    return publish_jm_pdf(task_id, jm_id, pdf_path, task_info, download_dir)
+
+def release_jm_album(jm_id, task_id, download_dir):
+    """
+    任务结束时释放漫画缓存的租约
+    
+    合并下载的任务（包括其他工作进程中的任务）共用下载目录中的图片，
+    漫画已生成PDF并加入缓存、且没有其他任务在使用该漫画时，由最后结束的任务删除下载目录。
+    """
+    album_cache = get_album_cache()
+    album_cache.unpin(jm_id, task_id)
+    if album_cache.has_pdf(jm_id) and not album_cache.is_pinned(jm_id):
+        FileUtils.safe_remove(os.path.join(download_dir, f"jm_{jm_id}"))
+
+def publish_jm_pdf(task_id, jm_id, pdf_path, task_info, download_dir):
+    """
+    将JM漫画PDF发布到任务输出目录
+    
+    缓存中的PDF通过硬链接放入输出目录，不复制文件内容。
+    
+    Returns:
+        dict: 结果信息
+    """
+    output_dir = os.path.join(download_dir, f"output_{task_id}")
+    os.makedirs(output_dir, exist_ok=True)
+    
+    output_path = os.path.join(output_dir, f"jm_{jm_id}.pdf")
+    if os.path.abspath(pdf_path) != os.path.abspath(output_path):
+        FileUtils.safe_remove(output_path)
+        get_album_cache().link_or_copy(pdf_path, output_path)
+    
+    artifact_index.register(output_dir, task_id, ArtifactIndex.KIND_OUTPUT, os.path.getsize(output_path))
+    
+    task_info['progress'] = 100
+    task_info['current_step'] = '处理完成'
+    
+    # 存储结果
+    result_files = [{
+        'filename': os.path.basename(output_path),
+        'path': output_path,
+        'size': os.path.getsize(output_path),
+        'download_url': f'/download/jm/file/{task_id}/{urllib.parse.quote(os.path.basename(output_path))}'
+    }]
+    
+    return {
+        'files': result_files,
+        'total_size': sum(f['size'] for f in result_files)
+    }
 
 def setup_download_directory():
     """设置下载目录"""
@@ -559,15 +1085,41 @@ def setup_download_directory():
     os.makedirs(download_dir, exist_ok=True)
     return download_dir
 
-def process_jm_batch_task(batch_id, jm_ids):
-    """处理JM漫画批量下载任务"""
+def process_jm_batch_task(batch_id, jm_ids, download_func=None):
+    """
+    处理JM漫画批量下载任务
+    
+    多个漫画并发下载，下载完成的漫画立即进入转换线程池；每完成一个漫画记录检查点，
+    重启后跳过已完成的漫画。
+    
+    Args:
+        batch_id: 批量任务ID
+        jm_ids: JM漫画ID列表
+        download_func: 下载函数 download_func(jm_id, download_dir, max_retry, page_retry_callback, page_callback)，
+                       默认使用 run.download_jm_comic（测试时可替换为桩函数）
+    """
+    if download_func is None:
+        from run import download_jm_comic as download_func
+    
     batch_tasks = {}
     batch_results = {}
     
+    checkpoint = TaskCheckpoint.load_or_create(
+        batch_id,
+        app.config['CHECKPOINT_FOLDER'],
+        TaskCheckpoint.KIND_JM_BATCH,
+        {'jm_ids': jm_ids}
+    )
+    
     try:
-        # 初始化批量任务状态
-        for jm_id in jm_ids:
-            task_id = f"jm_{jm_id}_{str(uuid.uuid4())[:8]}"
+        # 初始化批量任务状态（子任务ID保存在检查点中，恢复后保持不变）
+        task_ids = checkpoint.params.get('task_ids')
+        if not task_ids:
+            task_ids = [f"jm_{jm_id}_{str(uuid.uuid4())[:8]}" for jm_id in jm_ids]
+            checkpoint.params['task_ids'] = task_ids
+            checkpoint.save()
+        
+        for task_id, jm_id in zip(task_ids, jm_ids):
             batch_tasks[task_id] = {
                 'jm_id': jm_id,
                 'status': '等待开始',
@@ -577,7 +1129,7 @@ def process_jm_batch_task(batch_id, jm_ids):
             }
         
         # 存储批量任务信息
-        jm_processing_tasks[batch_id] = {
+        batch_info = {
             'batch_id': batch_id,
             'jm_ids': jm_ids,
             'total': len(jm_ids),
@@ -587,147 +1139,116 @@ def process_jm_batch_task(batch_id, jm_ids):
             'progress': 0,
             'tasks': batch_tasks
         }
+        jm_processing_tasks[batch_id] = batch_info
+        
+        download_dir = setup_download_directory()
+        album_cache = get_album_cache()
         
-        # 处理每个漫画
+        # 上次运行中已完成的漫画和已缓存的漫画
+        pending_items = []
         for task_id, task_info in batch_tasks.items():
-            jm_id = task_info['jm_id']
-            
-            # 更新任务状态
-            task_info['status'] = '下载中'
-            task_info['current_step'] = f'下载漫画 {jm_id}'
-            task_info['progress'] = 10
+            # 批量任务结束前缓存条目不会被淘汰或替换删除
+            album_cache.pin(task_info['jm_id'], task_id)
+            finished_result = checkpoint.get_item(task_id)
+            if not (finished_result and all(os.path.exists(f['path']) for f in finished_result['files'])):
+                cached_pdf = album_cache.get_pdf(task_info['jm_id'])
+                finished_result = None
+                if cached_pdf:
+                    finished_result = publish_jm_pdf(task_id, task_info['jm_id'], cached_pdf, task_info, download_dir)
             
-            # 调用单个下载任务
+            if finished_result:
+                task_info['status'] = '完成'
+                task_info['progress'] = 100
+                task_info['current_step'] = '处理完成'
+                batch_results[task_id] = finished_result
+                batch_info['completed'] += 1
+            else:
+                pending_items.append((task_id, task_info['jm_id']))
+        
+        max_retry = app.config.get('JM_MAX_RETRY', 3)
+        
+        # 每个漫画的图片在下载过程中开始转换
+        pipelines = {}
+        
+        def download_album(task_id, jm_id):
+            temp_dir = scratch_pool.allocate(task_id, estimate_jm_footprint()['scratch_bytes'])
+            if not reserve_disk_space(task_id, jm_disk_amounts(download_dir, temp_dir)):
+                raise IOError('磁盘空间不足')
+            artifact_index.register(os.path.join(download_dir, f"jm_{jm_id}"), batch_id, ArtifactIndex.KIND_DOWNLOAD)
+            pipelines[task_id] = create_page_pipeline(task_id, batch_id)
+            image_files = jm_downloads.do(
+                f"jm:{jm_id}", download_func, jm_id, download_dir, max_retry=max_retry,
+                page_retry_callback=make_page_retry_callback(batch_tasks[task_id]),
+                page_callback=pipelines[task_id].submit
+            )
+            record_disk_written(task_id, os.path.join(download_dir, f"jm_{jm_id}"), pipelines[task_id].output_dir)
+            return image_files
+        
+        def convert_album(task_id, jm_id, image_files):
             try:
-                from run import download_jm_comic
-                download_dir = setup_download_directory()
-                
-                # 下载漫画
-                zip_path = download_jm_comic(jm_id, download_dir)
-                
-                if not zip_path or not os.path.exists(zip_path):
-                    task_info['status'] = '失败'
-                    task_info['error'] = '漫画下载失败'
-                    jm_processing_tasks[batch_id]['failed'] += 1
-                    continue
-                
-                task_info['progress'] = 40
-                task_info['current_step'] = '下载完成，开始处理'
-                
-                # 处理为PDF
-                from utils.compression import CompressionHandler
-                from utils.image_processor import ImageProcessor
-                from utils.pdf_generator import PDFGenerator
-                
-                temp_dir = os.path.join(app.config['TEMP_FOLDER'], f"jm_temp_{task_id}")
-                os.makedirs(temp_dir, exist_ok=True)
-                
-                # 解压
-                task_info['current_step'] = '解压文件'
-                task_info['progress'] = 50
-                
-                compression_handler = CompressionHandler()
-                extracted_files = compression_handler._extract_zip(zip_path, temp_dir)
-                
-                if not extracted_files:
-                    task_info['status'] = '失败'
-                    task_info['error'] = '解压失败'
-                    jm_processing_tasks[batch_id]['failed'] += 1
-                    continue
-                
-                # 收集图片
-                task_info['current_step'] = '处理图片'
-                task_info['progress'] = 60
-                
-                image_processor = ImageProcessor()
-                image_groups = image_processor.collect_and_sort_images(temp_dir)
-                
-                if not image_groups:
-                    task_info['status'] = '失败'
-                    task_info['error'] = '没有找到图片文件'
-                    jm_processing_tasks[batch_id]['failed'] += 1
-                    continue
-                
-                # 生成PDF
-                task_info['current_step'] = '生成PDF'
-                task_info['progress'] = 70
-                
-                pdf_generator = PDFGenerator()
-                output_dir = os.path.join(download_dir, f"output_{task_id}")
-                os.makedirs(output_dir, exist_ok=True)
-                
-                generated_pdfs = pdf_generator.generate_pdfs_by_folder(
-                    image_groups,
-                    output_dir,
-                    base_name=f"jm_{jm_id}"
+                result = convert_jm_album(
+                    task_id, jm_id, image_files, batch_tasks[task_id], download_dir, pipelines.pop(task_id, None)
                 )
-                
-                task_info['progress'] = 80
-                
-                # 打包结果
-                task_info['current_step'] = '打包结果'
-                
-                if generated_pdfs:
-                    # 创建ZIP包
-                    zip_output_path = os.path.join(download_dir, f"jm_{jm_id}_result.zip")
-                    
-                    if pdf_generator.create_pdf_package(list(generated_pdfs.values()), zip_output_path):
-                        task_info['status'] = '完成'
-                        task_info['progress'] = 100
-                        task_info['current_step'] = '处理完成'
-                        
-                        # 存储结果
-                        result_files = []
-                        for pdf_path in generated_pdfs.values():
-                            if os.path.exists(pdf_path):
-                                result_files.append({
-                                    'filename': os.path.basename(pdf_path),
-                                    'path': pdf_path,
-                                    'size': os.path.getsize(pdf_path),
-                                    'download_url': f'/download/jm/file/{task_id}/{urllib.parse.quote(os.path.basename(pdf_path))}'
-                                })
-                        
-                        batch_results[task_id] = {
-                            'files': result_files,
-                            'zip_file': zip_output_path,
-                            'total_size': sum(f['size'] for f in result_files)
-                        }
-                        
-                        jm_processing_tasks[batch_id]['completed'] += 1
-                        
-                        # 清理临时文件
-                        try:
-                            os.remove(zip_path)
-                            if os.path.exists(temp_dir):
-                                import shutil
-                                shutil.rmtree(temp_dir)
-                        except:
-                            pass
-                        
-                        continue
-                
-                task_info['status'] = '失败'
-                task_info['error'] = 'PDF生成失败'
-                jm_processing_tasks[batch_id]['failed'] += 1
-                
-            except Exception as e:
+            finally:
+                disk_budget.release(task_id)
+            if result:
+                # 每个漫画转换完成后立即记录检查点
+                checkpoint.set_item(task_id, result)
+            return result
+        
+        # 状态回调在执行器的锁内调用，计数不会冲突
+        def on_album_status(task_id, status, error=None):
+            task_info = batch_tasks[task_id]
+            jm_id = task_info['jm_id']
+            if status == 'downloading':
+                task_info['status'] = '下载中'
+                task_info['current_step'] = f'下载漫画 {jm_id}'
+                task_info['progress'] = 10
+            elif status == 'downloaded':
+                task_info['status'] = '等待转换'
+                task_info['current_step'] = '下载完成，等待转换'
+                task_info['progress'] = 40
+            elif status == 'converting':
+                task_info['status'] = '转换中'
+            elif status == 'done':
+                task_info['status'] = '完成'
+                batch_info['completed'] += 1
+            elif status == 'failed':
                 task_info['status'] = '失败'
-                task_info['error'] = str(e)
-                jm_processing_tasks[batch_id]['failed'] += 1
-                import traceback
-                traceback.print_exc()
+                task_info.setdefault('error', error)
+                batch_info['failed'] += 1
+            
+            finished = batch_info['completed'] + batch_info['failed']
+            batch_info['progress'] = int(finished / batch_info['total'] * 100)
+        
+        executor = PipelinedBatchExecutor(
+            download_album,
+            convert_album,
+            download_workers=app.config.get('JM_DOWNLOAD_THREADS', 3),
+            convert_workers=app.config.get('JM_CONVERT_WORKERS', 1)
+        )
+        executor.set_status_callback(on_album_status)
+        
+        for task_id, result in executor.run(pending_items).items():
+            if result:
+                batch_results[task_id] = result
+        
+        # 下载失败的漫画不会进入转换，停止其流水线
+        for pipeline in pipelines.values():
+            pipeline.close()
+            FileUtils.safe_remove(pipeline.output_dir)
         
         # 更新批量任务状态
         total_tasks = len(jm_ids)
-        completed_tasks = jm_processing_tasks[batch_id]['completed']
-        failed_tasks = jm_processing_tasks[batch_id]['failed']
+        completed_tasks = batch_info['completed']
+        failed_tasks = batch_info['failed']
         
         if completed_tasks > 0:
-            jm_processing_tasks[batch_id]['status'] = '部分完成'
-            jm_processing_tasks[batch_id]['progress'] = int((completed_tasks / total_tasks) * 100)
+            batch_info['status'] = '部分完成'
+            batch_info['progress'] = int((completed_tasks / total_tasks) * 100)
         else:
-            jm_processing_tasks[batch_id]['status'] = '全部失败'
-            jm_processing_tasks[batch_id]['progress'] = 0
+            batch_info['status'] = '全部失败'
+            batch_info['progress'] = 0
         
         # 存储批量结果
         jm_processing_results[batch_id] = {
@@ -744,6 +1265,63 @@ def process_jm_batch_task(batch_id, jm_ids):
             jm_processing_tasks[batch_id]['error'] = str(e)
         import traceback
         traceback.print_exc()
+    finally:
+        checkpoint.remove()
+        # 下载失败的漫画不会进入转换，在这里释放其磁盘预留
+        for task_id, task_info in batch_tasks.items():
+            disk_budget.release(task_id)
+            scratch_pool.release(task_id)
+            release_jm_album(task_info['jm_id'], task_id, setup_download_directory())
+        artifact_index.refresh_sizes(batch_id)
+        release_task_state(batch_id, jm_processing_tasks, jm_processing_results)
+
+def resume_pending_tasks():
+    """
+    恢复进程重启前未完成的任务
+    
+    Returns:
+        int: 恢复的任务数量
+    """
+    resumed = 0
+    for checkpoint in TaskCheckpoint.list_pending(app.config['CHECKPOINT_FOLDER']):
+        params = checkpoint.params
+        task_id = checkpoint.task_id
+        
+        # 多个工作进程同时启动时，每个检查点只由一个进程恢复
+        if not checkpoint.claim():
+            continue
+        
+        if checkpoint.kind == TaskCheckpoint.KIND_ARCHIVE:
+            # 上传文件和解压目录都不存在时无法恢复
+            temp_dir = params.get('temp_dir') or os.path.join(app.config['TEMP_FOLDER'], f"temp_{task_id}")
+            if not os.path.exists(params.get('file_path', '')) and not os.path.isdir(temp_dir):
+                checkpoint.remove()
+                continue
+            target = process_compressed_file
+            args = (task_id, params['file_path'], params['output_dir'])
+        elif checkpoint.kind == TaskCheckpoint.KIND_JM:
+            jm_processing_tasks[task_id] = {
+                'jm_id': params['jm_id'],
+                'status': '等待开始',
+                'progress': 0,
+                'current_step': '从检查点恢复',
+                'task_type': params.get('task_type', 'single'),
+                'start_time': time.time()
+            }
+            target = process_jm_comic_task
+            args = (task_id, params['jm_id'], params.get('task_type', 'single'))
+        elif checkpoint.kind == TaskCheckpoint.KIND_JM_BATCH:
+            target = process_jm_batch_task
+            args = (task_id, params['jm_ids'])
+        else:
+            checkpoint.remove()
+            continue
+        
+        print(f"从检查点恢复任务: {task_id}")
+        task_tracker.start_thread(target, args)
+        resumed += 1
+    
+    return resumed
 
 # 批量任务处理
 @app.route('/download/jm/batch', methods=['POST'])
@@ -761,16 +1339,16 @@ def download_jm_batch():
         if invalid_ids:
             return jsonify({'error': f'无效的漫画ID: {", ".join(invalid_ids)}'}), 400
         
+        # 单本漫画也放不下时直接拒绝（批量任务中的漫画逐个预留空间）
+        amounts = jm_disk_amounts(setup_download_directory())
+        if not disk_budget.can_ever_fit(amounts):
+            return disk_full_response(amounts)
+        
         # 创建批量任务
         batch_id = f"batch_{str(uuid.uuid4())[:8]}"
         
         # 启动批量处理
-        thread = threading.Thread(
-            target=process_jm_batch_task,
-            args=(batch_id, jm_ids)
-        )
-        thread.daemon = True
-        thread.start()
+        task_tracker.start_thread(process_jm_batch_task, (batch_id, jm_ids))
         
         return jsonify({
             'batch_id': batch_id,
@@ -785,5 +1363,9 @@ if __name__ == '__main__':
     # 创建必要的目录
     FileUtils.create_directories()
     
+    # 恢复未完成的任务（debug模式下只在重载器启动的子进程中恢复，父进程只负责监视文件变化）
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        resume_pending_tasks()
+    
     # 启动应用
     app.run(debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
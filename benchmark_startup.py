@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""
+启动时间基准测试
+
+在子进程中多次执行各个入口（每次都是全新的解释器），输出耗时中位数，
+并与目标时间比较。超过目标时返回非零退出码，可用于CI检查。
+
+用法: python benchmark_startup.py [--runs 5]
+"""
+import os
+import sys
+import time
+import argparse
+import statistics
+import subprocess
+
+# (名称, 命令参数, 目标时间（秒）)
+BENCHMARKS = [
+    ('import config/utils', ['-c', 'import utils.file_utils, utils.compression, utils.pdf_generator, utils.image_processor'], 0.3),
+    ('run.py --cleanup-temp', ['run.py', '--cleanup-temp'], 1.0),
+    ('run.py --cleanup', ['run.py', '--cleanup'], 1.0),
+    ('import app', ['-c', 'import app'], 1.5),
+]
+
+
+def measure(args, runs):
+    """执行命令 runs 次，返回每次的耗时（秒）"""
+    root_dir = os.path.dirname(os.path.abspath(__file__))
+    durations = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run(
+            [sys.executable] + args,
+            cwd=root_dir,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+            check=False
+        )
+        durations.append(time.perf_counter() - start)
+    return durations
+
+
+def main():
+    parser = argparse.ArgumentParser(description='启动时间基准测试')
+    parser.add_argument('--runs', type=int, default=5, help='每个入口的执行次数')
+    args = parser.parse_args()
+
+    print(f"{'入口':<24}{'中位数':>10}{'最快':>10}{'目标':>10}")
+    print('-' * 54)
+
+    failed = []
+    for name, command, target in BENCHMARKS:
+        durations = measure(command, args.runs)
+        median = statistics.median(durations)
+        mark = 'OK' if median <= target else '超时'
+        print(f"{name:<24}{median:>9.3f}s{min(durations):>9.3f}s{target:>9.1f}s  {mark}")
+        if median > target:
+            failed.append(name)
+
+    if failed:
+        print(f"\n超过目标时间: {', '.join(failed)}")
+        sys.exit(1)
+    print("\n全部入口均在目标时间内")
+
+
+if __name__ == '__main__':
+    main()
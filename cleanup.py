@@ -7,10 +7,20 @@
 import os
 import time
 from config import config
+from utils.artifact_index import ArtifactJanitor
+from utils.checkpoint import TaskCheckpoint
 from utils.file_utils import FileUtils
 
+def create_janitor(config_obj):
+    """按配置创建产物清理器（与Web服务使用同一个产物索引和保留时间，正在执行的任务不会被清理）"""
+    app_config = {name: getattr(config_obj, name) for name in dir(config_obj) if name.isupper()}
+    return ArtifactJanitor.from_config(
+        app_config,
+        is_pinned=lambda task_id: TaskCheckpoint.exists(task_id, config_obj.CHECKPOINT_FOLDER)
+    )
+
 def cleanup_all_files():
-    """清理所有临时和旧文件"""
+    """清理过期的任务产物（磁盘空间不足时按最近最少使用清理）"""
     print("开始清理所有文件...")
     
     config_obj = config['default']
@@ -18,21 +28,10 @@ def cleanup_all_files():
     # 确保目录存在
     FileUtils.create_directories()
     
-    # 清理上传文件夹（保留24小时内的文件）
-    print("清理上传文件夹...")
-    FileUtils.cleanup_old_files(config_obj.UPLOAD_FOLDER, hours_old=24)
-    
-    # 清理临时文件夹（保留12小时内的文件）
-    print("清理临时文件夹...")
-    FileUtils.cleanup_old_files(config_obj.TEMP_FOLDER, hours_old=12)
-    
-    # 清理输出文件夹（保留48小时内的文件）
-    print("清理输出文件夹...")
-    FileUtils.cleanup_old_files(config_obj.OUTPUT_FOLDER, hours_old=48)
-
-    # 清理输出文件夹（保留48小时内的文件）
-    print("清理下载文件夹...")
-    FileUtils.cleanup_old_files(config_obj.DOWNLOAD_FOLDER, hours_old=0)
+    # 按产物索引清理（保留时间见 ARTIFACT_TTL_HOURS）
+    stats = create_janitor(config_obj).run_once()
+    print(f"过期 {stats['expired']} 个, 磁盘空间不足清理 {stats['evicted']} 个, "
+          f"释放 {stats['freed_bytes'] / (1024 * 1024):.1f} MB")
     
     print("文件清理完成！")
 
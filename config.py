@@ -10,6 +10,12 @@ class Config:
     UPLOAD_FOLDER = 'uploads'
     TEMP_FOLDER = 'temp'
     OUTPUT_FOLDER = 'outputs'
+    CHECKPOINT_FOLDER = 'checkpoints'  # 任务检查点目录（进程重启后恢复任务）
+    TASK_STATE_FOLDER = 'task_state'  # 任务状态目录（多个工作进程之间共享任务进度和结果）
+    # 解压和转换使用的临时目录池，格式 "目录[:单任务最大字节数],..."，也可以设置为 [(目录, 单任务最大字节数或None)]
+    # 例如 "/dev/shm/zip2pdf:268435456,/mnt/scratch"：预计256MB以内的任务在内存盘中处理，其余放在大容量磁盘
+    # 未设置时使用 TEMP_FOLDER
+    SCRATCH_DIRS = os.environ.get('SCRATCH_DIRS') or ''
     
     # 允许的压缩文件扩展名
     ALLOWED_EXTENSIONS = {
@@ -21,19 +27,85 @@ class Config:
         'jpg', 'jpeg', 'png', 'gif', 'bmp', 'webp'
     }
     
+    # 图片解码内存预算（每个进程同时解码的图片估算大小之和，超过时等待；0为不限制）
+    IMAGE_MEMORY_BUDGET = int(os.environ.get('IMAGE_MEMORY_BUDGET') or 512 * 1024 * 1024)
+    
     # PDF配置
     PDF_PAGE_SIZE = 'A4'
     PDF_ORIENTATION = 'portrait'  # portrait 或 landscape
     
     # JM漫画下载配置
-    JM_DOWNLOAD_TIMEOUT = 300  # 下载超时时间（秒）
-    JM_MAX_RETRY = 3  # 最大重试次数
-    JM_DOWNLOAD_THREADS = 3  # 下载线程数
+    JM_DOWNLOAD_TIMEOUT = 300  # 下载超时时间（秒），单张图片的重试总时长不超过此时间
+    JM_MAX_RETRY = 3  # 最大重试次数（整本和单张图片）
+    JM_PAGE_TIMEOUT = 30  # 单张图片请求的连接/读取超时时间（秒）
+    JM_DOWNLOAD_THREADS = 3  # 下载线程数（批量任务中同时下载的漫画数）
+    JM_CONVERT_WORKERS = 1  # 批量任务中同时转换PDF的漫画数
+    JM_PAGE_CONVERT_WORKERS = 2  # 单个漫画边下载边转换图片的线程数
     JM_IMAGE_SUFFIX = '.jpg'  # 图片后缀
+    JM_DOWNLOAD_ENGINE = 'pooled'  # pooled: 连接池下载图片; jmcomic: 使用jmcomic自带下载
+    JM_IMAGE_CONCURRENCY = 8  # 单个漫画同时下载的图片数
+    JM_HOST_CONNECTIONS = 4  # 每个图片服务器的最大连接数（所有任务共享）
+    JM_HOST_RATE_LIMIT = 10  # 每个图片服务器每秒最多请求数（0为不限制）
     JM_DOWNLOAD_DIR = 'download/jm_comics'  # JM漫画下载目录
     
+    # JM漫画缓存配置（同一漫画再次请求时直接使用缓存的图片和PDF）
+    JM_CACHE_DIR = 'cache/jm'  # 缓存目录
+    JM_CACHE_MAX_BYTES = 5 * 1024 * 1024 * 1024  # 缓存总大小上限（5GB）
+    JM_CACHE_MAX_AGE_HOURS = 72  # 缓存保留时间（小时）
+    
+    # ZIP打包配置
+    ZIP_PACKAGE_MODE = 'adaptive'  # adaptive: 抽样判断可压缩性; deflated: 全部压缩; stored: 全部直接存储
+    ZIP_COMPRESS_LEVEL = 6  # DEFLATE压缩级别
+    ZIP_COMPRESS_WORKERS = None  # 并行抽样判断可压缩性的线程数（None为CPU核数；只用于抽样，DEFLATE压缩按顺序进行）
+    ZIP_EXTRACT_WORKERS = None  # 并行解压上传ZIP的线程数（None为CPU核数）
+    ZIP_PARALLEL_MIN_BYTES = 16 * 1024 * 1024  # 需要解压的成员超过该大小（压缩后）时才并行解压
+    ZIP_REFERENCE_STORED = True  # 上传ZIP中未压缩存储的JPEG不解压，生成PDF时直接读取（不转换、不缩放）
+    
+    # 结果文件发送配置
+    # direct: 由Flask直接发送; x-accel-redirect: 交给Nginx; x-sendfile: 交给Apache/Lighttpd
+    SEND_FILE_MODE = os.environ.get('SEND_FILE_MODE') or 'direct'
+    X_ACCEL_REDIRECT_PREFIX = os.environ.get('X_ACCEL_REDIRECT_PREFIX') or '/protected/'
+    X_ACCEL_REDIRECT_ROOT = os.environ.get('X_ACCEL_REDIRECT_ROOT') or os.getcwd()  # 与前缀对应的本地目录
+    SEND_FILE_MAX_AGE = 3600  # 下载结果缓存时间（秒）
+    
+    # 生产部署配置（gunicorn，见 gunicorn.conf.py）
+    WORKER_MAX_TASKS = int(os.environ.get('WORKER_MAX_TASKS') or 50)  # 工作进程完成多少个后台任务后平滑重启（0为不重启）
+    
     # 清理配置（小时）
     CLEANUP_INTERVAL = 24  # 24小时后清理临时文件
+    
+    # 任务产物清理（按索引清理，不遍历目录）
+    ARTIFACT_INDEX_PATH = 'task_state/artifacts.db'  # 产物索引（SQLite）
+    ARTIFACT_TTL_HOURS = {  # 各类产物从最后访问起的保留时间（小时）
+        'upload': 24,
+        'temp': 12,
+        'output': 48,
+        'download': 24,
+        'state': 72  # 任务结束后的状态文件（task_state/<名称>/<任务ID>.json）
+    }
+    DISK_HIGH_WATERMARK = 0.90  # 磁盘使用率超过该值时按最近最少使用清理产物
+    DISK_LOW_WATERMARK = 0.80  # 清理到磁盘使用率低于该值为止
+    JANITOR_INTERVAL = 300  # 后台清理检查间隔（秒）
+    
+    # 磁盘空间预留（任务开始前按估算的峰值占用预留，空间不足时等待或拒绝）
+    DISK_MIN_FREE_BYTES = 1024 * 1024 * 1024  # 始终保留的可用空间（1GB）
+    DISK_CONVERT_RATIO = 3.0  # 图片转换为PNG后的大小倍数
+    DISK_NESTED_ARCHIVE_RATIO = 2.0  # 嵌套压缩包的解压倍数（无法读取其元数据）
+    DISK_WAIT_TIMEOUT = 1800  # 等待其他任务释放空间的最长时间（秒）
+    JM_ESTIMATED_ALBUM_BYTES = 500 * 1024 * 1024  # 单本JM漫画的估算占用（下载前页数未知）
+    
+    # 解压资源限制（超过时任务立即失败，防止压缩炸弹占满磁盘或长时间占用工作线程，0表示不限制）
+    EXTRACT_MAX_TOTAL_BYTES = 20 * 1024 * 1024 * 1024  # 解压总量（包括嵌套压缩包，20GB）
+    EXTRACT_MAX_MEMBERS = 20000  # 解压文件数量
+    EXTRACT_MAX_RATIO = 100  # 解压总量与上传的压缩包大小之比（嵌套压缩包不计入分母）
+    EXTRACT_MAX_IMAGE_PIXELS = 200 * 1000 * 1000  # 单张图片像素数（按图片头中的尺寸）
+    EXTRACT_MAX_TOTAL_PIXELS = 20 * 1000 * 1000 * 1000  # 所有图片像素数之和
+    
+    # 转换前预览（只读取压缩包目录，按页生成缩略图）
+    PREVIEW_THUMB_SIZE = (240, 340)  # 默认缩略图最大尺寸（宽, 高）
+    PREVIEW_MAX_PAGE_BYTES = 64 * 1024 * 1024  # 超过该大小的页面不生成缩略图
+    PREVIEW_CACHE_MAX_ITEMS = 256  # 每个进程缓存的缩略图数量
+    PREVIEW_CACHE_MAX_BYTES = 32 * 1024 * 1024  # 每个进程缓存的缩略图总大小
 
 class DevelopmentConfig(Config):
     DEBUG = True
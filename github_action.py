@@ -35,6 +35,9 @@ def safe_remove(path):
 def download_jm_comic(jm_id, download_dir):
     """
     使用JMComic下载漫画 - 兼容最新版本
+    
+    Returns:
+        list: 下载目录中按自然顺序排序的图片路径列表，失败时返回None
     """
     try:
         print(f"📥 开始下载JM漫画 {jm_id}...")
@@ -78,12 +81,9 @@ def download_jm_comic(jm_id, download_dir):
         downloader = JmDownloader(option)
         downloader.download_album(jm_id)
         
-        # 查找图片文件
-        image_files = []
-        for root, dirs, files in os.walk(comic_dir):
-            for file in files:
-                if file.lower().endswith(('.jpg', '.jpeg', '.png', '.webp', '.bmp', '.gif')):
-                    image_files.append(os.path.join(root, file))
+        # 查找图片文件（按文件名自然排序）
+        from utils.image_processor import ImageProcessor
+        image_files = ImageProcessor().collect_image_list(comic_dir)
         
         if not image_files:
             print("❌ 未找到下载的图片文件")
@@ -107,26 +107,8 @@ def download_jm_comic(jm_id, download_dir):
         
         print(f"✅ 找到 {len(image_files)} 张图片")
         
-        # 按文件名自然排序
-        import re
-        image_files.sort(key=lambda x: [int(text) if text.isdigit() else text.lower() 
-                                      for text in re.split(r'(\d+)', x)])
-        
-        # 创建ZIP文件
-        import zipfile
-        zip_path = os.path.join(download_dir, f"jm_{jm_id}.zip")
-        
-        with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
-            for i, img_path in enumerate(image_files):
-                arcname = f"{i:04d}{Path(img_path).suffix}"
-                zipf.write(img_path, arcname)
-        
-        print(f"📦 漫画已打包为: {zip_path}")
-        
-        # 清理原始图片目录以节省空间
-        safe_remove(comic_dir)
-        
-        return zip_path
+        # 直接返回图片列表交给PDF生成，不再打包成ZIP再解压
+        return image_files
         
     except Exception as e:
         print(f"❌ 下载JM漫画失败: {e}")
@@ -165,13 +147,20 @@ def process_images_to_pdf_directly(image_files, output_dir, base_name="comic"):
         # 处理图片
         status_callback("开始处理图片")
         processed_images = []
+        # 图片来自多个章节目录，文件名可能重复，每个来源目录使用单独的转换目录
+        convert_dirs = {}
         
         for i, img_path in enumerate(image_files):
             progress = (i + 1) / len(image_files) * 50  # 图片处理占50%进度
             status_callback(f"处理图片 {i+1}/{len(image_files)}", progress)
             
+            source_dir = os.path.dirname(img_path)
+            if source_dir not in convert_dirs:
+                convert_dirs[source_dir] = os.path.join(temp_dir, str(len(convert_dirs)))
+                os.makedirs(convert_dirs[source_dir], exist_ok=True)
+            
             # 转换图片格式
-            converted_path = image_processor.convert_to_supported_format(img_path, temp_dir)
+            converted_path = image_processor.convert_to_supported_format(img_path, convert_dirs[source_dir])
             if converted_path:
                 # 优化图片尺寸
                 optimized_path = image_processor.optimize_image_for_pdf(converted_path)
@@ -221,48 +210,6 @@ def process_images_to_pdf_directly(image_files, output_dir, base_name="comic"):
         traceback.print_exc()
         return None
 
-def extract_images_from_zip(zip_path, extract_dir):
-    """从ZIP文件中提取图片"""
-    try:
-        import zipfile
-        
-        print(f"📂 从ZIP文件提取图片: {Path(zip_path).name}")
-        
-        image_files = []
-        with zipfile.ZipFile(zip_path, 'r') as zip_ref:
-            # 获取所有文件列表
-            file_list = zip_ref.namelist()
-            
-            # 过滤图片文件
-            image_files_in_zip = [f for f in file_list if f.lower().endswith(('.jpg', '.jpeg', '.png', '.webp', '.bmp', '.gif'))]
-            
-            if not image_files_in_zip:
-                print("❌ ZIP文件中没有找到图片文件")
-                return None
-            
-            print(f"✅ 在ZIP中找到 {len(image_files_in_zip)} 张图片")
-            
-            # 提取文件
-            for i, file_info in enumerate(image_files_in_zip):
-                # 解压文件
-                zip_ref.extract(file_info, extract_dir)
-                extracted_path = os.path.join(extract_dir, file_info)
-                image_files.append(extracted_path)
-                
-                if (i + 1) % 10 == 0:  # 每10个文件显示一次进度
-                    print(f"📥 已提取 {i+1}/{len(image_files_in_zip)} 张图片")
-        
-        # 按文件名自然排序
-        import re
-        image_files.sort(key=lambda x: [int(text) if text.isdigit() else text.lower() 
-                                      for text in re.split(r'(\d+)', x)])
-        
-        return image_files
-        
-    except Exception as e:
-        print(f"❌ 提取ZIP文件失败: {e}")
-        return None
-
 def create_download_package(pdf_files, output_dir, jm_id):
     """创建下载包"""
     try:
@@ -275,19 +222,17 @@ def create_download_package(pdf_files, output_dir, jm_id):
             print(f"📄 单个PDF文件: {Path(pdf_files[0]).name}")
             return pdf_files[0]
         
-        # 多个PDF文件，打包成ZIP
-        import zipfile
+        # 多个PDF文件，打包成ZIP（PDF已压缩，自适应打包时直接存储）
+        from config import config
+        from utils.zip_packager import ZipPackager
         zip_filename = f"jm_{jm_id}_pdfs.zip"
         zip_path = os.path.join(output_dir, zip_filename)
         
         print(f"📦 打包 {len(pdf_files)} 个PDF文件...")
         
-        with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
-            for pdf_file in pdf_files:
-                if os.path.exists(pdf_file):
-                    arcname = Path(pdf_file).name
-                    zipf.write(pdf_file, arcname)
-                    print(f"   + {arcname}")
+        packager = ZipPackager.from_config(config['default'])
+        packager.set_status_callback(lambda msg, progress=None: print(f"   {msg}"))
+        packager.create_package(pdf_files, zip_path)
         
         if os.path.exists(zip_path) and os.path.getsize(zip_path) > 0:
             print(f"✅ 打包完成: {zip_filename}")
@@ -300,31 +245,19 @@ def create_download_package(pdf_files, output_dir, jm_id):
         print(f"❌ 创建下载包失败: {e}")
         return None
 
-def process_comic_directly(jm_id, zip_path, download_dir):
+def process_comic_directly(jm_id, image_files, download_dir):
     """
     直接处理漫画，不依赖Flask Web界面
     """
     try:
         print("🔄 开始直接处理漫画文件...")
+        print(f"✅ 共 {len(image_files)} 张图片")
         
-        # 创建临时提取目录
-        extract_dir = os.path.join(download_dir, f"extract_{jm_id}")
-        os.makedirs(extract_dir, exist_ok=True)
-        
-        # 从ZIP提取图片
-        image_files = extract_images_from_zip(zip_path, extract_dir)
-        if not image_files:
-            print("❌ 图片提取失败")
-            safe_remove(extract_dir)
-            return False
-        
-        print(f"✅ 成功提取 {len(image_files)} 张图片")
-        
-        # 直接转换为PDF
+        # 下载目录中的图片直接转换为PDF
         pdf_path = process_images_to_pdf_directly(image_files, download_dir, f"jm_{jm_id}")
         
-        # 清理临时文件
-        safe_remove(extract_dir)
+        # 清理下载的原始图片以节省空间
+        safe_remove(os.path.join(download_dir, f"jm_{jm_id}"))
         
         if pdf_path and os.path.exists(pdf_path):
             print(f"🎉 PDF生成成功: {Path(pdf_path).name}")
@@ -423,13 +356,13 @@ def main():
     
     try:
         # 下载漫画
-        zip_path = download_jm_comic(jm_id, 'download')
-        if not zip_path:
+        image_files = download_jm_comic(jm_id, 'download')
+        if not image_files:
             print("❌ 漫画下载失败")
             sys.exit(1)
         
         # 直接处理为PDF（不依赖Web界面）
-        success = process_comic_directly(jm_id, zip_path, 'download')
+        success = process_comic_directly(jm_id, image_files, 'download')
         
         if success:
             print("\n🎉 任务完成!")
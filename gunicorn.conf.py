@@ -0,0 +1,41 @@
+"""
+gunicorn配置
+
+工作进程数、线程数和监听地址可通过环境变量覆盖：
+GUNICORN_BIND、GUNICORN_WORKERS、GUNICORN_THREADS、GUNICORN_TIMEOUT
+
+多个工作进程之间需要协调的状态都保存在 task_state/ 中：任务状态（SharedTaskStore）、
+相同任务合并（SingleFlight）、磁盘空间预留（DiskBudget）、临时目录分配（ScratchPool）
+和漫画缓存统计（AlbumCache）。内存预算（MemoryBudget）按进程计算，总量约为 工作进程数 × 预算。
+"""
+import os
+import multiprocessing
+
+bind = os.environ.get('GUNICORN_BIND') or '0.0.0.0:5000'
+workers = int(os.environ.get('GUNICORN_WORKERS') or min(multiprocessing.cpu_count(), 4))
+threads = int(os.environ.get('GUNICORN_THREADS') or 8)
+worker_class = 'gthread'
+
+# 主进程先导入应用（wsgi.py 中预加载编解码器），工作进程fork后共享
+preload_app = True
+
+# 下载结果可能较大，请求超时时间放宽
+timeout = int(os.environ.get('GUNICORN_TIMEOUT') or 120)
+# 平滑重启时等待正在发送的响应完成
+graceful_timeout = 60
+
+# 不使用 max_requests：按请求数重启会中断进程内正在执行的后台任务，
+# 工作进程改为在后台任务全部完成后自行重启（见 Config.WORKER_MAX_TASKS）
+
+
+def post_worker_init(worker):
+    """工作进程启动后：启用按任务数回收，并恢复未完成的任务（每个检查点只由一个进程恢复）"""
+    from config import config
+    from app import resume_pending_tasks
+    from utils.worker_lifecycle import task_tracker
+
+    task_tracker.enable_recycle(config['default'].WORKER_MAX_TASKS)
+
+    resumed = resume_pending_tasks()
+    if resumed:
+        worker.log.info(f"工作进程 {worker.pid} 恢复了 {resumed} 个未完成的任务")
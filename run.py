@@ -12,27 +12,26 @@ import argparse
 import subprocess
 import tempfile
 import shutil
-import re
-from pathlib import Path
 from utils.file_utils import FileUtils
 
 def check_dependencies():
-    """检查必要的依赖包"""
-    required_packages = [
-        'flask',
-        'pillow',
-        'img2pdf',
-        'python-magic',
-        'rarfile',
-        'py7zr'
-    ]
+    """检查必要的依赖包（只查找模块，不导入）"""
+    import importlib.util
+    
+    # 包名 -> 模块名
+    required_packages = {
+        'flask': 'flask',
+        'pillow': 'PIL',
+        'img2pdf': 'img2pdf',
+        'python-magic': 'magic',
+        'rarfile': 'rarfile',
+        'py7zr': 'py7zr'
+    }
 
     missing_packages = []
 
-    for package in required_packages:
-        try:
-            __import__(package.replace('-', '_'))
-        except ImportError:
+    for package, module_name in required_packages.items():
+        if importlib.util.find_spec(module_name) is None:
             missing_packages.append(package)
 
     if missing_packages:
@@ -59,53 +58,72 @@ def setup_download_directory():
 def cleanup_temp_files(task_id=None):
     """清理临时文件"""
     try:
-        from app import app
-        from utils.file_utils import FileUtils
+        # 只需要目录配置，不导入Flask应用
+        from config import config
+        config_obj = config['default']
         
         if task_id:
             # 清理指定任务的文件
             FileUtils.cleanup_task_files(
                 task_id,
-                app.config['UPLOAD_FOLDER'],
-                app.config['TEMP_FOLDER'],
-                app.config['OUTPUT_FOLDER']
+                config_obj.UPLOAD_FOLDER,
+                config_obj.TEMP_FOLDER,
+                config_obj.OUTPUT_FOLDER
             )
             print(f"已清理任务 {task_id} 的临时文件")
         else:
-            # 清理所有临时文件
-            FileUtils.cleanup_old_files(app.config['UPLOAD_FOLDER'], hours_old=0)
-            FileUtils.cleanup_old_files(app.config['TEMP_FOLDER'], hours_old=0)
-            print("已清理所有临时文件")
+            # 按产物索引清理过期的产物（正在执行的任务的产物不会被删除）
+            from cleanup import create_janitor
+            stats = create_janitor(config_obj).run_once()
+            print(f"已清理过期产物 {stats['expired'] + stats['evicted']} 个, "
+                  f"释放 {stats['freed_bytes'] / (1024 * 1024):.1f} MB")
             
     except Exception as e:
         print(f"清理临时文件时出错: {e}")
 
-def download_jm_comic(jm_id, download_dir, max_retry=3):
+def download_jm_comic(jm_id, download_dir, max_retry=None, page_retry_callback=None, page_callback=None):
     """
     使用JMComic下载漫画到download目录，支持重试机制
+    
+    单张图片失败时按指数退避单独重试；整本重试时已下载完整的图片不会重新下载。
+    
+    Args:
+        jm_id: JM漫画ID
+        download_dir: 下载目录
+        max_retry: 最大重试次数（默认使用 Config.JM_MAX_RETRY）
+        page_retry_callback: 图片重试回调 page_retry_callback(page_name, attempt, error)
+        page_callback: 图片保存后的回调 page_callback(img_save_path)，用于边下载边转换
+    
+    Returns:
+        list: 下载目录中按自然顺序排序的图片路径列表，失败时返回None
     """
     import time as time_module
+    from config import config
+    from utils.album_cache import get_album_cache
+    from utils.retry_policy import RetryPolicy
+    
+    config_obj = config['default']
+    max_retry = max_retry or config_obj.JM_MAX_RETRY
+    album_retry_policy = RetryPolicy(max_retry=max_retry, base_delay=2)
+    page_retry_policy = RetryPolicy.from_config(config_obj, max_retry=max_retry)
+    
+    # 已缓存的漫画无需重新下载
+    album_cache = get_album_cache()
+    cached_pages = album_cache.get_pages(jm_id)
+    if cached_pages:
+        print(f"使用缓存的JM漫画 {jm_id}: {len(cached_pages)} 张图片")
+        return cached_pages
     
     for retry in range(max_retry):
         try:
             print(f"开始下载JM漫画 {jm_id}... (尝试 {retry + 1}/{max_retry})")
             
-            # 检查是否安装了jmcomic
+            # 检查是否安装了jmcomic（运行时不再自动安装）
             try:
-                import jmcomic
-                from jmcomic import JmOption, JmDownloader
+                from jmcomic import JmOption
             except ImportError:
-                print("未安装JMComic库，正在尝试安装...")
-                try:
-                    subprocess.check_call([sys.executable, "-m", "pip", "install", "jmcomic", "-i", "https://pypi.org/project"])
-                    import jmcomic
-                    from jmcomic import JmOption, JmDownloader
-                except Exception as install_error:
-                    print(f"安装JMComic失败: {install_error}")
-                    if retry == max_retry - 1:
-                        return None
-                    time_module.sleep(2)
-                    continue
+                print("未安装JMComic库，请运行: pip install -r requirements.txt")
+                return None
             
             # 在download目录下创建漫画子目录
             comic_dir = os.path.join(download_dir, f"jm_{jm_id}")
@@ -119,8 +137,9 @@ def download_jm_comic(jm_id, download_dir, max_retry=3):
                 option_dict = {
                     'dir_rule': {'base_dir': comic_dir},
                     'download': {
-                        'image': {'suffix': '.jpg'},
-                        'threading': {'image': 3}
+                        'cache': True,  # 重试时跳过已下载的图片
+                        'image': {'suffix': config_obj.JM_IMAGE_SUFFIX},
+                        'threading': {'image': config_obj.JM_IMAGE_CONCURRENCY}
                     }
                 }
                 
@@ -132,17 +151,22 @@ def download_jm_comic(jm_id, download_dir, max_retry=3):
                 # 方式2: 使用默认配置并修改目录
                 option = JmOption.default()
                 option.dir_rule.base_dir = comic_dir
+                option.download.threading.image = config_obj.JM_IMAGE_CONCURRENCY
             
-            # 创建下载器并下载
-            downloader = JmDownloader(option)
+            # 创建下载器并下载（图片默认通过共享连接池下载）
+            from utils.jm_downloader import create_jm_downloader
+            downloader = create_jm_downloader(
+                option,
+                config_obj.JM_DOWNLOAD_ENGINE,
+                retry_policy=page_retry_policy,
+                page_retry_callback=page_retry_callback,
+                page_callback=page_callback
+            )
             downloader.download_album(jm_id)
             
-            # 查找下载的图片文件
-            image_files = []
-            for root, dirs, files in os.walk(comic_dir):
-                for file in files:
-                    if file.lower().endswith(('.jpg', '.jpeg', '.png', '.webp', '.bmp', '.gif')):
-                        image_files.append(os.path.join(root, file))
+            # 查找下载的图片文件（按文件名自然排序）
+            from utils.image_processor import ImageProcessor
+            image_files = ImageProcessor().collect_image_list(comic_dir)
             
             if not image_files:
                 print("未找到下载的图片文件")
@@ -158,28 +182,19 @@ def download_jm_comic(jm_id, download_dir, max_retry=3):
                 
                 if retry == max_retry - 1:
                     return None
-                print(f"等待2秒后重试...")
-                time_module.sleep(2)
+                wait_time = album_retry_policy.get_delay(retry)
+                print(f"等待{wait_time:.1f}秒后重试...")
+                time_module.sleep(wait_time)
                 continue
             
             print(f"找到 {len(image_files)} 张图片")
             
-            # 按文件名自然排序
-            image_files.sort(key=lambda x: [int(text) if text.isdigit() else text.lower()
-                                          for text in re.split(r'(\d+)', x)])
-            
-            # 创建ZIP文件用于后续处理
-            import zipfile
-            zip_path = os.path.join(download_dir, f"jm_{jm_id}.zip")
-            
-            with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
-                for i, img_path in enumerate(image_files):
-                    # 确保文件名格式统一
-                    arcname = f"{i:04d}{Path(img_path).suffix}"
-                    zipf.write(img_path, arcname)
-            
-            print(f"漫画已打包为: {zip_path}")
-            return zip_path
+            # 图片加入缓存，返回缓存中的图片列表交给PDF生成
+            try:
+                image_files = album_cache.put_pages(jm_id, image_files, comic_dir)
+            except Exception as e:
+                print(f"写入缓存失败: {e}")
+            return image_files
             
         except Exception as e:
             print(f"下载JM漫画失败: {e}")
@@ -190,8 +205,8 @@ def download_jm_comic(jm_id, download_dir, max_retry=3):
                 print(f"已达到最大重试次数 ({max_retry})，下载失败")
                 return None
             
-            wait_time = (retry + 1) * 5  # 递增等待时间
-            print(f"等待{wait_time}秒后重试...")
+            wait_time = album_retry_policy.get_delay(retry)  # 指数退避 + 随机抖动
+            print(f"等待{wait_time:.1f}秒后重试...")
             time_module.sleep(wait_time)
     
     return None
@@ -200,99 +215,49 @@ def process_jm_comic(jm_id):
     """
     处理JM漫画下载和转换
     """
+    from utils.album_cache import get_album_cache
+    
+    # 转换完成前缓存条目不会被淘汰
+    album_cache = get_album_cache()
+    album_cache.pin(jm_id, f"cli_{os.getpid()}")
     try:
-        from app import app, process_compressed_file, processing_status, processing_results
-        import uuid
-        
         # 设置下载目录
         download_dir = setup_download_directory()
         
         # 下载漫画
-        zip_path = download_jm_comic(jm_id, download_dir)
-        if not zip_path:
+        image_files = download_jm_comic(jm_id, download_dir)
+        if not image_files:
             print("漫画下载失败")
             return False
         
-        # 生成任务ID
-        task_id = str(uuid.uuid4())
+        print("开始处理漫画文件...")
+        
+        # 下载目录中的图片直接生成PDF
+        pdf_path = process_comic_to_pdf(image_files, jm_id)
+        if not pdf_path:
+            print("\n✗ 处理失败")
+            return False
         
-        # 设置输出目录为download目录
-        output_dir = download_dir
+        print("\n✓ 处理完成!")
         
-        print("开始处理漫画文件...")
+        # 显示结果
+        pdf_size = os.path.getsize(pdf_path) / (1024 * 1024)  # MB
+        print(f"  📄 {os.path.basename(pdf_path)} ({pdf_size:.1f} MB)")
         
-        # 在后台线程中处理
-        thread = threading.Thread(
-            target=process_compressed_file,
-            args=(task_id, zip_path, output_dir)
-        )
-        thread.daemon = True
-        thread.start()
+        # 显示下载目录
+        print(f"\n📁 文件保存在: {download_dir}")
         
-        # 轮询处理状态
-        print("处理中", end="", flush=True)
-        max_wait_time = 600  # 最大等待时间10分钟
-        start_time = time.time()
+        # 询问是否打开目录
+        open_dir = input("\n是否打开下载目录? (y/n): ").lower().strip()
+        if open_dir in ['y', 'yes', '是']:
+            if sys.platform == "win32":
+                os.startfile(download_dir)
+            elif sys.platform == "darwin":
+                subprocess.Popen(["open", download_dir])
+            else:
+                subprocess.Popen(["xdg-open", download_dir])
         
-        while time.time() - start_time < max_wait_time:
-            if task_id in processing_status:
-                status = processing_status[task_id]
-                
-                if status['status'] == '处理完成':
-                    print("\n✓ 处理完成!")
-                    
-                    # 显示结果
-                    if task_id in processing_results:
-                        result = processing_results[task_id]
-                        pdf_files = result.get('pdf_files', [])
-                        zip_file = result.get('zip_file')
-                        
-                        print(f"\n生成 {len(pdf_files)} 个PDF文件:")
-                        for pdf in pdf_files:
-                            pdf_size = os.path.getsize(pdf) / (1024 * 1024)  # MB
-                            print(f"  📄 {os.path.basename(pdf)} ({pdf_size:.1f} MB)")
-                        
-                        if zip_file and os.path.exists(zip_file):
-                            zip_size = os.path.getsize(zip_file) / (1024 * 1024)  # MB
-                            print(f"\n📦 完整包: {os.path.basename(zip_file)} ({zip_size:.1f} MB)")
-                            
-                        # 显示下载目录
-                        print(f"\n📁 文件保存在: {download_dir}")
-                        
-                        # 询问是否打开目录
-                        open_dir = input("\n是否打开下载目录? (y/n): ").lower().strip()
-                        if open_dir in ['y', 'yes', '是']:
-                            if sys.platform == "win32":
-                                os.startfile(download_dir)
-                            elif sys.platform == "darwin":
-                                subprocess.Popen(["open", download_dir])
-                            else:
-                                subprocess.Popen(["xdg-open", download_dir])
-                    
-                    # 清理临时文件
-                    cleanup_choice = input("\n是否清理临时文件? (y/n): ").lower().strip()
-                    if cleanup_choice in ['y', 'yes', '是']:
-                        cleanup_temp_files(task_id)
-                    
-                    return True
-                    
-                elif status['status'] == '错误':
-                    print(f"\n✗ 处理失败: {status.get('error', '未知错误')}")
-                    # 清理临时文件
-                    cleanup_temp_files(task_id)
-                    return False
-                
-                # 显示进度
-                progress = status.get('progress', 0)
-                current_step = status.get('current_step', '')
-                if progress > 0:
-                    print(f"\r处理中: {progress}% - {current_step}", end="", flush=True)
-                    
-            time.sleep(2)
-        
-        print(f"\n⏰ 处理超时（超过{max_wait_time//60}分钟）")
-        cleanup_temp_files(task_id)
-        return False
+        return True
             
     except Exception as e:
         print(f"\n❌ 处理过程中出错: {e}")
@@ -300,11 +265,18 @@ def process_jm_comic(jm_id):
         traceback.print_exc()
         cleanup_temp_files()
         return False
+    finally:
+        album_cache.unpin(jm_id, f"cli_{os.getpid()}")
 
 def start_web_app():
     """启动Web应用"""
     try:
-        from app import app
+        from app import app, resume_pending_tasks
+        
+        # 恢复进程重启前未完成的任务
+        resumed = resume_pending_tasks()
+        if resumed:
+            print(f"已恢复 {resumed} 个未完成的任务")
         
         print("启动Flask应用...")
         print("应用地址: http://localhost:5000")
@@ -326,6 +298,18 @@ def start_web_app():
         print(f"启动失败: {e}")
         return False
 
+def start_production_server():
+    """使用gunicorn启动生产环境服务（多进程，配置见 gunicorn.conf.py）"""
+    root_dir = os.path.dirname(os.path.abspath(__file__))
+    os.chdir(root_dir)
+    command = [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'wsgi:application']
+    print(f"启动生产服务: {' '.join(command)}")
+    try:
+        os.execv(sys.executable, command)
+    except OSError as e:
+        print(f"启动失败（请确认已安装gunicorn）: {e}")
+        return False
+
 def cleanup_all_downloads():
     """清理所有下载文件（可选功能）"""
     try:
@@ -418,21 +402,42 @@ def setup_download_directory():
     return download_dir
 
 def download_jm_comic_batch(jm_ids):
-    """批量下载JM漫画"""
+    """批量下载JM漫画（按 JM_DOWNLOAD_THREADS 并发下载）"""
     try:
+        from config import config
+        from utils.album_cache import get_album_cache
+        from utils.batch_executor import PipelinedBatchExecutor
+        
         download_dir = setup_download_directory()
-        results = []
         
         print(f"开始批量下载 {len(jm_ids)} 个漫画...")
         
-        for i, jm_id in enumerate(jm_ids):
-            print(f"\n[{i+1}/{len(jm_ids)}] 下载漫画 {jm_id}...")
-            
-            zip_path = download_jm_comic(jm_id, download_dir)
-            if zip_path:
+        def download(jm_id, _):
+            # 转换完成前缓存条目不会被淘汰（process_jm_batch 中释放）
+            get_album_cache().pin(jm_id, f"cli_{os.getpid()}")
+            return download_jm_comic(jm_id, download_dir)
+        
+        def on_status(jm_id, status, error=None):
+            if status == 'downloading':
+                print(f"\n下载漫画 {jm_id}...")
+            elif status == 'failed':
+                print(f"\n漫画 {jm_id} {error}")
+        
+        executor = PipelinedBatchExecutor(
+            download,
+            download_workers=config['default'].JM_DOWNLOAD_THREADS
+        )
+        executor.set_status_callback(on_status)
+        downloaded = executor.run([(jm_id, jm_id) for jm_id in jm_ids])
+        
+        # 保持与输入相同的顺序
+        results = []
+        for jm_id in jm_ids:
+            image_files = downloaded.get(jm_id)
+            if image_files:
                 results.append({
                     'jm_id': jm_id,
-                    'zip_path': zip_path,
+                    'image_files': image_files,
                     'status': '成功'
                 })
             else:
@@ -465,32 +470,33 @@ def process_jm_batch(results):
             print("失败的漫画ID:", ', '.join([r['jm_id'] for r in failed]))
         
         # 处理成功的漫画
+        from utils.album_cache import get_album_cache
         pdf_files = []
         for result in successful:
             print(f"\n处理漫画 {result['jm_id']}...")
             
             # 转换为PDF
-            pdf_path = process_comic_to_pdf(result['zip_path'], result['jm_id'])
+            pdf_path = process_comic_to_pdf(result['image_files'], result['jm_id'])
             if pdf_path:
                 pdf_files.append(pdf_path)
+        for result in results:
+            get_album_cache().unpin(result['jm_id'], f"cli_{os.getpid()}")
         
         # 打包所有PDF
         if pdf_files:
             print(f"\n打包 {len(pdf_files)} 个PDF文件...")
             
-            import zipfile
             from datetime import datetime
+            from config import config
+            from utils.zip_packager import ZipPackager
             
             timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
             zip_filename = f"jm_comics_batch_{timestamp}.zip"
             zip_path = os.path.join('download', zip_filename)
             
-            with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
-                for pdf_file in pdf_files:
-                    if os.path.exists(pdf_file):
-                        arcname = os.path.basename(pdf_file)
-                        zipf.write(pdf_file, arcname)
-                        print(f"  + {arcname}")
+            packager = ZipPackager.from_config(config['default'])
+            packager.set_status_callback(lambda msg, progress=None: print(f"  {msg}"))
+            packager.create_package(pdf_files, zip_path)
             
             print(f"\n✅ 批量处理完成！")
             print(f"📦 打包文件: {zip_path}")
@@ -505,64 +511,35 @@ def process_jm_batch(results):
         traceback.print_exc()
         return None
 
-def process_comic_to_pdf(zip_path, jm_id):
-    """将漫画ZIP转换为PDF"""
+def process_comic_to_pdf(image_files, jm_id, download_dir='download'):
+    """
+    将下载的漫画图片直接转换为PDF
+    
+    Args:
+        image_files: 已排序的图片路径列表
+        jm_id: JM漫画ID
+        download_dir: 下载目录（PDF输出到该目录）
+    
+    Returns:
+        str: PDF路径，失败时返回None
+    """
     try:
-        # 创建临时目录
-        temp_dir = os.path.join('temp', f"jm_{jm_id}_{str(uuid.uuid4())[:8]}")
-        os.makedirs(temp_dir, exist_ok=True)
-        
-        # 导入必要的模块
-        from utils.compression import CompressionHandler
-        from utils.image_processor import ImageProcessor
         from utils.pdf_generator import PDFGenerator
         
-        # 解压
-        print("  解压文件...")
-        compression_handler = CompressionHandler()
-        extracted_files = compression_handler._extract_zip(zip_path, temp_dir)
-        
-        if not extracted_files:
-            print("  ❌ 解压失败")
-            return None
-        
-        # 处理图片
-        print("  处理图片...")
-        image_processor = ImageProcessor()
-        image_groups = image_processor.collect_and_sort_images(temp_dir)
-        
-        if not image_groups:
-            print("  ❌ 未找到图片文件")
-            return None
-        
         # 生成PDF
         print("  生成PDF...")
         pdf_generator = PDFGenerator()
-        output_dir = os.path.join('download', f"jm_{jm_id}")
-        os.makedirs(output_dir, exist_ok=True)
+        pdf_path = os.path.join(download_dir, f"jm_{jm_id}.pdf")
         
-        generated_pdfs = pdf_generator.generate_pdfs_by_folder(
-            image_groups, 
-            output_dir,
-            base_name=f"jm_{jm_id}"
-        )
-        
-        if generated_pdfs:
-            pdf_path = list(generated_pdfs.values())[0]
+        if pdf_generator.generate_pdf_from_images(image_files, pdf_path):
             print(f"  ✅ PDF生成成功: {os.path.basename(pdf_path)}")
             
-            # 清理临时文件
-            try:
-                import shutil
-                if os.path.exists(temp_dir):
-                    shutil.rmtree(temp_dir)
-                if os.path.exists(zip_path):
-                    os.remove(zip_path)
-            except:
-                pass
+            # 清理下载的图片
+            FileUtils.safe_remove(os.path.join(download_dir, f"jm_{jm_id}"))
             
             return pdf_path
         
+        print("  ❌ PDF生成失败")
         return None
         
     except Exception as e:
@@ -584,6 +561,7 @@ def main():
     parser = argparse.ArgumentParser(description='JM漫画下载和PDF转换工具')
     parser.add_argument('jm_id', nargs='?', help='JM漫画ID')
     parser.add_argument('--web', action='store_true', help='启动Web界面')
+    parser.add_argument('--production', action='store_true', help='使用gunicorn启动生产环境服务')
     parser.add_argument('--cleanup', action='store_true', help='清理所有下载文件')
     parser.add_argument('--cleanup-temp', action='store_true', help='清理临时文件')
     parser.add_argument('--cleanup-all-temp', action='store_true', help='清理temp文件夹中的所有内容')
@@ -620,6 +598,9 @@ def main():
     elif args.web:
         # 启动Web应用
         start_web_app()
+    elif args.production:
+        # 启动生产环境服务
+        start_production_server()
     elif args.jm_id:
         # 直接处理指定的JM漫画
         if not args.jm_id.isdigit():
@@ -0,0 +1,14 @@
+import importlib
+
+import pytest
+
+
+@pytest.fixture(scope='session')
+def app_module(tmp_path_factory):
+    """在临时目录中导入app（上传、输出、状态等目录都是相对路径，app只导入一次）"""
+    work_dir = tmp_path_factory.mktemp('app')
+    with pytest.MonkeyPatch.context() as mp:
+        mp.chdir(work_dir)
+        module = importlib.import_module('app')
+        mp.setitem(module.app.config, 'DISK_WAIT_TIMEOUT', 0)
+        yield module
@@ -0,0 +1,94 @@
+import os
+import time
+
+from utils.album_cache import AlbumCache
+
+
+def _download(tmp_path, jm_id, count=3, size=1024):
+    source_dir = tmp_path / f"download_{jm_id}_{time.time_ns()}"
+    source_dir.mkdir()
+    pages = []
+    for i in range(count):
+        page = source_dir / f"{i + 1:05d}.jpg"
+        page.write_bytes(os.urandom(size))
+        pages.append(str(page))
+    return pages, str(source_dir)
+
+
+def test_pinned_entry_is_not_evicted(tmp_path):
+    cache = AlbumCache(str(tmp_path / 'cache'), max_bytes=20 * 1024)
+    cache.pin('1', 'task_a')
+    pages_1 = cache.put_pages('1', *_download(tmp_path, '1', size=4096))
+    cache.pin('2', 'task_b')
+    pages_2 = cache.put_pages('2', *_download(tmp_path, '2', size=4096))
+
+    # 总大小超过上限，但两个条目都在使用中
+    assert all(os.path.exists(page) for page in pages_1 + pages_2)
+
+    cache.unpin('1', 'task_a')
+    cache.unpin('2', 'task_b')
+    cache.evict()
+    assert not os.path.exists(pages_1[0])
+    assert cache.get_pages('2') == pages_2
+
+
+def test_replacing_pages_keeps_pinned_version(tmp_path):
+    cache = AlbumCache(str(tmp_path / 'cache'))
+    old_pages = cache.put_pages('1', *_download(tmp_path, '1'))
+    cache.pin('1', 'task_a')
+
+    new_pages = cache.put_pages('1', *_download(tmp_path, '1'))
+
+    assert os.path.dirname(new_pages[0]) != os.path.dirname(old_pages[0])
+    assert all(os.path.exists(page) for page in old_pages)
+    assert cache.get_pages('1') == new_pages
+
+    cache.unpin('1', 'task_a')
+    cache.evict()
+    assert not os.path.exists(os.path.dirname(old_pages[0]))
+    assert all(os.path.exists(page) for page in new_pages)
+
+
+def test_lease_of_exited_process_is_ignored(tmp_path):
+    cache = AlbumCache(str(tmp_path / 'cache'), max_bytes=0)
+    pages = cache.put_pages('1', *_download(tmp_path, '1'))
+    cache.pin('1', 'task_a')
+    lease_path = os.path.join(cache._lease_dir(cache.make_key('1')), 'task_a')
+    with open(lease_path, 'w') as f:
+        # 不存在的进程号
+        f.write(str(2 ** 22 + 1))
+
+    cache.evict()
+
+    assert not os.path.exists(pages[0])
+    assert cache.get_pages('1') is None
+
+
+def test_stats_are_shared_between_instances(tmp_path):
+    cache_dir = str(tmp_path / 'cache')
+    first, second = AlbumCache(cache_dir), AlbumCache(cache_dir)
+    first.put_pages('1', *_download(tmp_path, '1'))
+
+    assert first.get_pages('1')
+    assert second.get_pages('2') is None
+
+    # 两个实例（模拟两个工作进程）看到相同的合计
+    assert first.get_stats() == second.get_stats() == {'hits': 1, 'misses': 1, 'hit_ratio': 0.5}
+
+
+def test_lookup_is_counted_once_per_album(tmp_path):
+    cache = AlbumCache(str(tmp_path / 'cache'))
+
+    # 未命中：先查PDF再查图片（下载前），只计一次未命中
+    assert cache.get_pdf('1') is None
+    assert cache.get_pages('1') is None
+    assert cache.get_stats()['misses'] == 1
+
+    pages, source_dir = _download(tmp_path, '1')
+    cache.put_pages('1', pages, source_dir)
+    pdf_path = tmp_path / 'album.pdf'
+    pdf_path.write_bytes(b'%PDF-1.4')
+    cache.put_pdf('1', str(pdf_path))
+
+    assert cache.get_pdf('1')
+    assert cache.get_stats() == {'hits': 1, 'misses': 1, 'hit_ratio': 0.5}
@@ -0,0 +1,87 @@
+import os
+
+from utils.artifact_index import ArtifactIndex, ArtifactJanitor
+
+
+class _FakeDiskJanitor(ArtifactJanitor):
+    """磁盘使用量 = 其他文件占用 + 产物目录中的实际文件大小"""
+
+    def __init__(self, index, artifact_root, other_bytes, total_bytes, **kwargs):
+        super().__init__(index, **kwargs)
+        self.artifact_root = artifact_root
+        self.other_bytes = other_bytes
+        self.total_bytes = total_bytes
+        self.usage_reads = 0
+
+    def _disk_usage(self):
+        self.usage_reads += 1
+        used = self.other_bytes
+        for root, dirs, files in os.walk(self.artifact_root):
+            used += sum(os.path.getsize(os.path.join(root, f)) for f in files)
+        return used, self.total_bytes
+
+
+def _make_dir(root, name, nbytes):
+    directory = os.path.join(root, name)
+    os.makedirs(directory)
+    with open(os.path.join(directory, 'data.bin'), 'wb') as f:
+        f.write(b'0' * nbytes)
+    return directory
+
+
+def test_refresh_sizes_records_directory_size(tmp_path):
+    index = ArtifactIndex(str(tmp_path / 'artifacts.db'))
+    directory = _make_dir(str(tmp_path), 'pdfs_task', 1234)
+    index.register(directory, 'task', ArtifactIndex.KIND_OUTPUT)
+    index.register(str(tmp_path / 'gone'), 'task', ArtifactIndex.KIND_TEMP)
+
+    index.refresh_sizes('task')
+
+    sizes = {a['path']: a['bytes'] for a in index.iter_by_access()}
+    assert sizes[os.path.abspath(directory)] == 1234
+    assert sizes[os.path.abspath(str(tmp_path / 'gone'))] == 0
+
+
+def test_bytes_by_kind(tmp_path):
+    index = ArtifactIndex(str(tmp_path / 'artifacts.db'))
+    index.register(str(tmp_path / 'a.zip'), 'task_a', ArtifactIndex.KIND_UPLOAD, 100)
+    index.register(str(tmp_path / 'b.zip'), 'task_b', ArtifactIndex.KIND_UPLOAD, 50)
+    index.register(str(tmp_path / 'pdfs_a'), 'task_a', ArtifactIndex.KIND_OUTPUT, 300)
+
+    assert index.bytes_by_kind() == {ArtifactIndex.KIND_UPLOAD: 150, ArtifactIndex.KIND_OUTPUT: 300}
+
+
+def test_lru_eviction_stops_at_low_watermark_with_unsized_artifacts(tmp_path):
+    index = ArtifactIndex(str(tmp_path / 'artifacts.db'))
+    artifact_root = str(tmp_path / 'artifacts')
+    # 目录在创建时登记，索引中的大小为0
+    directories = [_make_dir(artifact_root, f"temp_{i}", 100) for i in range(3)]
+    for i, directory in enumerate(directories):
+        index.register(directory, f"task_{i}", ArtifactIndex.KIND_TEMP)
+
+    janitor = _FakeDiskJanitor(
+        index, artifact_root, other_bytes=650, total_bytes=1000,
+        high_watermark=0.9, low_watermark=0.8
+    )
+    stats = janitor.run_once()
+
+    # 950 -> 850 -> 750，删除两个后低于80%
+    assert stats['evicted'] == 2
+    assert stats['freed_bytes'] == 200
+    assert [os.path.exists(d) for d in directories] == [False, False, True]
+
+
+def test_pinned_artifacts_are_kept(tmp_path):
+    index = ArtifactIndex(str(tmp_path / 'artifacts.db'))
+    artifact_root = str(tmp_path / 'artifacts')
+    running = _make_dir(artifact_root, 'running', 100)
+    index.register(running, 'running', ArtifactIndex.KIND_TEMP)
+
+    janitor = _FakeDiskJanitor(
+        index, artifact_root, other_bytes=950, total_bytes=1000,
+        ttl_hours={'temp': 0}, is_pinned=lambda task_id: task_id == 'running'
+    )
+    stats = janitor.run_once()
+
+    assert stats == {'expired': 0, 'evicted': 0, 'freed_bytes': 0}
+    assert os.path.exists(running)
@@ -0,0 +1,130 @@
+import json
+import os
+import threading
+import time
+
+from PIL import Image
+
+from utils.batch_executor import PipelinedBatchExecutor
+from utils.checkpoint import TaskCheckpoint
+
+
+def _write_pages(album_dir, count):
+    os.makedirs(album_dir, exist_ok=True)
+    pages = []
+    for i in range(count):
+        path = os.path.join(album_dir, f"{i + 1:05d}.jpg")
+        Image.new('RGB', (64, 96), (i * 40 % 256, 80, 160)).save(path, 'JPEG')
+        pages.append(path)
+    return pages
+
+
+def test_checkpoint_concurrent_updates(tmp_path):
+    checkpoint = TaskCheckpoint('batch', str(tmp_path), TaskCheckpoint.KIND_JM_BATCH, {})
+    errors = []
+
+    def record(worker):
+        try:
+            for i in range(50):
+                checkpoint.set_item(f"{worker}_{i}", {'files': []})
+                checkpoint.set_folder_pdf(f"{worker}/{i}", f"{worker}_{i}.pdf")
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=record, args=(worker,)) for worker in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert not errors
+    with open(checkpoint.path, encoding='utf-8') as f:
+        data = json.load(f)
+    assert len(data['items']) == 8 * 50
+    assert len(data['folders']) == 8 * 50
+
+
+def test_executor_overlaps_download_and_convert():
+    events = []
+    lock = threading.Lock()
+    first_converted = threading.Event()
+
+    def download(key, payload):
+        if key == 'slow':
+            # 第一个条目转换完成前，其余条目仍在下载
+            assert first_converted.wait(5)
+        if key == 'broken':
+            raise IOError('连接中断')
+        with lock:
+            events.append(('downloaded', key))
+        return payload * 2
+
+    def convert(key, payload, downloaded):
+        with lock:
+            events.append(('converted', key))
+        first_converted.set()
+        return downloaded + 1
+
+    statuses = {}
+    executor = PipelinedBatchExecutor(download, convert, download_workers=3, convert_workers=1)
+    executor.set_status_callback(lambda key, status, error=None: statuses.setdefault(key, []).append(status))
+
+    results = executor.run([('fast', 1), ('slow', 2), ('broken', 3)])
+
+    assert results == {'fast': 3, 'slow': 5, 'broken': None}
+    assert events.index(('converted', 'fast')) < events.index(('downloaded', 'slow'))
+    assert statuses['fast'] == ['downloading', 'downloaded', 'converting', 'done']
+    assert statuses['broken'] == ['downloading', 'failed']
+
+
+def test_jm_batch_task_with_stub_downloader(app_module):
+    batch_id = f"batch_{int(time.time() * 1000)}"
+    calls = []
+
+    def download_stub(jm_id, download_dir, max_retry=None, page_retry_callback=None, page_callback=None):
+        calls.append(jm_id)
+        if jm_id == '900002':
+            return None
+        pages = _write_pages(os.path.join(download_dir, f"jm_{jm_id}"), 3)
+        for page in pages:
+            page_callback(page)
+        return pages
+
+    app_module.process_jm_batch_task(batch_id, ['900001', '900002'], download_func=download_stub)
+
+    assert sorted(calls) == ['900001', '900002']
+    result = app_module.jm_processing_results[batch_id]
+    assert result['completed'] == 1
+    assert result['failed'] == 1
+    (task_result,) = result['results'].values()
+    pdf_path = task_result['files'][0]['path']
+    with open(pdf_path, 'rb') as f:
+        assert f.read(5) == b'%PDF-'
+
+    batch_info = app_module.jm_processing_tasks[batch_id]
+    assert batch_info['status'] == '部分完成'
+    assert not TaskCheckpoint.exists(batch_id, app_module.app.config['CHECKPOINT_FOLDER'])
+
+
+def test_jm_batch_task_with_duplicate_ids(app_module):
+    batch_id = f"batch_{int(time.time() * 1000)}_dup"
+    calls = []
+
+    def download_stub(jm_id, download_dir, max_retry=None, page_retry_callback=None, page_callback=None):
+        calls.append(jm_id)
+        time.sleep(0.2)
+        pages = _write_pages(os.path.join(download_dir, f"jm_{jm_id}"), 3)
+        for page in pages:
+            page_callback(page)
+        return pages
+
+    app_module.process_jm_batch_task(batch_id, ['900003', '900003'], download_func=download_stub)
+
+    # 重复的ID只下载一次，两个任务都使用同一份图片生成PDF
+    assert calls == ['900003']
+    result = app_module.jm_processing_results[batch_id]
+    assert result['completed'] == 2
+    assert result['failed'] == 0
+    # 最后一个任务结束后才删除下载目录
+    download_dir = app_module.setup_download_directory()
+    assert not os.path.exists(os.path.join(download_dir, 'jm_900003'))
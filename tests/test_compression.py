@@ -0,0 +1,145 @@
+import io
+import os
+import time
+import zipfile
+
+import pytest
+from PIL import Image
+
+from utils.compression import CompressionHandler
+
+
+def _jpeg_bytes(seed):
+    buffer = io.BytesIO()
+    Image.new('RGB', (48, 64), (seed * 7 % 256, seed * 13 % 256, 90)).save(buffer, 'JPEG')
+    return buffer.getvalue()
+
+
+def _make_zip(path, count):
+    with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as zipf:
+        for i in range(count):
+            zipf.writestr(f"chapter_{i // 10}/{i:03d}.jpg", _jpeg_bytes(i))
+    return str(path)
+
+
+def _relative(paths, root):
+    return [os.path.relpath(path, root) for path in paths]
+
+
+def test_parallel_zip_ranges_match_serial(tmp_path):
+    archive = _make_zip(tmp_path / 'pages.zip', 40)
+    serial_dir, parallel_dir = str(tmp_path / 'serial'), str(tmp_path / 'parallel')
+
+    serial = CompressionHandler(zip_workers=1)._extract_zip(archive, serial_dir)
+    handler = CompressionHandler(zip_workers=4, zip_parallel_min_bytes=0)
+    assert len(handler._split_zip_members(zipfile.ZipFile(archive).infolist())) == 4
+    parallel = handler._extract_zip(archive, parallel_dir)
+
+    assert len(serial) == 40
+    assert _relative(parallel, parallel_dir) == _relative(serial, serial_dir)
+    for serial_path, parallel_path in zip(serial, parallel):
+        with open(serial_path, 'rb') as a, open(parallel_path, 'rb') as b:
+            assert a.read() == b.read()
+
+
+def test_failing_range_stops_other_ranges(tmp_path, monkeypatch):
+    archive = _make_zip(tmp_path / 'pages.zip', 40)
+    handler = CompressionHandler(zip_workers=4, zip_parallel_min_bytes=0)
+    original = CompressionHandler._stream_member
+    streamed = []
+
+    def stream_member(self, source, name, size, extract_to):
+        if name == 'chapter_1/011.jpg':
+            raise OSError('disk error')
+        time.sleep(0.02)
+        streamed.append(name)
+        return original(self, source, name, size, extract_to)
+
+    monkeypatch.setattr(CompressionHandler, '_stream_member', stream_member)
+    # 第二段的第一个成员写入失败
+    assert handler._split_zip_members(zipfile.ZipFile(archive).infolist())[1][0].filename == 'chapter_1/011.jpg'
+
+    with pytest.raises(Exception, match='disk error'):
+        handler._extract_zip(archive, str(tmp_path / 'out'))
+    # 其他线程在失败后停止，不会解压完剩余的成员
+    assert len(streamed) < 20
+
+
+# 模拟unrar：按列表文件写入成员，输出预设的内容（{name} 替换为成员名称），以指定返回码退出
+_FAKE_UNRAR = '''#!{python}
+import json, os, sys
+args = sys.argv[1:]
+list_path = next(arg[1:] for arg in args if arg.startswith('@'))
+target = args[-1]
+with open(list_path, encoding='utf-8') as f:
+    names = f.read().splitlines()
+with open({record!r}, 'w', encoding='utf-8') as f:
+    json.dump({{'args': args, 'names': names}}, f)
+fail = {fail!r}
+for name in names:
+    if name == fail:
+        print('Extracting  ' + name + '                 ')
+        print(name + ' - checksum error')
+        continue
+    path = os.path.join(target, name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as out:
+        out.write(b'page')
+    print('Extracting  ' + name + '                         OK ')
+    sys.stdout.flush()
+if fail:
+    print('Total errors: 1')
+    sys.exit(3)
+print('All OK')
+'''
+
+
+def _fake_unrar(tmp_path, fail=None):
+    import json
+    import stat
+    import sys
+
+    record = str(tmp_path / 'unrar_call.json')
+    script = tmp_path / 'unrar'
+    script.write_text(_FAKE_UNRAR.format(python=sys.executable, record=record, fail=fail), encoding='utf-8')
+    script.chmod(script.stat().st_mode | stat.S_IEXEC)
+
+    def read_call():
+        with open(record, encoding='utf-8') as f:
+            return json.load(f)
+    return str(script), read_call
+
+
+def test_unrar_batch_output_parsing(tmp_path):
+    unrar, read_call = _fake_unrar(tmp_path)
+    names = ['第1话/001.jpg', 'chapter 2/page 002.jpg', '003.jpg']
+    extract_to = str(tmp_path / 'out')
+    handler = CompressionHandler()
+    statuses = []
+    handler.set_status_callback(lambda message, progress=None: statuses.append((message, progress)))
+
+    files = handler._extract_rar_batch(unrar, str(tmp_path / 'book.rar'), names, extract_to)
+
+    assert files == [os.path.join(extract_to, name) for name in names]
+    # 每个完成行更新一次进度，名称中的空格和中文原样解析
+    assert [message for message, _ in statuses] == [f"解压RAR文件: {name}" for name in names]
+    assert [progress for _, progress in statuses] == pytest.approx([100 / 3, 200 / 3, 100])
+    call = read_call()
+    assert call['names'] == names
+    assert call['args'][-1] == os.path.join(os.path.abspath(extract_to), '')
+    # 列表文件使用后删除
+    list_path = next(arg[1:] for arg in call['args'] if arg.startswith('@'))
+    assert not os.path.exists(list_path)
+
+
+def test_unrar_batch_failed_member(tmp_path):
+    unrar, read_call = _fake_unrar(tmp_path, fail='chapter 2/page 002.jpg')
+    names = ['第1话/001.jpg', 'chapter 2/page 002.jpg', '003.jpg']
+
+    with pytest.raises(Exception, match='unrar 返回 3') as error:
+        CompressionHandler()._extract_rar_batch(unrar, str(tmp_path / 'book.rar'), names, str(tmp_path / 'out'))
+
+    # 错误信息包含unrar输出的最后几行
+    assert 'checksum error' in str(error.value)
+    list_path = next(arg[1:] for arg in read_call()['args'] if arg.startswith('@'))
+    assert not os.path.exists(list_path)
@@ -0,0 +1,107 @@
+import collections
+import os
+import sqlite3
+
+import pytest
+
+from utils import disk_budget as disk_budget_module
+from utils.disk_budget import DiskBudget
+
+_Usage = collections.namedtuple('usage', 'total used free')
+
+
+@pytest.fixture
+def free_space(monkeypatch):
+    """固定磁盘可用空间，测试中修改 free_space['free'] 模拟写入"""
+    state = {'free': 1000}
+    monkeypatch.setattr(
+        disk_budget_module.shutil, 'disk_usage',
+        lambda path: _Usage(10000, 10000 - state['free'], state['free'])
+    )
+    return state
+
+
+def test_reservation_is_deducted_until_written(tmp_path, free_space):
+    budget = DiskBudget(str(tmp_path / 'artifacts.db'), root=str(tmp_path))
+
+    assert budget.try_reserve('a', 600)
+    assert budget.available() == 400
+    assert not budget.try_reserve('b', 500)
+
+    # 任务写入了300字节：可用空间减少300，预留只剩未写入的300
+    free_space['free'] -= 300
+    budget.update_written('a', 300)
+    assert budget.available() == 400
+    assert budget.try_reserve('b', 400)
+
+    budget.release('a')
+    budget.release('b')
+    assert budget.available() == 700
+
+
+def test_written_beyond_estimate_does_not_go_negative(tmp_path, free_space):
+    budget = DiskBudget(str(tmp_path / 'artifacts.db'), root=str(tmp_path))
+    assert budget.try_reserve('a', 100)
+
+    free_space['free'] -= 250
+    budget.update_written('a', 250)
+
+    assert budget.available() == 750
+    assert budget.can_ever_fit(750)
+    assert not budget.can_ever_fit(751)
+
+
+def test_reservation_of_exited_process_is_dropped(tmp_path, free_space):
+    budget = DiskBudget(str(tmp_path / 'artifacts.db'), root=str(tmp_path))
+    with sqlite3.connect(str(tmp_path / 'artifacts.db')) as conn:
+        conn.execute(
+            'INSERT INTO disk_reservations (task_id, volume, bytes, pid, created) VALUES (?, ?, ?, ?, 0)',
+            ('dead', DiskBudget.volume_of(str(tmp_path)), 900, 2 ** 22 + 1)
+        )
+
+    assert budget.available() == 1000
+
+
+def test_upgrades_table_from_older_version(tmp_path, free_space):
+    db_path = str(tmp_path / 'artifacts.db')
+    with sqlite3.connect(db_path) as conn:
+        conn.execute(
+            'CREATE TABLE disk_reservations (task_id TEXT PRIMARY KEY, bytes INTEGER, pid INTEGER, created REAL)'
+        )
+
+    budget = DiskBudget(db_path, root=str(tmp_path))
+    assert budget.try_reserve('a', 100)
+    budget.update_written('a', 40)
+    assert budget.available() == 940
+
+
+def test_reservations_are_per_volume(tmp_path, monkeypatch):
+    # scratch 和 output 模拟为两个卷，各有1000字节可用
+    free = {'scratch': 1000, 'output': 1000}
+    monkeypatch.setattr(
+        disk_budget_module.shutil, 'disk_usage',
+        lambda path: _Usage(10000, 10000 - free[os.path.basename(path)], free[os.path.basename(path)])
+    )
+    monkeypatch.setattr(DiskBudget, 'volume_of', staticmethod(lambda path: os.path.basename(path)))
+    scratch, output = str(tmp_path / 'scratch'), str(tmp_path / 'output')
+    budget = DiskBudget(str(tmp_path / 'artifacts.db'), root=output)
+
+    assert budget.try_reserve('a', {scratch: 800, output: 100})
+    assert budget.available(scratch) == 200
+    assert budget.available(output) == 900
+
+    # output 卷足够，但 scratch 卷放不下时整个预留失败
+    assert not budget.try_reserve('b', {scratch: 300, output: 100})
+    assert budget.available(output) == 900
+    assert budget.try_reserve('b', {scratch: 200, output: 800})
+
+    # 上限为可用空间加上其他任务的预留
+    assert not budget.can_ever_fit({scratch: 2001})
+    assert budget.can_ever_fit({scratch: 600, output: 400})
+
+    free['scratch'] -= 500
+    budget.update_written('a', {scratch: 500})
+    assert budget.available(scratch) == 0
+    budget.release('a')
+    assert budget.available(scratch) == 300
+    assert budget.available(output) == 200
@@ -0,0 +1,127 @@
+import io
+import os
+import struct
+import zipfile
+
+import pytest
+from PIL import Image
+
+from utils.compression import CompressionHandler
+from utils.extraction_guard import ExtractionGuard, ResourceLimitExceeded
+
+
+def _jpeg_bytes(size=(32, 48)):
+    buffer = io.BytesIO()
+    Image.new('RGB', size, (200, 100, 50)).save(buffer, 'JPEG')
+    return buffer.getvalue()
+
+
+def _write_zip(path, members, compression=zipfile.ZIP_DEFLATED):
+    with zipfile.ZipFile(path, 'w', compression) as zipf:
+        for name, data in members:
+            zipf.writestr(name, data)
+    return str(path)
+
+
+def test_byte_limit():
+    guard = ExtractionGuard(max_total_bytes=1000)
+    guard.add_bytes(600)
+    with pytest.raises(ResourceLimitExceeded):
+        guard.add_bytes(401)
+
+
+def test_declared_size_is_checked_before_writing():
+    guard = ExtractionGuard(max_total_bytes=1000)
+    with pytest.raises(ResourceLimitExceeded):
+        guard.add_member('big.jpg', 1001)
+    assert guard.total_bytes == 0
+
+
+def test_member_count_limit():
+    guard = ExtractionGuard(max_members=2)
+    guard.add_member('1.jpg')
+    guard.add_member('2.jpg')
+    with pytest.raises(ResourceLimitExceeded):
+        guard.add_member('3.jpg')
+
+
+def test_ratio_limit(monkeypatch):
+    monkeypatch.setattr(ExtractionGuard, 'RATIO_CHECK_MIN_BYTES', 100)
+    guard = ExtractionGuard(max_ratio=10)
+    guard.add_archive(50)
+    guard.add_bytes(500)
+    with pytest.raises(ResourceLimitExceeded):
+        guard.add_bytes(1)
+
+
+def test_pixel_limits():
+    guard = ExtractionGuard(max_image_pixels=100 * 100, max_total_pixels=3 * 100 * 100)
+    with pytest.raises(ResourceLimitExceeded):
+        guard.add_image(101, 100)
+    guard.add_image(100, 100)
+    guard.add_image(100, 100)
+    guard.add_image(100, 100)
+    with pytest.raises(ResourceLimitExceeded):
+        guard.add_image(1, 1)
+
+
+def test_small_zip_expanding_past_limit(tmp_path):
+    # 几KB的ZIP解压后超过1MB
+    archive = _write_zip(tmp_path / 'bomb.zip', [(f'{i}.jpg', b'\xff\xd8\xff' + b'\0' * 512 * 1024) for i in range(4)])
+    assert os.path.getsize(archive) < 16 * 1024
+    guard = ExtractionGuard(max_total_bytes=1024 * 1024)
+
+    with pytest.raises(ResourceLimitExceeded):
+        CompressionHandler(guard=guard).recursive_extract(archive, str(tmp_path / 'out'))
+    assert guard.total_bytes <= 1024 * 1024
+
+
+def test_nested_archive_size_does_not_raise_ratio(tmp_path, monkeypatch):
+    monkeypatch.setattr(ExtractionGuard, 'RATIO_CHECK_MIN_BYTES', 64 * 1024)
+    # 内层ZIP直接存储：外层很小，解压出的内层ZIP和其中的图片都计入解压总量
+    inner = _write_zip(tmp_path / 'inner.zip', [('1.jpg', b'\xff\xd8\xff' + b'\0' * 256 * 1024)])
+    with open(inner, 'rb') as f:
+        outer = _write_zip(tmp_path / 'outer.zip', [('inner.zip', f.read())])
+    ratio = 2 * os.path.getsize(inner) / os.path.getsize(outer)
+    guard = ExtractionGuard(max_ratio=int(ratio) - 1)
+
+    # 内层压缩包的大小计入分母时压缩比会被低估而放行
+    with pytest.raises(ResourceLimitExceeded):
+        CompressionHandler(guard=guard).recursive_extract(outer, str(tmp_path / 'out'))
+    assert guard.archive_bytes == os.path.getsize(outer)
+
+
+def _set_declared_size(archive, size):
+    """将ZIP中唯一成员的声明大小（本地文件头和中央目录）改为 size"""
+    with open(archive, 'r+b') as f:
+        data = bytearray(f.read())
+        local = data.index(b'PK\x03\x04')
+        struct.pack_into('<I', data, local + 22, size)
+        central = data.index(b'PK\x01\x02')
+        struct.pack_into('<I', data, central + 24, size)
+        f.seek(0)
+        f.write(data)
+
+
+def test_member_with_false_declared_size(tmp_path):
+    # 声明1KB，实际解压出2MB
+    archive = _write_zip(tmp_path / 'liar.zip', [('1.jpg', b'\xff\xd8\xff' + b'\0' * 2 * 1024 * 1024)])
+    _set_declared_size(archive, 1024)
+    guard = ExtractionGuard(max_total_bytes=1024 * 1024)
+
+    files = CompressionHandler(guard=guard).recursive_extract(archive, str(tmp_path / 'out'))
+
+    # 读取不超过声明的大小，CRC校验失败的成员不会返回
+    assert files == []
+    assert guard.total_bytes <= 1024
+    for root, dirs, names in os.walk(tmp_path / 'out'):
+        for name in names:
+            assert os.path.getsize(os.path.join(root, name)) <= 1024
+
+
+def test_image_pixels_checked_during_extraction(tmp_path):
+    archive = _write_zip(tmp_path / 'pages.zip', [('1.jpg', _jpeg_bytes((400, 300)))])
+    guard = ExtractionGuard(max_image_pixels=200 * 200)
+
+    with pytest.raises(ResourceLimitExceeded):
+        CompressionHandler(guard=guard).recursive_extract(archive, str(tmp_path / 'out'))
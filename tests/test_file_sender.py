@@ -0,0 +1,111 @@
+import os
+
+import pytest
+from flask import Flask
+
+from utils.file_sender import FileSender
+from utils.zip_packager import ZipStream
+
+
+@pytest.fixture
+def app():
+    return Flask(__name__)
+
+
+def _send(app, sender, path, headers=None):
+    with app.test_request_context(headers=headers or {}):
+        response = sender.send(path, os.path.basename(path))
+        response.direct_passthrough = False
+        return response
+
+
+def test_direct_mode_etag_and_304(app, tmp_path):
+    path = tmp_path / 'a.pdf'
+    path.write_bytes(b'%PDF' * 100)
+    sender = FileSender()
+
+    response = _send(app, sender, str(path))
+    assert response.status_code == 200
+    assert response.get_data() == b'%PDF' * 100
+    etag = response.headers['ETag']
+
+    response = _send(app, sender, str(path), {'If-None-Match': etag})
+    assert response.status_code == 304
+
+    response = _send(app, sender, str(path), {'Range': 'bytes=4-7'})
+    assert response.status_code == 206
+    assert response.get_data() == b'%PDF'
+
+
+def test_x_accel_redirect_encodes_path(app, tmp_path):
+    pdf_dir = tmp_path / 'outputs' / 'pdfs_1'
+    pdf_dir.mkdir(parents=True)
+    path = pdf_dir / 'converted_第2话.pdf'
+    path.write_bytes(b'%PDF')
+    sender = FileSender(FileSender.MODE_X_ACCEL_REDIRECT, accel_prefix='/protected/', accel_root=str(tmp_path))
+
+    response = _send(app, sender, str(path))
+
+    assert response.headers['X-Accel-Redirect'] == (
+        '/protected/outputs/pdfs_1/converted_%E7%AC%AC2%E8%AF%9D.pdf'
+    )
+    assert 'X-Sendfile' not in response.headers
+    assert response.get_data() == b''
+
+    response = _send(app, sender, str(path), {'If-None-Match': response.headers['ETag']})
+    assert response.status_code == 304
+    assert 'X-Accel-Redirect' not in response.headers
+
+
+def test_x_sendfile_header(app, tmp_path):
+    path = tmp_path / 'a.pdf'
+    path.write_bytes(b'%PDF')
+    sender = FileSender(FileSender.MODE_X_SENDFILE)
+
+    response = _send(app, sender, str(path))
+
+    assert response.headers['X-Sendfile'] == str(path)
+    assert 'Content-Length' not in response.headers
+
+
+def test_falls_back_to_direct_when_offload_impossible(app, tmp_path):
+    outside = tmp_path / 'outside.pdf'
+    outside.write_bytes(b'outside')
+    root = tmp_path / 'root'
+    root.mkdir()
+    accel = FileSender(FileSender.MODE_X_ACCEL_REDIRECT, accel_root=str(root))
+
+    response = _send(app, accel, str(outside))
+    assert 'X-Accel-Redirect' not in response.headers
+    assert response.get_data() == b'outside'
+
+    # X-Sendfile 的值不能编码，非latin-1路径由Flask直接发送
+    chinese = tmp_path / '第2话.pdf'
+    chinese.write_bytes(b'chinese')
+    response = _send(app, FileSender(FileSender.MODE_X_SENDFILE), str(chinese))
+    assert 'X-Sendfile' not in response.headers
+    assert response.get_data() == b'chinese'
+
+
+def test_send_stream_length_range_and_304(app, tmp_path):
+    path = tmp_path / 'a.pdf'
+    path.write_bytes(os.urandom(10000))
+    sender = FileSender(FileSender.MODE_X_ACCEL_REDIRECT, accel_root=str(tmp_path))
+
+    def send(headers=None):
+        with app.test_request_context(headers=headers or {}):
+            response = sender.send_stream(ZipStream([str(path)]), 'result.zip', mimetype='application/zip')
+            response.direct_passthrough = False
+            return response
+
+    response = send()
+    full = response.get_data()
+    assert response.status_code == 200
+    assert int(response.headers['Content-Length']) == len(full) == ZipStream([str(path)]).size
+    assert 'X-Accel-Redirect' not in response.headers
+
+    response = send({'Range': 'bytes=100-'})
+    assert response.status_code == 206
+    assert response.get_data() == full[100:]
+
+    assert send({'If-None-Match': response.headers['ETag']}).status_code == 304
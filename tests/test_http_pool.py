@@ -0,0 +1,177 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from utils.http_pool import PooledHTTPFetcher, TokenBucket
+
+
+class _Handler(BaseHTTPRequestHandler):
+    # keep-alive
+    protocol_version = 'HTTP/1.1'
+
+    def setup(self):
+        super().setup()
+        with self.server.lock:
+            self.server.connections += 1
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.request_times.append(time.monotonic())
+
+        if self.path.startswith('/data/'):
+            self._send_body(b'x' * int(self.path.rsplit('/', 1)[1]))
+        elif self.path == '/slow':
+            with server.lock:
+                server.active += 1
+                server.max_active = max(server.max_active, server.active)
+            time.sleep(0.1)
+            with server.lock:
+                server.active -= 1
+            self._send_body(b'slow')
+        elif self.path == '/short':
+            # 声明100字节但只发送10字节后断开
+            self.send_response(200)
+            self.send_header('Content-Length', '100')
+            self.end_headers()
+            self.wfile.write(b'y' * 10)
+            self.close_connection = True
+        elif self.path == '/redirect':
+            self.send_response(302)
+            self.send_header('Location', '/data/16')
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+        else:
+            self.send_response(404)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+
+    def _send_body(self, body):
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+@pytest.fixture
+def server():
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), _Handler)
+    httpd.daemon_threads = True
+    httpd.lock = threading.Lock()
+    httpd.connections = 0
+    httpd.active = 0
+    httpd.max_active = 0
+    httpd.request_times = []
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    httpd.base_url = f"http://127.0.0.1:{httpd.server_address[1]}"
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def test_reuses_keep_alive_connection(server, tmp_path):
+    fetcher = PooledHTTPFetcher()
+    try:
+        for i in range(5):
+            dest = tmp_path / f"{i}.bin"
+            assert fetcher.fetch_to_file(f"{server.base_url}/data/{1000 + i}", str(dest)) == 1000 + i
+            assert dest.read_bytes() == b'x' * (1000 + i)
+    finally:
+        fetcher.close()
+
+    assert server.connections == 1
+    assert fetcher.stats['new_connections'] == 1
+    assert fetcher.stats['reused_connections'] == 4
+    assert fetcher.stats['bytes'] == sum(1000 + i for i in range(5))
+
+
+def test_follows_redirect(server, tmp_path):
+    fetcher = PooledHTTPFetcher()
+    try:
+        dest = tmp_path / 'redirected.bin'
+        assert fetcher.fetch_to_file(f"{server.base_url}/redirect", str(dest)) == 16
+    finally:
+        fetcher.close()
+
+
+def test_limits_concurrent_connections_per_host(server, tmp_path):
+    fetcher = PooledHTTPFetcher(max_connections_per_host=2)
+    try:
+        with ThreadPoolExecutor(max_workers=6) as executor:
+            sizes = list(executor.map(
+                lambda i: fetcher.fetch_to_file(f"{server.base_url}/slow", str(tmp_path / f"{i}.bin")),
+                range(6)
+            ))
+    finally:
+        fetcher.close()
+
+    assert sizes == [4] * 6
+    assert server.max_active == 2
+    assert server.connections == 2
+
+
+def test_token_bucket_paces_requests(server, tmp_path):
+    fetcher = PooledHTTPFetcher(rate_per_host=20)
+    bucket = TokenBucket(20)
+    try:
+        for i in range(bucket.capacity + 10):
+            fetcher.fetch_to_file(f"{server.base_url}/data/1", str(tmp_path / f"{i}.bin"))
+    finally:
+        fetcher.close()
+
+    # 任意时间段内的请求数不超过突发容量加上按每秒20个补充的令牌
+    times = server.request_times
+    elapsed = times[-1] - times[0]
+    assert len(times) <= bucket.capacity + 20 * elapsed + 1
+    assert elapsed >= 10 / 20 * 0.9
+
+
+def test_short_body_is_rejected_and_part_file_removed(server, tmp_path):
+    fetcher = PooledHTTPFetcher()
+    dest = tmp_path / 'short.bin'
+    try:
+        with pytest.raises(IOError, match='响应数据不完整'):
+            fetcher.fetch_to_file(f"{server.base_url}/short", str(dest))
+    finally:
+        fetcher.close()
+
+    assert not dest.exists()
+    assert not os.path.exists(str(dest) + '.part')
+
+
+def test_http_error_status(server, tmp_path):
+    fetcher = PooledHTTPFetcher()
+    try:
+        with pytest.raises(IOError, match='HTTP 404'):
+            fetcher.fetch_to_file(f"{server.base_url}/missing", str(tmp_path / 'missing.bin'))
+    finally:
+        fetcher.close()
+
+
+def test_part_file_replaced_only_after_complete(server, tmp_path, monkeypatch):
+    fetcher = PooledHTTPFetcher(chunk_size=1024)
+    dest = tmp_path / 'page.jpg'
+    seen = []
+    real_replace = os.replace
+
+    def checking_replace(src, dst):
+        # 重命名前完整内容在 .part 文件中，目标文件尚不存在
+        seen.append((src, os.path.getsize(src), os.path.exists(dst)))
+        return real_replace(src, dst)
+
+    monkeypatch.setattr(os, 'replace', checking_replace)
+    try:
+        fetcher.fetch_to_file(f"{server.base_url}/data/5000", str(dest))
+    finally:
+        fetcher.close()
+
+    assert seen == [(str(dest) + '.part', 5000, False)]
+    assert dest.read_bytes() == b'x' * 5000
@@ -0,0 +1,22 @@
+import os
+
+from PIL import Image
+
+from utils.image_processor import ImageProcessor
+
+
+def test_folders_of_referenced_members_keep_natural_order(tmp_path):
+    # 第2话的图片已解压到磁盘，第1话和第10话只有引用的未压缩成员
+    chapter_2 = tmp_path / '第2话'
+    chapter_2.mkdir()
+    Image.new('RGB', (10, 10)).save(str(chapter_2 / '1.png'))
+    extra_files = [
+        os.path.join(str(tmp_path), '第10话', '1.jpg'),
+        os.path.join(str(tmp_path), '第1话', '2.jpg'),
+        os.path.join(str(tmp_path), '第1话', '1.jpg'),
+    ]
+
+    image_groups = ImageProcessor().collect_and_sort_images(str(tmp_path), extra_files=extra_files)
+
+    assert [os.path.basename(folder) for folder in image_groups] == ['第1话', '第2话', '第10话']
+    assert [os.path.basename(p) for p in image_groups[os.path.join(str(tmp_path), '第1话')]] == ['1.jpg', '2.jpg']
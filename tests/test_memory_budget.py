@@ -0,0 +1,65 @@
+import threading
+import time
+
+from PIL import Image
+
+from utils.memory_budget import MemoryBudget
+
+
+def test_acquire_blocks_until_release():
+    budget = MemoryBudget(100)
+    budget.acquire(80)
+    acquired = threading.Event()
+
+    def worker():
+        with budget.reserve(50):
+            acquired.set()
+
+    thread = threading.Thread(target=worker)
+    thread.start()
+    assert not acquired.wait(0.2)
+    assert budget.get_stats()['waits'] == 1
+
+    budget.release(80)
+    assert acquired.wait(2)
+    thread.join(2)
+    assert budget.get_stats()['used_bytes'] == 0
+
+
+def test_concurrent_reservations_stay_within_limit():
+    budget = MemoryBudget(100)
+
+    def worker():
+        for _ in range(20):
+            with budget.reserve(30):
+                time.sleep(0.001)
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(10)
+
+    stats = budget.get_stats()
+    assert stats['peak_bytes'] <= 100
+    assert stats['used_bytes'] == 0
+
+
+def test_oversized_request_runs_alone():
+    budget = MemoryBudget(100)
+    # 超过预算的单张图片在没有其他占用时直接执行
+    with budget.reserve(500):
+        assert budget.get_stats()['used_bytes'] == 500
+    assert budget.get_stats()['used_bytes'] == 0
+
+
+def test_unlimited_budget_never_blocks():
+    budget = MemoryBudget(0)
+    budget.acquire(10 ** 12)
+    assert budget.get_stats()['used_bytes'] == 0
+
+
+def test_estimate_image_bytes_reads_header_only():
+    img = Image.new('RGB', (200, 100))
+    assert MemoryBudget.estimate_image_bytes(img) == 200 * 100 * 3
+    assert MemoryBudget.estimate_image_bytes(img, extra_bands=1) == 200 * 100 * 4
@@ -0,0 +1,26 @@
+import os
+
+from PIL import Image
+
+from utils.pdf_generator import PDFGenerator
+
+
+def test_generate_pdf(tmp_path):
+    page = str(tmp_path / '1.jpg')
+    Image.new('RGB', (64, 96), (10, 20, 30)).save(page, 'JPEG')
+    output = str(tmp_path / 'out.pdf')
+
+    assert PDFGenerator().generate_pdf_from_images([page], output)
+    with open(output, 'rb') as f:
+        assert f.read(5) == b'%PDF-'
+    assert not os.path.exists(output + '.part')
+
+
+def test_failed_pdf_removes_partial_file(tmp_path):
+    page = tmp_path / '1.jpg'
+    page.write_bytes(b'not an image')
+    output = str(tmp_path / 'out.pdf')
+
+    assert not PDFGenerator().generate_pdf_from_images([str(page)], output)
+    assert not os.path.exists(output)
+    assert not os.path.exists(output + '.part')
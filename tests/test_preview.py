@@ -0,0 +1,64 @@
+import io
+import zipfile
+
+import pytest
+from PIL import Image
+
+
+def _jpeg_bytes(seed):
+    buffer = io.BytesIO()
+    Image.new('RGB', (120, 160), (seed * 30 % 256, 90, 150)).save(buffer, 'JPEG')
+    return buffer.getvalue()
+
+
+@pytest.fixture
+def preview(app_module):
+    """上传一个页面顺序打乱的ZIP，返回 (client, preview_id, pages)"""
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w') as zipf:
+        for seed, name in enumerate(['第1话/10.jpg', '第1话/2.jpg', '第1话/1.jpg', 'readme.txt']):
+            zipf.writestr(name, b'hello' if name.endswith('.txt') else _jpeg_bytes(seed))
+    client = app_module.app.test_client()
+    response = client.post('/preview', data={'file': (io.BytesIO(buffer.getvalue()), 'book.zip')})
+    assert response.status_code == 200
+    data = response.get_json()
+    return client, data['preview_id'], data['pages']
+
+
+def test_pages_are_in_natural_order(preview):
+    client, preview_id, pages = preview
+
+    assert [page['name'] for page in pages] == ['第1话/1.jpg', '第1话/2.jpg', '第1话/10.jpg']
+    assert [page['index'] for page in pages] == [0, 1, 2]
+    response = client.get(f'/preview/{preview_id}/pages')
+    assert [page['name'] for page in response.get_json()['pages']] == ['第1话/1.jpg', '第1话/2.jpg', '第1话/10.jpg']
+
+
+def test_thumbnail_and_out_of_range_index(preview):
+    client, preview_id, pages = preview
+
+    response = client.get(pages[2]['thumb_url'])
+    assert response.status_code == 200
+    assert response.mimetype == 'image/jpeg'
+    with Image.open(io.BytesIO(response.data)) as img:
+        assert img.width <= 240 and img.height <= 340
+
+    assert client.get(f'/preview/{preview_id}/thumb/3').status_code == 404
+    assert client.get('/preview/missing/thumb/0').status_code == 404
+
+
+def test_oversized_page_is_rejected(preview, app_module, monkeypatch):
+    client, preview_id, pages = preview
+    monkeypatch.setitem(app_module.app.config, 'PREVIEW_MAX_PAGE_BYTES', pages[0]['size'] - 1)
+
+    assert client.get(pages[0]['thumb_url']).status_code == 413
+
+
+def test_cached_thumbnail_is_not_served_after_preview_is_removed(preview, app_module):
+    client, preview_id, pages = preview
+    assert client.get(pages[0]['thumb_url']).status_code == 200
+
+    # 其他进程清理了预览（本进程的缩略图缓存仍然保留着）
+    app_module.preview_indexes.pop(preview_id)
+
+    assert client.get(pages[0]['thumb_url']).status_code == 404
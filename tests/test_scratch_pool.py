@@ -0,0 +1,52 @@
+import collections
+import sqlite3
+
+import pytest
+
+from utils import scratch_pool as scratch_pool_module
+from utils.scratch_pool import ScratchPool
+
+_Usage = collections.namedtuple('usage', 'total used free')
+
+
+@pytest.fixture
+def volumes(tmp_path, monkeypatch):
+    """两个卷：small（单任务上限100字节，模拟内存盘）和 large，各有1000字节可用"""
+    small, large = str(tmp_path / 'small'), str(tmp_path / 'large')
+    monkeypatch.setattr(scratch_pool_module.shutil, 'disk_usage', lambda path: _Usage(10000, 9000, 1000))
+    return [(small, 100), (large, None)]
+
+
+def test_small_tasks_prefer_limited_volume(tmp_path, volumes):
+    pool = ScratchPool(volumes, db_path=str(tmp_path / 'artifacts.db'))
+
+    assert pool.allocate('a', 50).startswith(volumes[0][0])
+    assert pool.allocate('b', 500).startswith(volumes[1][0])
+    # 同一任务重复分配时返回已分配的目录
+    assert pool.allocate('a', 500).startswith(volumes[0][0])
+
+
+def test_allocations_are_shared_between_instances(tmp_path, volumes):
+    db_path = str(tmp_path / 'artifacts.db')
+    first, second = ScratchPool(volumes, db_path=db_path), ScratchPool(volumes, db_path=db_path)
+
+    # 另一个实例（模拟另一个工作进程）分配的空间从可用空间中扣除
+    first.allocate('a', 950)
+    assert second._free_bytes(volumes[1][0]) == 50
+    # large 卷剩余空间不足，大任务改用剩余空间最多的卷
+    assert second.choose(500) == volumes[0][0]
+
+    first.release('a')
+    assert second._free_bytes(volumes[1][0]) == 1000
+
+
+def test_allocation_of_exited_process_is_ignored(tmp_path, volumes):
+    db_path = str(tmp_path / 'artifacts.db')
+    pool = ScratchPool(volumes, db_path=db_path)
+    with sqlite3.connect(db_path) as conn:
+        conn.execute(
+            'INSERT INTO scratch_allocations (task_id, volume, bytes, pid, created) VALUES (?, ?, ?, ?, 0)',
+            ('dead', volumes[1][0], 900, 2 ** 22 + 1)
+        )
+
+    assert pool._free_bytes(volumes[1][0]) == 1000
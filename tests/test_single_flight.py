@@ -0,0 +1,91 @@
+import multiprocessing
+import sqlite3
+import threading
+import time
+
+from utils.single_flight import SingleFlight
+
+
+def _hold_claim(db_path, key, task_id, claimed, done):
+    """在子进程中登记任务并保持，直到主进程通知释放"""
+    flight = SingleFlight(db_path)
+    flight.claim(key, task_id)
+    claimed.set()
+    done.wait(10)
+    flight.release(task_id)
+
+
+def _hold_call(db_path, key, started, done):
+    """在子进程中执行调用并保持，直到主进程通知结束"""
+    SingleFlight(db_path).do(key, lambda: (started.set(), done.wait(10)))
+
+
+def test_claim_is_shared_between_processes(tmp_path):
+    db_path = str(tmp_path / 'artifacts.db')
+    flight = SingleFlight(db_path)
+    claimed, done = multiprocessing.Event(), multiprocessing.Event()
+    process = multiprocessing.Process(target=_hold_claim, args=(db_path, 'jm:1', 'task_a', claimed, done))
+    process.start()
+    try:
+        assert claimed.wait(10)
+        # 另一个进程中正在执行的任务
+        assert flight.claim('jm:1', 'task_b') == ('task_a', False)
+    finally:
+        done.set()
+        process.join(10)
+
+    assert flight.claim('jm:1', 'task_b') == ('task_b', True)
+
+
+def test_claim_of_exited_process_is_dropped(tmp_path):
+    db_path = str(tmp_path / 'artifacts.db')
+    flight = SingleFlight(db_path)
+    with sqlite3.connect(db_path) as conn:
+        conn.execute(
+            'INSERT INTO single_flight (key, owner, pid, created) VALUES (?, ?, ?, 0)',
+            ('jm:1', 'dead_task', 2 ** 22 + 1)
+        )
+
+    assert flight.claim('jm:1', 'task_a') == ('task_a', True)
+
+
+def test_do_waits_for_other_process(tmp_path):
+    db_path = str(tmp_path / 'artifacts.db')
+    flight = SingleFlight(db_path, poll_interval=0.01)
+    started, done = multiprocessing.Event(), multiprocessing.Event()
+    process = multiprocessing.Process(target=_hold_call, args=(db_path, 'jm:1', started, done))
+    process.start()
+    try:
+        assert started.wait(10)
+        result = []
+        thread = threading.Thread(target=lambda: result.append(flight.do('jm:1', lambda: 'mine')))
+        thread.start()
+        time.sleep(0.2)
+        # 子进程的调用结束前一直等待
+        assert result == []
+        done.set()
+        thread.join(10)
+        assert result == ['mine']
+    finally:
+        done.set()
+        process.join(10)
+
+
+def test_do_shares_result_within_process():
+    flight = SingleFlight()
+    calls = []
+
+    def work():
+        calls.append(1)
+        time.sleep(0.1)
+        return 'done'
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(flight.do('k', work))) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert results == ['done'] * 3
+    assert calls == [1]
@@ -0,0 +1,75 @@
+import io
+import os
+import re
+import zipfile
+
+from PIL import Image
+
+from utils.compression import CompressionHandler
+from utils.image_processor import ImageProcessor
+from utils.pdf_generator import PDFGenerator
+
+
+def _jpeg_bytes(seed):
+    buffer = io.BytesIO()
+    Image.new('RGB', (48, 64), (seed * 40 % 256, 120, 60)).save(buffer, 'JPEG')
+    return buffer.getvalue()
+
+
+def _make_stored_zip(path, count=3):
+    pages = {f"第1话/{i + 1}.jpg": _jpeg_bytes(i) for i in range(count)}
+    with zipfile.ZipFile(path, 'w', zipfile.ZIP_STORED) as zipf:
+        for name, data in pages.items():
+            zipf.writestr(name, data)
+    return str(path), pages
+
+
+def _extract(archive, extract_to):
+    handler = CompressionHandler(reference_stored=True)
+    statuses = []
+    handler.set_status_callback(lambda message, progress=None: statuses.append(message))
+    files = handler.recursive_extract(archive, extract_to)
+    return handler, files, statuses
+
+
+def test_stored_jpegs_are_referenced_into_pdf(tmp_path):
+    archive, pages = _make_stored_zip(tmp_path / 'book.zip')
+    extract_to = str(tmp_path / 'temp')
+
+    handler, files, _ = _extract(archive, extract_to)
+
+    # 未压缩存储的JPEG只记录位置，不写入临时目录
+    index = handler.stored_members
+    assert sorted(files) == sorted(index.paths())
+    assert len(index) == len(pages)
+    assert not any(os.path.exists(path) for path in files)
+
+    image_groups = ImageProcessor().collect_and_sort_images(extract_to, extra_files=index.paths())
+    (images,) = image_groups.values()
+    output = str(tmp_path / 'book.pdf')
+    assert PDFGenerator().generate_pdf_from_images(images, output, stored_members=index)
+
+    with open(output, 'rb') as f:
+        pdf = f.read()
+    assert len(re.findall(rb'/Type\s*/Page\b', pdf)) == len(pages)
+    # 页面中嵌入的是原始JPEG数据
+    for data in pages.values():
+        assert data in pdf
+
+
+def test_corrupted_stored_member_fails_cleanly(tmp_path):
+    archive, pages = _make_stored_zip(tmp_path / 'book.zip')
+    with open(archive, 'r+b') as f:
+        data = bytearray(f.read())
+        # 修改第二页的数据（保留JPEG文件头），CRC不再匹配
+        offset = data.index(pages['第1话/2.jpg']) + 100
+        data[offset] ^= 0xff
+        f.seek(0)
+        f.write(data)
+
+    handler, files, statuses = _extract(archive, str(tmp_path / 'temp'))
+
+    assert files == []
+    assert any('CRC' in message for message in statuses)
+    # 不会留下部分引用，之后不会用不完整的页面生成PDF
+    assert not handler.stored_members
@@ -0,0 +1,41 @@
+import json
+import os
+
+from utils.task_store import SharedTaskStore
+
+
+def test_release_writes_final_state_and_drops_local_copy(tmp_path):
+    store = SharedTaskStore('status', str(tmp_path))
+    store['task'] = {'status': '处理中'}
+    store['task']['status'] = '完成'
+
+    state_path = store.release('task')
+
+    assert 'task' not in store._local
+    assert 'task' not in store._written
+    with open(state_path, encoding='utf-8') as f:
+        assert json.load(f) == {'status': '完成'}
+    # 之后从文件读取
+    assert store['task'] == {'status': '完成'}
+    assert 'task' in store
+
+
+def test_release_of_foreign_task_returns_none(tmp_path):
+    writer = SharedTaskStore('status', str(tmp_path))
+    reader = SharedTaskStore('status', str(tmp_path))
+    writer['task'] = {'status': '完成'}
+
+    assert reader.release('task') is None
+    assert reader['task'] == {'status': '完成'}
+
+
+def test_flush_skips_released_tasks(tmp_path):
+    store = SharedTaskStore('status', str(tmp_path))
+    store['task'] = {'status': '完成'}
+    state_path = store.release('task')
+    os.remove(state_path)
+
+    store.flush()
+
+    assert not os.path.exists(state_path)
+    assert 'task' not in store
@@ -0,0 +1,106 @@
+import io
+import os
+import zipfile
+
+from utils.zip_packager import ZipPackager, ZipStream
+
+
+def _make_members(tmp_path):
+    text_path = tmp_path / 'text.txt'
+    text_path.write_bytes(b'abcdefgh' * 64 * 1024)
+    random_path = tmp_path / 'random.bin'
+    random_path.write_bytes(os.urandom(512 * 1024))
+    empty_path = tmp_path / 'empty.pdf'
+    empty_path.write_bytes(b'')
+    return [str(text_path), str(random_path), str(empty_path)]
+
+
+def test_adaptive_package_round_trip(tmp_path):
+    members = _make_members(tmp_path)
+    output = tmp_path / 'out.zip'
+
+    assert ZipPackager(max_workers=2).create_package(members, str(output))
+
+    with zipfile.ZipFile(output) as zipf:
+        assert zipf.testzip() is None
+        infos = {info.filename: info for info in zipf.infolist()}
+        assert infos['text.txt'].compress_type == zipfile.ZIP_DEFLATED
+        assert infos['random.bin'].compress_type == zipfile.ZIP_STORED
+        assert infos['empty.pdf'].compress_type == zipfile.ZIP_STORED
+        for path in members:
+            with open(path, 'rb') as f:
+                assert zipf.read(os.path.basename(path)) == f.read()
+
+
+def test_package_with_arcnames_skips_missing(tmp_path):
+    members = _make_members(tmp_path)
+    output = tmp_path / 'out.zip'
+    entries = [(members[0], 'dir/a.txt'), (str(tmp_path / 'missing.pdf'), 'missing.pdf')]
+
+    assert ZipPackager(mode=ZipPackager.MODE_DEFLATED).create_package(entries, str(output))
+
+    with zipfile.ZipFile(output) as zipf:
+        assert zipf.namelist() == ['dir/a.txt']
+
+
+def _read_stream(stream, chunk_size=7777):
+    data = bytearray()
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            return bytes(data)
+        data += chunk
+
+
+def test_zip_stream_round_trip_and_length(tmp_path):
+    members = _make_members(tmp_path)
+    chinese = tmp_path / 'converted_第2话.pdf'
+    chinese.write_bytes(b'%PDF' + os.urandom(3000))
+    members.append(str(chinese))
+
+    stream = ZipStream(members)
+    data = _read_stream(stream)
+
+    assert len(data) == stream.size
+    with zipfile.ZipFile(io.BytesIO(data)) as zipf:
+        assert zipf.testzip() is None
+        assert zipf.namelist() == [os.path.basename(path) for path in members]
+        for path in members:
+            with open(path, 'rb') as f:
+                assert zipf.read(os.path.basename(path)) == f.read()
+
+
+def test_zip_stream_ranges_match_full_stream(tmp_path):
+    members = _make_members(tmp_path)
+    full = _read_stream(ZipStream(members))
+
+    # 从任意位置开始读取（跳过的成员单独计算CRC）
+    for start in (0, 5, 100 * 1024, len(full) // 2, len(full) - 30):
+        stream = ZipStream(members)
+        stream.seek(start)
+        assert _read_stream(stream, 4096) == full[start:]
+
+
+def test_zip_stream_zip64(tmp_path, monkeypatch):
+    members = _make_members(tmp_path)
+    # 降低阈值模拟超过4GB的成员和偏移
+    monkeypatch.setattr(ZipStream, 'ZIP64_LIMIT', 1000)
+    monkeypatch.setattr(ZipStream, 'ZIP64_COUNT_LIMIT', 2)
+
+    data = _read_stream(ZipStream(members))
+
+    with zipfile.ZipFile(io.BytesIO(data)) as zipf:
+        assert zipf.testzip() is None
+        for path in members:
+            with open(path, 'rb') as f:
+                assert zipf.read(os.path.basename(path)) == f.read()
+
+
+def test_zip_stream_etag_changes_with_members(tmp_path):
+    members = _make_members(tmp_path)
+    etag = ZipStream(members).etag
+    assert ZipStream(members).etag == etag
+
+    with open(members[0], 'ab') as f:
+        f.write(b'more')
+    assert ZipStream(members).etag != etag
@@ -0,0 +1,396 @@
+import os
+import json
+import time
+import shutil
+import sqlite3
+import threading
+import uuid
+from contextlib import closing
+
+
+class AlbumCache:
+    """
+    JM漫画本地缓存
+
+    按JM ID缓存下载的图片和生成的PDF，同一个漫画再次请求时无需重新下载。
+    每个缓存条目是一个独立目录：
+
+        <cache_dir>/<key>/meta.json          条目信息，修改时间即最后访问时间
+        <cache_dir>/<key>/pages.<版本>/...   下载的图片（替换时写入新版本目录）
+        <cache_dir>/<key>/album.pdf          生成的PDF
+        <cache_dir>/<key>/leases/<owner>     使用中的任务（内容为进程号）
+        <cache_dir>/stats.db                 命中统计（SQLite，共享缓存目录的进程共用）
+
+    条目信息保存在各自目录中，多个进程共享同一个缓存目录也不需要额外的索引文件。
+    任务使用条目期间通过 pin/unpin 登记租约，有租约的条目不会被淘汰，旧版本图片也不会被删除。
+    """
+
+    # 租约超过该时间视为失效（进程号被复用时的兜底）
+    LEASE_MAX_AGE = 24 * 3600
+
+    def __init__(self, cache_dir, max_bytes=5 * 1024 * 1024 * 1024, max_age_hours=72):
+        """
+        Args:
+            cache_dir: 缓存目录
+            max_bytes: 缓存总大小上限（字节），超过时按最近最少使用淘汰
+            max_age_hours: 条目最长保留时间（小时）
+        """
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.max_age_hours = max_age_hours
+        self._lock = threading.Lock()
+        self._stats_ready = False
+
+    @staticmethod
+    def make_key(jm_id):
+        """生成缓存键"""
+        return f"jm_{jm_id}"
+
+    def _entry_dir(self, key):
+        return os.path.join(self.cache_dir, key)
+
+    def _read_meta(self, key):
+        """读取条目信息，不存在或损坏时返回None"""
+        meta_path = os.path.join(self._entry_dir(key), 'meta.json')
+        try:
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _write_meta(self, key, meta):
+        """写入条目信息"""
+        entry_dir = self._entry_dir(key)
+        meta['bytes'] = self._dir_size(entry_dir)
+        temp_path = os.path.join(entry_dir, f'meta.json.{uuid.uuid4().hex}')
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(meta, f, ensure_ascii=False)
+        os.replace(temp_path, os.path.join(entry_dir, 'meta.json'))
+
+    def _touch(self, key):
+        """更新最后访问时间"""
+        try:
+            os.utime(os.path.join(self._entry_dir(key), 'meta.json'))
+        except OSError:
+            pass
+
+    def _connect_stats(self):
+        """打开命中统计数据库（首次使用时创建）"""
+        with self._lock:
+            if not self._stats_ready:
+                os.makedirs(self.cache_dir, exist_ok=True)
+            conn = sqlite3.connect(os.path.join(self.cache_dir, 'stats.db'), timeout=30, isolation_level=None)
+            if not self._stats_ready:
+                conn.execute('PRAGMA journal_mode=WAL')
+                conn.execute('CREATE TABLE IF NOT EXISTS cache_stats (name TEXT PRIMARY KEY, value INTEGER NOT NULL)')
+                self._stats_ready = True
+        return conn
+
+    def _record(self, hit):
+        name = 'hits' if hit else 'misses'
+        try:
+            with closing(self._connect_stats()) as conn:
+                conn.execute(
+                    'INSERT INTO cache_stats (name, value) VALUES (?, 1) '
+                    'ON CONFLICT(name) DO UPDATE SET value = value + 1',
+                    (name,)
+                )
+        except sqlite3.Error:
+            pass
+
+    def _lease_dir(self, key):
+        return os.path.join(self._entry_dir(key), 'leases')
+
+    def pin(self, jm_id, owner):
+        """
+        登记条目正在被任务使用（任务结束后调用 unpin）
+
+        查询缓存前登记，之后 get_pages/get_pdf 返回的路径在 unpin 前不会被淘汰或替换删除。
+
+        Args:
+            jm_id: JM漫画ID
+            owner: 使用者（任务ID），同一条目可以被多个使用者同时登记
+        """
+        lease_dir = self._lease_dir(self.make_key(jm_id))
+        os.makedirs(lease_dir, exist_ok=True)
+        with open(os.path.join(lease_dir, owner), 'w') as f:
+            f.write(str(os.getpid()))
+
+    def unpin(self, jm_id, owner):
+        """释放 pin 登记的租约"""
+        try:
+            os.remove(os.path.join(self._lease_dir(self.make_key(jm_id)), owner))
+        except OSError:
+            pass
+
+    def is_pinned(self, jm_id):
+        """是否有任务（任意进程）正在使用该漫画"""
+        return self._is_pinned(self.make_key(jm_id))
+
+    def _is_pinned(self, key):
+        """条目是否有有效租约（登记租约的进程已退出时删除该租约）"""
+        lease_dir = self._lease_dir(key)
+        try:
+            owners = os.listdir(lease_dir)
+        except OSError:
+            return False
+
+        pinned = False
+        for owner in owners:
+            lease_path = os.path.join(lease_dir, owner)
+            try:
+                age = time.time() - os.path.getmtime(lease_path)
+                with open(lease_path, 'r') as f:
+                    pid = int(f.read().strip())
+            except OSError:
+                continue
+            except ValueError:
+                # 刚创建尚未写入进程号
+                pid = None
+            if pid is None and age < 60:
+                pinned = True
+            elif pid is not None and age < self.LEASE_MAX_AGE and self._is_process_alive(pid):
+                pinned = True
+            else:
+                try:
+                    os.remove(lease_path)
+                except OSError:
+                    pass
+        return pinned
+
+    @staticmethod
+    def _is_process_alive(pid):
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return False
+        except PermissionError:
+            return True
+        return True
+
+    def get_pdf(self, jm_id):
+        """
+        查询缓存的PDF（只有命中计入统计）
+
+        Returns:
+            str: 缓存中的PDF路径，未命中时返回None
+        """
+        key = self.make_key(jm_id)
+        meta = self._read_meta(key)
+        if meta and meta.get('pdf'):
+            pdf_path = os.path.join(self._entry_dir(key), meta['pdf'])
+            if os.path.exists(pdf_path) and not self._is_expired(meta):
+                self._touch(key)
+                self._record(True)
+                return pdf_path
+        # 未命中时调用方继续查询图片缓存（下载前的 get_pages），由 get_pages 记录本次查询，
+        # 同一个漫画的一次请求只计一次
+        return None
+
+    def has_pdf(self, jm_id):
+        """缓存中是否有可用的PDF（只检查，不计入命中统计，也不更新访问时间）"""
+        key = self.make_key(jm_id)
+        meta = self._read_meta(key)
+        return bool(
+            meta and meta.get('pdf') and not self._is_expired(meta)
+            and os.path.exists(os.path.join(self._entry_dir(key), meta['pdf']))
+        )
+
+    def get_pages(self, jm_id):
+        """
+        查询缓存的图片
+
+        Returns:
+            list: 缓存中按原顺序排列的图片路径，未命中时返回None
+        """
+        key = self.make_key(jm_id)
+        meta = self._read_meta(key)
+        if meta and meta.get('pages') and not self._is_expired(meta):
+            pages_dir = os.path.join(self._entry_dir(key), meta.get('pages_dir', 'pages'))
+            pages = [os.path.join(pages_dir, rel_path) for rel_path in meta['pages']]
+            if all(os.path.exists(p) for p in pages):
+                self._touch(key)
+                self._record(True)
+                return pages
+        self._record(False)
+        return None
+
+    def put_pages(self, jm_id, image_files, source_dir):
+        """
+        将下载的图片加入缓存（硬链接，下载目录中的原图在转换完成前保持可用）
+
+        图片写入新的版本目录后再更新条目信息，其他任务正在使用的旧版本图片保留到没有租约时由 evict 删除。
+
+        Args:
+            jm_id: JM漫画ID
+            image_files: 已排序的图片路径列表
+            source_dir: 图片所在的下载目录（用于计算相对路径）
+
+        Returns:
+            list: 缓存中的图片路径（顺序与输入相同）
+        """
+        key = self.make_key(jm_id)
+        entry_dir = self._entry_dir(key)
+        # 写入期间登记租约，evict 不会删除尚未写入条目信息的版本目录
+        owner = f'put_{uuid.uuid4().hex}'
+        self.pin(jm_id, owner)
+        try:
+            pages_name = f'pages.{uuid.uuid4().hex}'
+            pages_dir = os.path.join(entry_dir, pages_name)
+            rel_paths = []
+            for image_path in image_files:
+                rel_path = os.path.relpath(image_path, source_dir)
+                target_path = os.path.join(pages_dir, rel_path)
+                os.makedirs(os.path.dirname(target_path), exist_ok=True)
+                self.link_or_copy(image_path, target_path)
+                rel_paths.append(rel_path)
+
+            meta = self._read_meta(key) or {'created': time.time()}
+            meta['pages'] = rel_paths
+            meta['pages_dir'] = pages_name
+            self._write_meta(key, meta)
+        finally:
+            self.unpin(jm_id, owner)
+        self.evict()
+
+        return [os.path.join(pages_dir, rel_path) for rel_path in rel_paths]
+
+    def put_pdf(self, jm_id, pdf_path):
+        """
+        将生成的PDF加入缓存（优先使用硬链接，不额外占用空间）
+
+        Returns:
+            str: 缓存中的PDF路径
+        """
+        key = self.make_key(jm_id)
+        entry_dir = self._entry_dir(key)
+        os.makedirs(entry_dir, exist_ok=True)
+
+        cached_path = os.path.join(entry_dir, 'album.pdf')
+        staging_path = f"{cached_path}.{uuid.uuid4().hex}"
+        self.link_or_copy(pdf_path, staging_path)
+        os.replace(staging_path, cached_path)
+
+        meta = self._read_meta(key) or {'created': time.time()}
+        meta['pdf'] = 'album.pdf'
+        self._write_meta(key, meta)
+        self.evict()
+
+        return cached_path
+
+    @staticmethod
+    def link_or_copy(source_path, target_path):
+        """创建硬链接，跨文件系统时退回复制"""
+        try:
+            os.link(source_path, target_path)
+        except OSError:
+            shutil.copy2(source_path, target_path)
+        return target_path
+
+    def _is_expired(self, meta):
+        return time.time() - meta.get('created', 0) > self.max_age_hours * 3600
+
+    def evict(self):
+        """
+        淘汰缓存条目：先删除过期条目，总大小仍超过上限时按最后访问时间淘汰
+
+        有租约的条目不会被删除；没有租约的条目同时删除已被替换的旧版本图片。
+
+        Returns:
+            int: 删除的条目数量
+        """
+        if not os.path.isdir(self.cache_dir):
+            return 0
+
+        entries = []
+        pinned_bytes = 0
+        removed = 0
+        for key in os.listdir(self.cache_dir):
+            meta = self._read_meta(key)
+            if meta is None:
+                continue
+            if self._is_pinned(key):
+                # 使用中的条目计入总大小，但不删除
+                pinned_bytes += meta.get('bytes', 0)
+                continue
+            if self._is_expired(meta):
+                shutil.rmtree(self._entry_dir(key), ignore_errors=True)
+                removed += 1
+                continue
+            self._remove_stale_pages(key, meta)
+            last_access = os.path.getmtime(os.path.join(self._entry_dir(key), 'meta.json'))
+            entries.append((last_access, key, meta.get('bytes', 0)))
+
+        total_bytes = pinned_bytes + sum(size for _, _, size in entries)
+        for _, key, size in sorted(entries):
+            if total_bytes <= self.max_bytes:
+                break
+            shutil.rmtree(self._entry_dir(key), ignore_errors=True)
+            total_bytes -= size
+            removed += 1
+
+        return removed
+
+    def _remove_stale_pages(self, key, meta):
+        """删除已被替换的旧版本图片目录（调用前确认条目没有租约）"""
+        entry_dir = self._entry_dir(key)
+        current = meta.get('pages_dir', 'pages') if meta.get('pages') else None
+        stale = [
+            name for name in os.listdir(entry_dir)
+            if (name == 'pages' or name.startswith('pages.')) and name != current
+        ]
+        for name in stale:
+            shutil.rmtree(os.path.join(entry_dir, name), ignore_errors=True)
+        if stale:
+            self._write_meta(key, meta)
+
+    def total_bytes(self):
+        """所有条目的总大小（读取各条目信息中记录的大小，不遍历图片目录）"""
+        if not os.path.isdir(self.cache_dir):
+            return 0
+        return sum((self._read_meta(key) or {}).get('bytes', 0) for key in os.listdir(self.cache_dir))
+
+    def get_stats(self):
+        """获取缓存命中统计（所有共享缓存目录的进程合计）"""
+        try:
+            with closing(self._connect_stats()) as conn:
+                counts = dict(conn.execute('SELECT name, value FROM cache_stats').fetchall())
+        except sqlite3.Error:
+            counts = {}
+        hits, misses = counts.get('hits', 0), counts.get('misses', 0)
+        total = hits + misses
+        return {
+            'hits': hits,
+            'misses': misses,
+            'hit_ratio': round(hits / total, 3) if total else 0.0
+        }
+
+    @staticmethod
+    def _dir_size(directory):
+        total = 0
+        for root, dirs, files in os.walk(directory):
+            for file in files:
+                try:
+                    total += os.path.getsize(os.path.join(root, file))
+                except OSError:
+                    pass
+        return total
+
+
+_album_cache = None
+_album_cache_lock = threading.Lock()
+
+
+def get_album_cache():
+    """获取进程内共享的漫画缓存实例"""
+    global _album_cache
+    with _album_cache_lock:
+        if _album_cache is None:
+            from config import config
+            config_obj = config['default']
+            _album_cache = AlbumCache(
+                config_obj.JM_CACHE_DIR,
+                max_bytes=config_obj.JM_CACHE_MAX_BYTES,
+                max_age_hours=config_obj.JM_CACHE_MAX_AGE_HOURS
+            )
+        return _album_cache
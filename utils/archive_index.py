@@ -0,0 +1,209 @@
+import io
+import os
+import tarfile
+import tempfile
+import threading
+import zipfile
+from collections import OrderedDict
+
+from utils.compression import CompressionHandler
+from utils.file_utils import FileUtils
+from utils.memory_budget import MemoryBudget, get_memory_budget
+
+
+class ArchiveIndex:
+    """
+    压缩包页面索引
+
+    只读取压缩包目录（ZIP中央目录、TAR文件头、7z/RAR归档头），不解压数据，
+    列出按自然顺序排序的图片页面；预览时按页随机读取单个成员。
+    页面按扩展名识别（没有扩展名的图片在预览中不显示，转换时仍按文件头识别）。
+    """
+
+    FORMAT_ZIP = 'zip'
+    FORMAT_TAR = 'tar'
+    FORMAT_RAR = 'rar'
+    FORMAT_7Z = '7z'
+
+    def __init__(self, file_path, archive_format, pages):
+        """
+        Args:
+            file_path: 压缩包路径
+            archive_format: FORMAT_*
+            pages: [{'index', 'name', 'folder', 'size', 'offset'}]（offset 仅未压缩的TAR有值）
+        """
+        self.file_path = file_path
+        self.archive_format = archive_format
+        self.pages = pages
+
+    @classmethod
+    def build(cls, file_path):
+        """
+        读取压缩包目录建立索引
+
+        Raises:
+            ValueError: 不支持的压缩格式
+        """
+        if zipfile.is_zipfile(file_path):
+            archive_format, members = cls.FORMAT_ZIP, cls._list_zip(file_path)
+        elif tarfile.is_tarfile(file_path):
+            archive_format, members = cls.FORMAT_TAR, cls._list_tar(file_path)
+        elif file_path.lower().endswith('.rar'):
+            archive_format, members = cls.FORMAT_RAR, cls._list_rar(file_path)
+        elif file_path.lower().endswith('.7z'):
+            archive_format, members = cls.FORMAT_7Z, cls._list_7z(file_path)
+        else:
+            raise ValueError("不支持的压缩格式")
+
+        members = [
+            (name, size, offset) for name, size, offset in members
+            if CompressionHandler.classify_member(name, size) == CompressionHandler.MEMBER_IMAGE
+        ]
+        members.sort(key=lambda member: FileUtils.natural_sort_key(member[0]))
+        pages = [
+            {
+                'index': i,
+                'name': name,
+                'folder': os.path.dirname(name.replace('\\', '/')),
+                'size': size,
+                'offset': offset
+            }
+            for i, (name, size, offset) in enumerate(members)
+        ]
+        return cls(file_path, archive_format, pages)
+
+    @staticmethod
+    def _list_zip(file_path):
+        with zipfile.ZipFile(file_path) as zip_ref:
+            return [(info.filename, info.file_size, None) for info in zip_ref.infolist() if not info.is_dir()]
+
+    @staticmethod
+    def _list_tar(file_path):
+        # 压缩的TAR需要解压一遍才能读到所有文件头，数据块直接跳过
+        with tarfile.open(file_path, 'r:*') as tar_ref:
+            compressed = not isinstance(tar_ref.fileobj, io.BufferedReader)
+            return [
+                (member.name, member.size, None if compressed else member.offset_data)
+                for member in tar_ref if member.isfile()
+            ]
+
+    @staticmethod
+    def _list_rar(file_path):
+        import rarfile
+        with rarfile.RarFile(file_path) as rar_ref:
+            return [(info.filename, info.file_size, None) for info in rar_ref.infolist() if not info.is_dir()]
+
+    @staticmethod
+    def _list_7z(file_path):
+        import py7zr
+        with py7zr.SevenZipFile(file_path, mode='r') as seven_zip_ref:
+            return [
+                (info.filename, info.uncompressed, None)
+                for info in seven_zip_ref.list() if not info.is_directory
+            ]
+
+    def to_dict(self):
+        return {'file_path': self.file_path, 'format': self.archive_format, 'pages': self.pages}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data['file_path'], data['format'], data['pages'])
+
+    def read_page(self, index):
+        """
+        读取单个页面的数据（只解压该成员）
+
+        Raises:
+            IndexError: 页码不存在
+        """
+        if not 0 <= index < len(self.pages):
+            raise IndexError(index)
+        page = self.pages[index]
+        name = page['name']
+
+        if self.archive_format == self.FORMAT_ZIP:
+            with zipfile.ZipFile(self.file_path) as zip_ref:
+                return zip_ref.read(name)
+
+        if self.archive_format == self.FORMAT_TAR:
+            if page['offset'] is not None:
+                # 未压缩的TAR按索引中的偏移直接读取
+                with open(self.file_path, 'rb') as f:
+                    f.seek(page['offset'])
+                    return f.read(page['size'])
+            with tarfile.open(self.file_path, 'r:*') as tar_ref:
+                return tar_ref.extractfile(tar_ref.getmember(name)).read()
+
+        if self.archive_format == self.FORMAT_RAR:
+            import rarfile
+            with rarfile.RarFile(self.file_path) as rar_ref:
+                return rar_ref.read(name)
+
+        import py7zr
+        with py7zr.SevenZipFile(self.file_path, mode='r') as seven_zip_ref:
+            if hasattr(seven_zip_ref, 'read'):
+                return seven_zip_ref.read(targets=[name])[name].read()
+            # 新版本py7zr没有read()，解压到临时目录后读取
+            with tempfile.TemporaryDirectory() as temp_dir:
+                seven_zip_ref.extract(path=temp_dir, targets=[name])
+                with open(os.path.join(temp_dir, name), 'rb') as f:
+                    return f.read()
+
+
+def make_thumbnail(data, size):
+    """
+    生成JPEG缩略图
+
+    Args:
+        data: 图片数据
+        size: 最大尺寸 (宽, 高)
+
+    Returns:
+        bytes: JPEG数据
+    """
+    from PIL import Image
+
+    with Image.open(io.BytesIO(data)) as img:
+        # JPEG按缩小比例解码，不需要解码完整尺寸
+        img.draft('RGB', size)
+        with get_memory_budget().reserve(MemoryBudget.estimate_image_bytes(img)):
+            img.thumbnail(size)
+            if img.mode != 'RGB':
+                img = img.convert('RGB')
+            output = io.BytesIO()
+            img.save(output, 'JPEG', quality=80)
+    return output.getvalue()
+
+
+class ThumbnailCache:
+    """缩略图LRU缓存（按数量和总字节数限制，进程内共享）"""
+
+    def __init__(self, max_items=256, max_bytes=32 * 1024 * 1024):
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+        self._items = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            data = self._items.get(key)
+            if data is not None:
+                self._items.move_to_end(key)
+            return data
+
+    def put(self, key, data):
+        with self._lock:
+            if key in self._items:
+                self._bytes -= len(self._items.pop(key))
+            self._items[key] = data
+            self._bytes += len(data)
+            while self._items and (len(self._items) > self.max_items or self._bytes > self.max_bytes):
+                _, evicted = self._items.popitem(last=False)
+                self._bytes -= len(evicted)
+
+    def discard_prefix(self, prefix):
+        """删除键的第一项为 prefix 的缓存（预览被清理时调用）"""
+        with self._lock:
+            for key in [key for key in self._items if key[0] == prefix]:
+                self._bytes -= len(self._items.pop(key))
@@ -0,0 +1,273 @@
+import os
+import time
+import shutil
+import sqlite3
+import threading
+from contextlib import closing
+
+from utils.file_utils import FileUtils
+
+
+def path_size(path):
+    """文件或目录占用的字节数（不存在时为0）"""
+    if os.path.isfile(path):
+        try:
+            return os.path.getsize(path)
+        except OSError:
+            return 0
+    total = 0
+    for root, dirs, files in os.walk(path):
+        for file in files:
+            try:
+                total += os.path.getsize(os.path.join(root, file))
+            except OSError:
+                pass
+    return total
+
+
+class ArtifactIndex:
+    """
+    任务产物索引
+
+    记录每个任务创建的文件和目录（路径、大小、创建时间、最后访问时间），保存在SQLite中，
+    多个工作进程共用。清理时只查询索引，不需要遍历上传、临时、输出和下载目录。
+    """
+
+    KIND_UPLOAD = 'upload'
+    KIND_TEMP = 'temp'
+    KIND_OUTPUT = 'output'
+    KIND_DOWNLOAD = 'download'
+    KIND_STATE = 'state'
+
+    def __init__(self, db_path):
+        """
+        Args:
+            db_path: SQLite数据库路径
+        """
+        self.db_path = db_path
+        os.makedirs(os.path.dirname(db_path) or '.', exist_ok=True)
+        with closing(self._connect()) as conn, conn:
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS artifacts ('
+                'path TEXT PRIMARY KEY, task_id TEXT, kind TEXT, bytes INTEGER, '
+                'created REAL, last_accessed REAL)'
+            )
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_artifacts_accessed ON artifacts (last_accessed)')
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS leases (name TEXT PRIMARY KEY, owner INTEGER, expires REAL)'
+            )
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.execute('PRAGMA journal_mode=WAL')
+        return conn
+
+    @staticmethod
+    def _key(path):
+        return os.path.abspath(path)
+
+    def register(self, path, task_id, kind, size=0):
+        """
+        登记任务产物（已登记时更新大小和访问时间，保留创建时间）
+
+        Args:
+            path: 文件或目录路径
+            task_id: 所属任务ID
+            kind: 产物类型（KIND_*）
+            size: 占用字节数（目录在写入完成后再次登记以更新大小）
+        """
+        now = time.time()
+        with closing(self._connect()) as conn, conn:
+            conn.execute(
+                'INSERT INTO artifacts (path, task_id, kind, bytes, created, last_accessed) '
+                'VALUES (?, ?, ?, ?, ?, ?) '
+                'ON CONFLICT(path) DO UPDATE SET task_id=excluded.task_id, kind=excluded.kind, '
+                'bytes=excluded.bytes, last_accessed=excluded.last_accessed',
+                (self._key(path), task_id, kind, int(size or 0), now, now)
+            )
+
+    def refresh_sizes(self, task_id):
+        """
+        重新统计任务所有产物的实际大小（任务结束时调用）
+
+        目录在创建时登记，大小为0；任务结束后目录内容不再变化，这里按实际占用更新。
+        """
+        with closing(self._connect()) as conn:
+            paths = [row[0] for row in conn.execute('SELECT path FROM artifacts WHERE task_id = ?', (task_id,))]
+        sizes = [(path_size(path), path) for path in paths if os.path.exists(path)]
+        with closing(self._connect()) as conn, conn:
+            conn.executemany('UPDATE artifacts SET bytes = ? WHERE path = ?', sizes)
+
+    def touch(self, path):
+        """记录一次访问（下载结果时调用，延长产物的保留时间）"""
+        with closing(self._connect()) as conn, conn:
+            conn.execute(
+                'UPDATE artifacts SET last_accessed = ? WHERE path = ?',
+                (time.time(), self._key(path))
+            )
+
+    def forget(self, path):
+        """从索引中移除（不删除文件）"""
+        with closing(self._connect()) as conn, conn:
+            conn.execute('DELETE FROM artifacts WHERE path = ?', (self._key(path),))
+
+    def total_bytes(self):
+        with closing(self._connect()) as conn:
+            return conn.execute('SELECT COALESCE(SUM(bytes), 0) FROM artifacts').fetchone()[0]
+
+    def bytes_by_kind(self):
+        """各类产物登记的总字节数 {kind: bytes}（目录在任务结束时更新为实际大小）"""
+        with closing(self._connect()) as conn:
+            return dict(conn.execute('SELECT kind, COALESCE(SUM(bytes), 0) FROM artifacts GROUP BY kind').fetchall())
+
+    def iter_by_access(self):
+        """按最后访问时间从早到晚返回所有产物"""
+        with closing(self._connect()) as conn:
+            rows = conn.execute(
+                'SELECT path, task_id, kind, bytes, created, last_accessed '
+                'FROM artifacts ORDER BY last_accessed'
+            ).fetchall()
+        keys = ('path', 'task_id', 'kind', 'bytes', 'created', 'last_accessed')
+        return [dict(zip(keys, row)) for row in rows]
+
+    def acquire_lease(self, name, seconds):
+        """
+        取得命名租约（多个进程中只有一个能在租约有效期内执行清理）
+
+        Returns:
+            bool: 当前进程是否持有租约
+        """
+        now = time.time()
+        pid = os.getpid()
+        with closing(self._connect()) as conn, conn:
+            conn.execute(
+                'INSERT INTO leases (name, owner, expires) VALUES (?, ?, ?) '
+                'ON CONFLICT(name) DO UPDATE SET owner=excluded.owner, expires=excluded.expires '
+                'WHERE leases.expires < ? OR leases.owner = ?',
+                (name, pid, now + seconds, now, pid)
+            )
+            row = conn.execute('SELECT owner FROM leases WHERE name = ?', (name,)).fetchone()
+        return row is not None and row[0] == pid
+
+
+class ArtifactJanitor:
+    """
+    后台清理任务产物
+
+    - 超过保留时间（按类型配置，从最后访问时间算起）的产物直接删除
+    - 磁盘使用率超过高水位时，按最后访问时间从早到晚删除，直到降到低水位
+    - 正在执行（检查点存在）的任务的产物不会被删除
+    """
+
+    LEASE_NAME = 'janitor'
+
+    def __init__(self, index, root='.', ttl_hours=None, high_watermark=0.9, low_watermark=0.8,
+                 interval=300, is_pinned=None):
+        """
+        Args:
+            index: ArtifactIndex
+            root: 计算磁盘使用率的路径
+            ttl_hours: 各类型产物的保留时间 {kind: 小时}
+            high_watermark: 开始按LRU清理的磁盘使用率
+            low_watermark: LRU清理的目标磁盘使用率
+            interval: 后台检查间隔（秒）
+            is_pinned: 判断任务是否正在执行的函数 is_pinned(task_id)
+        """
+        self.index = index
+        self.root = root
+        self.ttl_hours = ttl_hours or {}
+        self.high_watermark = high_watermark
+        self.low_watermark = low_watermark
+        self.interval = interval
+        self.is_pinned = is_pinned or (lambda task_id: False)
+        self._started_pid = None
+        self._run_lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, app_config, is_pinned=None):
+        """根据Flask配置创建清理器"""
+        return cls(
+            ArtifactIndex(app_config.get('ARTIFACT_INDEX_PATH', 'task_state/artifacts.db')),
+            root=os.getcwd(),
+            ttl_hours=app_config.get('ARTIFACT_TTL_HOURS'),
+            high_watermark=app_config.get('DISK_HIGH_WATERMARK', 0.9),
+            low_watermark=app_config.get('DISK_LOW_WATERMARK', 0.8),
+            interval=app_config.get('JANITOR_INTERVAL', 300),
+            is_pinned=is_pinned
+        )
+
+    def _disk_usage(self):
+        usage = shutil.disk_usage(self.root)
+        return usage.total - usage.free, usage.total
+
+    def run_once(self):
+        """
+        执行一次清理
+
+        Returns:
+            dict: {'expired': 删除的过期产物数, 'evicted': 按LRU删除的产物数, 'freed_bytes': 释放的字节数}
+        """
+        with self._run_lock:
+            stats = {'expired': 0, 'evicted': 0, 'freed_bytes': 0}
+            now = time.time()
+            remaining = []
+
+            for artifact in self.index.iter_by_access():
+                if not os.path.exists(artifact['path']):
+                    # 任务结束时已删除
+                    self.index.forget(artifact['path'])
+                    continue
+                if self.is_pinned(artifact['task_id']):
+                    continue
+
+                ttl_hours = self.ttl_hours.get(artifact['kind'])
+                if ttl_hours is not None and now - artifact['last_accessed'] > ttl_hours * 3600:
+                    self._evict(artifact, stats)
+                    stats['expired'] += 1
+                else:
+                    remaining.append(artifact)
+
+            used, total = self._disk_usage()
+            if total and used / total > self.high_watermark:
+                # 每删除一个产物后重新读取磁盘使用量（索引中的大小可能不准确，其他进程也在写入）
+                target = self.low_watermark * total
+                for artifact in remaining:
+                    if used <= target:
+                        break
+                    self._evict(artifact, stats)
+                    stats['evicted'] += 1
+                    used, total = self._disk_usage()
+
+            return stats
+
+    def _evict(self, artifact, stats):
+        size = path_size(artifact['path'])
+        FileUtils.safe_remove(artifact['path'])
+        self.index.forget(artifact['path'])
+        stats['freed_bytes'] += size
+
+    def start(self):
+        """启动后台清理线程（每个进程只启动一次，同一时间只有持有租约的进程执行清理）"""
+        if self._started_pid == os.getpid():
+            return
+        with self._run_lock:
+            if self._started_pid == os.getpid():
+                return
+            self._started_pid = os.getpid()
+
+        def janitor_loop():
+            while True:
+                time.sleep(self.interval)
+                try:
+                    if self.index.acquire_lease(self.LEASE_NAME, self.interval * 2):
+                        stats = self.run_once()
+                        if stats['expired'] or stats['evicted']:
+                            print(f"清理任务产物: 过期 {stats['expired']} 个, "
+                                  f"磁盘空间不足清理 {stats['evicted']} 个, "
+                                  f"释放 {stats['freed_bytes'] / (1024 * 1024):.1f} MB")
+                except Exception as e:
+                    print(f"清理任务产物失败: {e}")
+
+        thread = threading.Thread(target=janitor_loop)
+        thread.daemon = True
+        thread.start()
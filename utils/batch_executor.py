@@ -0,0 +1,116 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from utils.metrics import metrics
+
+
+class PipelinedBatchExecutor:
+    """
+    流水线批量执行器
+
+    下载是网络密集型，转换是CPU密集型。N个条目并发下载，每个条目下载完成后
+    立即交给转换线程池，下载和转换可以重叠进行。
+    """
+
+    def __init__(self, download_func, convert_func=None, download_workers=3, convert_workers=1):
+        """
+        Args:
+            download_func: 下载函数 download_func(key, payload)，失败时返回None
+            convert_func: 转换函数 convert_func(key, payload, downloaded)，失败时返回None；
+                          为None时直接返回下载结果
+            download_workers: 并发下载数
+            convert_workers: 并发转换数
+        """
+        self.download_func = download_func
+        self.convert_func = convert_func
+        self.download_workers = max(1, download_workers or 1)
+        self.convert_workers = max(1, convert_workers or 1)
+        self.status_callback = None
+        self._lock = threading.Lock()
+
+    def set_status_callback(self, callback):
+        """设置状态回调函数 callback(key, status, error)"""
+        self.status_callback = callback
+
+    def _update_status(self, key, status, error=None):
+        """更新单个条目的状态"""
+        if self.status_callback:
+            with self._lock:
+                self.status_callback(key, status, error)
+
+    def run(self, items):
+        """
+        执行批量任务
+
+        Args:
+            items: (key, payload) 列表
+
+        Returns:
+            dict: {key: 结果}，失败的条目结果为None
+        """
+        results = {key: None for key, _ in items}
+        payloads = dict(items)
+        metrics.gauge_add('queued_items', len(items))
+
+        with ThreadPoolExecutor(max_workers=self.download_workers) as download_pool, \
+                ThreadPoolExecutor(max_workers=self.convert_workers) as convert_pool:
+            download_futures = {
+                download_pool.submit(self._download, key, payload): key
+                for key, payload in items
+            }
+
+            convert_futures = {}
+            for future in as_completed(download_futures):
+                key = download_futures[future]
+                downloaded = future.result()
+                if downloaded is None:
+                    continue
+
+                if self.convert_func is None:
+                    results[key] = downloaded
+                    self._update_status(key, 'done')
+                else:
+                    # 下载完成立即提交转换，其余条目继续下载
+                    metrics.gauge_add('queued_items', 1)
+                    convert_futures[convert_pool.submit(
+                        self._convert, key, payloads[key], downloaded
+                    )] = key
+
+            for future in as_completed(convert_futures):
+                results[convert_futures[future]] = future.result()
+
+        return results
+
+    def _download(self, key, payload):
+        """下载单个条目（异常不影响其他条目）"""
+        metrics.gauge_add('queued_items', -1)
+        self._update_status(key, 'downloading')
+        try:
+            downloaded = self.download_func(key, payload)
+        except Exception as e:
+            self._update_status(key, 'failed', f'下载失败: {e}')
+            return None
+
+        if downloaded is None:
+            self._update_status(key, 'failed', '下载失败')
+            return None
+
+        self._update_status(key, 'downloaded')
+        return downloaded
+
+    def _convert(self, key, payload, downloaded):
+        """转换单个条目（异常不影响其他条目）"""
+        metrics.gauge_add('queued_items', -1)
+        self._update_status(key, 'converting')
+        try:
+            result = self.convert_func(key, payload, downloaded)
+        except Exception as e:
+            self._update_status(key, 'failed', f'转换失败: {e}')
+            return None
+
+        if result is None:
+            self._update_status(key, 'failed', '转换失败')
+            return None
+
+        self._update_status(key, 'done')
+        return result
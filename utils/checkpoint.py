@@ -0,0 +1,220 @@
+import os
+import json
+import time
+import threading
+
+
+class TaskCheckpoint:
+    """
+    任务检查点类
+
+    将任务已完成的阶段记录到JSON文件中，进程崩溃或重启后可以从最后完成的阶段继续，
+    而不必重新解压、转换所有图片。
+    """
+
+    # 任务类型
+    KIND_ARCHIVE = 'archive'
+    KIND_JM = 'jm'
+    KIND_JM_BATCH = 'jm_batch'
+
+    # 阶段
+    STAGE_EXTRACTED = 'extracted'
+    STAGE_DOWNLOADED = 'downloaded'
+
+    def __init__(self, task_id, checkpoint_dir, kind=None, params=None):
+        """
+        Args:
+            task_id: 任务ID
+            checkpoint_dir: 检查点文件目录
+            kind: 任务类型
+            params: 重新启动任务所需的参数
+        """
+        self.task_id = task_id
+        self.checkpoint_dir = checkpoint_dir
+        self.path = os.path.join(checkpoint_dir, f"{task_id}.json")
+        self.data = {
+            'task_id': task_id,
+            'kind': kind,
+            'params': params or {},
+            'created': time.time(),
+            'updated': time.time(),
+            'stages': {},
+            'folders': {},
+            'items': {}
+        }
+        # 批量任务会在多个线程中同时记录，修改数据和写入文件都需要持有锁
+        self._lock = threading.RLock()
+
+    @classmethod
+    def load_or_create(cls, task_id, checkpoint_dir, kind, params):
+        """读取已有检查点，不存在时创建新的检查点（并声明由当前进程执行）"""
+        checkpoint = cls(task_id, checkpoint_dir, kind, params)
+        if os.path.exists(checkpoint.path):
+            checkpoint.load()
+        else:
+            # 先声明再写入，其他工作进程恢复任务时不会抢走刚创建的任务
+            checkpoint.claim()
+            checkpoint.save()
+        return checkpoint
+
+    @staticmethod
+    def exists(task_id, checkpoint_dir):
+        """任务是否有未完成的检查点（正在执行或等待恢复）"""
+        return os.path.exists(os.path.join(checkpoint_dir, f"{task_id}.json"))
+
+    @classmethod
+    def list_pending(cls, checkpoint_dir):
+        """
+        列出所有未完成任务的检查点
+
+        Returns:
+            list: TaskCheckpoint 对象列表，按创建时间排序
+        """
+        checkpoints = []
+        if not os.path.isdir(checkpoint_dir):
+            return checkpoints
+
+        for filename in os.listdir(checkpoint_dir):
+            if not filename.endswith('.json'):
+                continue
+            checkpoint = cls(filename[:-len('.json')], checkpoint_dir)
+            try:
+                checkpoint.load()
+                checkpoints.append(checkpoint)
+            except (OSError, ValueError) as e:
+                print(f"读取检查点失败 {filename}: {e}")
+
+        checkpoints.sort(key=lambda c: c.data.get('created', 0))
+        return checkpoints
+
+    @property
+    def kind(self):
+        return self.data.get('kind')
+
+    @property
+    def params(self):
+        return self.data.get('params', {})
+
+    def load(self):
+        """从文件读取检查点"""
+        with open(self.path, 'r', encoding='utf-8') as f:
+            self.data.update(json.load(f))
+
+    def save(self):
+        """写入检查点（先写临时文件再替换，避免崩溃时留下损坏的文件）"""
+        os.makedirs(self.checkpoint_dir, exist_ok=True)
+        with self._lock:
+            self.data['updated'] = time.time()
+            temp_path = self.path + '.tmp'
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump(self.data, f, ensure_ascii=False)
+            os.replace(temp_path, self.path)
+
+    def remove(self):
+        """任务结束后删除检查点"""
+        for path in (self.path, self.claim_path):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    @property
+    def claim_path(self):
+        return self.path + '.claim'
+
+    def claim(self):
+        """
+        声明由当前进程执行该任务
+
+        多个工作进程同时恢复任务时，只有成功创建声明文件（O_EXCL）的进程执行任务；
+        声明文件中记录的进程已退出时可以重新声明。
+
+        Returns:
+            bool: 当前进程是否拥有该任务
+        """
+        os.makedirs(self.checkpoint_dir, exist_ok=True)
+        for _ in range(2):
+            try:
+                fd = os.open(self.claim_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            except FileExistsError:
+                owner = self._read_claim_owner()
+                if owner == os.getpid():
+                    return True
+                if owner is not None and self._is_process_alive(owner):
+                    return False
+                if owner is None and self._claim_age() < 60:
+                    # 其他进程刚创建声明文件，尚未写入进程号
+                    return False
+                # 声明任务的进程已退出（崩溃或被回收），删除后重新声明
+                try:
+                    os.remove(self.claim_path)
+                except OSError:
+                    pass
+                continue
+            with os.fdopen(fd, 'w') as f:
+                f.write(str(os.getpid()))
+            return True
+        return False
+
+    def _claim_age(self):
+        try:
+            return time.time() - os.path.getmtime(self.claim_path)
+        except OSError:
+            return 0
+
+    def _read_claim_owner(self):
+        try:
+            with open(self.claim_path, 'r') as f:
+                return int(f.read().strip())
+        except (OSError, ValueError):
+            return None
+
+    @staticmethod
+    def _is_process_alive(pid):
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return False
+        except PermissionError:
+            return True
+        return True
+
+    def has_stage(self, stage):
+        """检查阶段是否已完成"""
+        return stage in self.data['stages']
+
+    def get_stage(self, stage, default=None):
+        """获取阶段记录的数据"""
+        return self.data['stages'].get(stage, default)
+
+    def mark_stage(self, stage, value=True):
+        """记录阶段完成"""
+        with self._lock:
+            self.data['stages'][stage] = value
+            self.save()
+
+    def get_folder(self, folder_path):
+        """获取文件夹的处理记录 {'images': [...], 'pdf': path}"""
+        return self.data['folders'].get(folder_path, {})
+
+    def set_folder_images(self, folder_path, image_paths):
+        """记录文件夹的图片已转换完成"""
+        with self._lock:
+            self.data['folders'].setdefault(folder_path, {})['images'] = list(image_paths)
+            self.save()
+
+    def set_folder_pdf(self, folder_path, pdf_path):
+        """记录文件夹的PDF已生成"""
+        with self._lock:
+            self.data['folders'].setdefault(folder_path, {})['pdf'] = pdf_path
+            self.save()
+
+    def get_item(self, key):
+        """获取批量任务中单个条目的记录"""
+        return self.data['items'].get(key)
+
+    def set_item(self, key, value):
+        """记录批量任务中单个条目已完成"""
+        with self._lock:
+            self.data['items'][key] = value
+            self.save()
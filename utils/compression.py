@@ -1,18 +1,70 @@
 import os
+import mmap
+import shutil
 import zipfile
+import subprocess
 import tarfile
-import rarfile
-import py7zr
 import tempfile
+import threading
 from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
 from utils.file_utils import FileUtils
+from utils.extraction_guard import ResourceLimitExceeded
+from utils.stored_members import StoredMemberIndex, is_stored_member, stored_data_offset, verify_stored_member
+
+# 压缩包中常见的无用文件（系统生成的缩略图、资源分支等）
+JUNK_FILE_NAMES = {'thumbs.db', 'desktop.ini', '.ds_store'}
+JUNK_DIR_NAMES = {'__macosx'}
+
+# 文件头特征（偏移, 字节）
+IMAGE_SIGNATURES = [
+    (0, b'\xff\xd8\xff', '.jpg'),
+    (0, b'\x89PNG\r\n\x1a\n', '.png'),
+    (0, b'GIF87a', '.gif'),
+    (0, b'GIF89a', '.gif'),
+    (0, b'BM', '.bmp'),
+]
+ARCHIVE_SIGNATURES = [
+    (0, b'PK\x03\x04'),           # ZIP
+    (0, b'PK\x05\x06'),           # 空ZIP
+    (0, b'Rar!\x1a\x07'),         # RAR
+    (0, b'7z\xbc\xaf\x27\x1c'),    # 7z
+    (0, b'\x1f\x8b'),             # gzip
+    (0, b'BZh'),                  # bzip2
+    (257, b'ustar'),              # tar
+]
+# 识别文件类型需要读取的字节数（tar的特征在257字节处）
+SNIFF_BYTES = 264
 
 class CompressionHandler:
     """压缩包处理类"""
     
-    def __init__(self):
+    MEMBER_IMAGE = 'image'
+    MEMBER_ARCHIVE = 'archive'
+    
+    def __init__(self, guard=None, zip_workers=None, zip_parallel_min_bytes=16 * 1024 * 1024,
+                 reference_stored=False):
+        """
+        Args:
+            guard: ExtractionGuard，限制解压总量、文件数量、压缩比和图片像素数（None时不限制）
+            zip_workers: 并行解压ZIP的线程数，默认CPU核数
+            zip_parallel_min_bytes: 需要解压的ZIP成员压缩后总大小超过该值时才并行解压
+            reference_stored: 最外层ZIP中未压缩存储的JPEG不写入临时目录，只记录到 stored_members
+                （生成PDF前不能删除压缩包）
+        """
         self.extracted_files = []
+        self.guard = guard
+        self.zip_workers = max(1, zip_workers or os.cpu_count() or 1)
+        self.zip_parallel_min_bytes = zip_parallel_min_bytes
+        self.reference_stored = reference_stored
+        # 未解压、直接引用的成员（StoredMemberIndex，虚拟路径包含在返回的文件列表中）
+        self.stored_members = None
+        self._lock = threading.Lock()
+        self._zip_done = 0
         self.status_callback = None
+        # 解压时跳过的成员（非图片、非压缩包）
+        self.skipped_members = 0
+        self.skipped_bytes = 0
     
     def set_status_callback(self, callback):
         """设置状态回调函数"""
@@ -35,6 +87,9 @@ class CompressionHandler:
         
         Returns:
             list: 所有解压出的文件路径列表
+        
+        Raises:
+            ResourceLimitExceeded: 超出 guard 的限制（其他解压错误只记录状态并返回已解压的文件）
         """
         if depth > max_depth:
             self._update_status(f"达到最大递归深度 {max_depth}，停止解压")
@@ -44,10 +99,18 @@ class CompressionHandler:
         
         extracted_files = []
         
+        if self.guard and depth == 0:
+            # 压缩比按上传的压缩包计算，嵌套压缩包本身已计入解压总量
+            self.guard.add_archive(os.path.getsize(file_path))
+        
         try:
             # 根据文件类型选择解压方法
             if zipfile.is_zipfile(file_path):
-                extracted_files.extend(self._extract_zip(file_path, extract_to))
+                # 嵌套压缩包解压后即被删除，只能引用最外层压缩包中的成员
+                stored_index = None
+                if depth == 0 and self.reference_stored:
+                    stored_index = self.stored_members = StoredMemberIndex(file_path)
+                extracted_files.extend(self._extract_zip(file_path, extract_to, stored_index))
             elif tarfile.is_tarfile(file_path):
                 extracted_files.extend(self._extract_tar(file_path, extract_to))
             elif file_path.lower().endswith('.rar'):
@@ -82,39 +145,391 @@ class CompressionHandler:
                     except:
                         pass
             
+            if depth == 0 and self.skipped_members:
+                self._update_status(
+                    f"跳过 {self.skipped_members} 个非图片文件（{self.skipped_bytes / (1024 * 1024):.1f} MB）"
+                )
             self._update_status(f"解压完成: {os.path.basename(file_path)}", progress=100)
             return extracted_files
             
+        except ResourceLimitExceeded:
+            raise
         except Exception as e:
+            if depth == 0:
+                # 解压失败时丢弃已记录的引用（如CRC校验失败），不用部分页面生成PDF
+                self.stored_members = None
             self._update_status(f"解压失败 {file_path}: {str(e)}")
             return []
     
-    def _extract_zip(self, file_path, extract_to):
-        """解压ZIP文件"""
-        extracted_files = []
+    @staticmethod
+    def sniff_image_extension(header):
+        """根据文件头识别图片格式，返回扩展名（如 .jpg），不是图片时返回None"""
+        if header[:4] == b'RIFF' and header[8:12] == b'WEBP':
+            return '.webp'
+        for offset, signature, extension in IMAGE_SIGNATURES:
+            if header[offset:offset + len(signature)] == signature:
+                return extension
+        return None
+    
+    @staticmethod
+    def sniff_member_type(header):
+        """根据文件头判断成员类型，返回 MEMBER_IMAGE / MEMBER_ARCHIVE 或None"""
+        if CompressionHandler.sniff_image_extension(header):
+            return CompressionHandler.MEMBER_IMAGE
+        for offset, signature in ARCHIVE_SIGNATURES:
+            if header[offset:offset + len(signature)] == signature:
+                return CompressionHandler.MEMBER_ARCHIVE
+        return None
+    
+    @staticmethod
+    def classify_member(name, size=None, header=None):
+        """
+        判断压缩包成员是否需要解压
+        
+        先按名称排除系统文件（__MACOSX、._*资源分支、Thumbs.db等）和空文件；
+        提供了文件头时按文件头识别（扩展名不可信），否则按扩展名识别。
+        
+        Args:
+            name: 成员名称（压缩包内路径）
+            size: 声明的解压后大小
+            header: 成员开头的字节（至少 SNIFF_BYTES 字节，文件较小时为全部内容）
+            
+        Returns:
+            str: MEMBER_IMAGE / MEMBER_ARCHIVE，不需要解压时返回None
+        """
+        if CompressionHandler._is_junk_member(name, size):
+            return None
+        if header is not None:
+            return CompressionHandler.sniff_member_type(header)
+        
+        basename = os.path.basename(name.replace('\\', '/'))
+        if FileUtils.is_compressed_file(basename):
+            return CompressionHandler.MEMBER_ARCHIVE
+        if FileUtils.is_image_file(basename):
+            return CompressionHandler.MEMBER_IMAGE
+        return None
+    
+    @staticmethod
+    def _is_junk_member(name, size=None):
+        """系统生成的文件、资源分支和空文件"""
+        parts = [part for part in name.replace('\\', '/').split('/') if part]
+        if not parts or size == 0:
+            return True
+        if any(part.lower() in JUNK_DIR_NAMES for part in parts[:-1]):
+            return True
+        return parts[-1].startswith('._') or parts[-1].lower() in JUNK_FILE_NAMES
+    
+    @staticmethod
+    def _worth_reading(name, size):
+        """
+        是否需要读取成员的文件头
+        
+        扩展名是图片或压缩包的成员需要确认文件头；没有扩展名或扩展名无法识别的成员可能是图片；
+        扩展名明确是其他类型（.txt、.mp4等）的成员直接跳过，不读取数据。
+        """
+        if CompressionHandler._is_junk_member(name, size):
+            return False
+        basename = os.path.basename(name.replace('\\', '/'))
+        return CompressionHandler.classify_member(name, size) is not None or \
+            FileUtils.get_file_type(basename) is None
+    
+    def _skip_member(self, size):
+        with self._lock:
+            self.skipped_members += 1
+            self.skipped_bytes += size or 0
+    
+    @staticmethod
+    def _member_target(extract_to, name):
+        """成员的解压路径（路径位于解压目录之外时返回None）"""
+        root = os.path.abspath(extract_to)
+        target = os.path.abspath(os.path.join(root, name))
+        if os.path.commonpath([root, target]) != root or target == root:
+            return None
+        return target
+    
+    def _stream_member(self, source, name, size, extract_to):
+        """
+        读取成员开头识别类型，需要时把已读取的部分和剩余数据一起写入文件（只解压一遍）
+        
+        Returns:
+            str: 写入的文件路径，跳过时返回None
+        """
+        header = source.read(SNIFF_BYTES)
+        member_type = self.classify_member(name, size, header)
+        target = self._member_target(extract_to, name) if member_type else None
+        if target is None:
+            self._skip_member(size)
+            return None
+        # 没有图片扩展名的图片补上扩展名，后续按扩展名收集图片
+        if member_type == self.MEMBER_IMAGE and not FileUtils.is_image_file(target):
+            target += self.sniff_image_extension(header)
+        if self.guard:
+            self.guard.add_member(name, size)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        with open(target, 'wb') as f:
+            f.write(header)
+            if self.guard is None:
+                shutil.copyfileobj(source, f, 1024 * 1024)
+            else:
+                # 按数据块累计写入的字节数，声明的大小与实际不符时也能在写满磁盘前停止
+                self.guard.add_bytes(len(header))
+                while True:
+                    chunk = source.read(1024 * 1024)
+                    if not chunk:
+                        break
+                    self.guard.add_bytes(len(chunk))
+                    f.write(chunk)
+        if member_type == self.MEMBER_IMAGE:
+            self._check_image(target, os.path.basename(target))
+        return target
+    
+    def _check_extracted(self, path):
+        """累计已解压文件（RAR/7z由解压库直接写入）的实际大小和图片像素数"""
+        if self.guard is None or not os.path.isfile(path):
+            return
+        self.guard.add_bytes(os.path.getsize(path))
+        if FileUtils.is_image_file(path):
+            self._check_image(path, os.path.basename(path))
+    
+    def _check_image(self, image, name):
+        """读取图片头中的尺寸并累计像素数（不解码图片数据，image 为路径或文件对象）"""
+        if self.guard is None:
+            return
+        from PIL import Image
         try:
+            with Image.open(image) as img:
+                width, height = img.size
+        except Image.DecompressionBombError as e:
+            raise ResourceLimitExceeded(f"图片尺寸过大（{name}）: {e}")
+        except Exception:
+            # 无法识别的图片在后续转换时跳过
+            return
+        self.guard.add_image(width, height, name)
+    
+    def list_member_sizes(self, file_path):
+        """
+        从压缩包元数据读取成员的解压后大小（不解压数据）
+        
+        ZIP读取中央目录，TAR读取文件头，7z/RAR读取归档头。
+        
+        Args:
+            file_path: 压缩包文件路径
+            
+        Returns:
+            list: [(成员名, 解压后字节数)]，不包括目录；格式不支持时返回None
+        """
+        if zipfile.is_zipfile(file_path):
             with zipfile.ZipFile(file_path, 'r') as zip_ref:
-                file_list = zip_ref.namelist()
-                total_files = len(file_list)
-                
-                for i, file_info in enumerate(file_list):
-                    # 跳过目录
-                    if file_info.endswith('/'):
-                        continue
-                    
-                    # 解压文件
-                    zip_ref.extract(file_info, extract_to)
-                    extracted_path = os.path.join(extract_to, file_info)
-                    extracted_files.append(extracted_path)
-                    
-                    # 更新进度
-                    progress = (i + 1) / total_files * 100
-                    self._update_status(f"解压ZIP文件: {file_info}", progress)
-                
+                return [(info.filename, info.file_size) for info in zip_ref.infolist() if not info.is_dir()]
+        if tarfile.is_tarfile(file_path):
+            with tarfile.open(file_path, 'r:*') as tar_ref:
+                return [(member.name, member.size) for member in tar_ref if member.isfile()]
+        if file_path.lower().endswith('.rar'):
+            import rarfile
+            with rarfile.RarFile(file_path) as rar_ref:
+                return [(info.filename, info.file_size) for info in rar_ref.infolist() if not info.is_dir()]
+        if file_path.lower().endswith('.7z'):
+            import py7zr
+            with py7zr.SevenZipFile(file_path, mode='r') as seven_zip_ref:
+                return [(info.filename, info.uncompressed) for info in seven_zip_ref.list() if not info.is_directory]
+        return None
+    
+    def estimate_disk_footprint(self, file_path, convert_ratio=3.0, nested_ratio=2.0):
+        """
+        估算处理压缩包时的磁盘占用峰值
+        
+        处理过程中解压出的文件、转换后的图片和生成的PDF同时存在：
+        峰值 ≈ 解压大小 + 图片大小 × convert_ratio（转换后的PNG）+ 图片大小 × convert_ratio（PDF）。
+        嵌套压缩包按 nested_ratio 估算其解压后大小，并视为图片。
+        
+        Args:
+            file_path: 压缩包文件路径
+            convert_ratio: 图片转换为PNG后的大小倍数
+            nested_ratio: 嵌套压缩包的解压倍数
+            
+        Returns:
+            dict: {'extracted_bytes', 'image_bytes', 'scratch_bytes'（临时目录：解压和转换）,
+                   'output_bytes'（输出目录：PDF）, 'estimated_bytes'（合计）}；无法读取元数据时返回None
+        """
+        try:
+            members = self.list_member_sizes(file_path)
+        except Exception as e:
+            self._update_status(f"读取压缩包元数据失败 {file_path}: {str(e)}")
+            return None
+        if members is None:
+            return None
+        
+        extracted_bytes = 0
+        image_bytes = 0
+        for name, size in members:
+            # 解压时会跳过的成员不占用磁盘
+            if not self._worth_reading(name, size):
+                continue
+            extracted_bytes += size
+            if FileUtils.is_compressed_file(name):
+                nested_bytes = int(size * nested_ratio)
+                extracted_bytes += nested_bytes
+                image_bytes += nested_bytes
+            elif FileUtils.is_image_file(name):
+                image_bytes += size
+        
+        scratch_bytes = int(extracted_bytes + image_bytes * convert_ratio)
+        output_bytes = int(image_bytes * convert_ratio)
+        return {
+            'extracted_bytes': extracted_bytes,
+            'image_bytes': image_bytes,
+            'scratch_bytes': scratch_bytes,
+            'output_bytes': output_bytes,
+            'estimated_bytes': scratch_bytes + output_bytes
+        }
+    
+    def _extract_zip(self, file_path, extract_to, stored_index=None):
+        """
+        解压ZIP文件
+        
+        需要解压的成员较大时，按压缩后大小把成员分成连续的几段，每段在单独的线程中
+        用单独打开的ZipFile解压（zlib解压时释放GIL，可以同时使用多个CPU核）。
+        指定 stored_index 时，未压缩存储的JPEG只记录位置，不写入文件。
+        """
+        try:
+            with zipfile.ZipFile(file_path, 'r') as zip_ref:
+                info_list = zip_ref.infolist()
+            
+            # 先按名称和大小过滤，再读取文件头识别类型，只写入图片和压缩包
+            members = []
+            for info in info_list:
+                # 跳过目录
+                if info.is_dir():
+                    continue
+                if not self._worth_reading(info.filename, info.file_size):
+                    self._skip_member(info.file_size)
+                    continue
+                members.append(info)
+            
+            self._zip_done = 0
+            ranges = self._split_zip_members(members)
+            if len(ranges) <= 1:
+                return self._extract_zip_range(file_path, members, extract_to, len(members), None, stored_index)
+            
+            self._update_status(f"解压ZIP文件: {len(members)} 个文件，{len(ranges)} 个线程")
+            stop = threading.Event()
+            
+            def extract_range(range_members):
+                try:
+                    return self._extract_zip_range(
+                        file_path, range_members, extract_to, len(members), stop, stored_index
+                    )
+                except BaseException:
+                    # 一个线程失败（如超出资源限制）时其他线程也停止
+                    stop.set()
+                    raise
+            
+            with ThreadPoolExecutor(max_workers=len(ranges)) as executor:
+                futures = [executor.submit(extract_range, range_members) for range_members in ranges]
+                # 各段按原顺序拼接，返回的文件顺序与串行解压相同
+                extracted_files = []
+                for future in futures:
+                    extracted_files.extend(future.result())
             return extracted_files
+        except ResourceLimitExceeded:
+            raise
         except Exception as e:
             raise Exception(f"ZIP解压失败: {str(e)}")
     
+    def _split_zip_members(self, members):
+        """
+        把成员按压缩后大小分成连续的几段（数据量较小或有同名成员时不分段）
+        
+        Returns:
+            list: [[ZipInfo]]
+        """
+        total_bytes = sum(info.compress_size for info in members)
+        workers = min(self.zip_workers, len(members))
+        names = [info.filename for info in members]
+        if workers <= 1 or total_bytes < self.zip_parallel_min_bytes or len(set(names)) != len(names):
+            # 同名成员写入同一个文件，必须按顺序解压
+            return [members]
+        
+        ranges = [[]]
+        accumulated = 0
+        for info in members:
+            # 当前段达到平均大小后开始下一段
+            if ranges[-1] and accumulated >= total_bytes * len(ranges) / workers:
+                ranges.append([])
+            ranges[-1].append(info)
+            accumulated += info.compress_size
+        return ranges
+    
+    def _extract_zip_range(self, file_path, members, extract_to, total_files, stop=None, stored_index=None):
+        """用单独的ZipFile按顺序解压一段成员"""
+        extracted_files = []
+        with zipfile.ZipFile(file_path, 'r') as zip_ref, open(file_path, 'rb') as raw:
+            archive_view = None
+            if stored_index is not None:
+                archive_map = mmap.mmap(raw.fileno(), 0, access=mmap.ACCESS_READ)
+                archive_view = memoryview(archive_map)
+            try:
+                for info in members:
+                    if stop is not None and stop.is_set():
+                        break
+                    extracted_path = None
+                    if archive_view is not None and is_stored_member(info):
+                        extracted_path = self._reference_stored_member(
+                            zip_ref, raw, archive_view, info, extract_to, stored_index
+                        )
+                    if extracted_path is None:
+                        with zip_ref.open(info) as source:
+                            extracted_path = self._stream_member(source, info.filename, info.file_size, extract_to)
+                    
+                    self._zip_progress(info, extracted_path, extracted_files, total_files)
+            finally:
+                if archive_view is not None:
+                    archive_view.release()
+                    archive_map.close()
+        return extracted_files
+    
+    def _zip_progress(self, info, extracted_path, extracted_files, total_files):
+        """记录一个ZIP成员处理完成并更新进度"""
+        with self._lock:
+            self._zip_done += 1
+            progress = self._zip_done / total_files * 100
+        if extracted_path is None:
+            return
+        extracted_files.append(extracted_path)
+        self._update_status(f"解压ZIP文件: {info.filename}", progress)
+    
+    def _reference_stored_member(self, zip_ref, raw, archive_view, info, extract_to, stored_index):
+        """
+        未压缩存储的JPEG只记录数据在压缩包中的位置，不写入临时目录（img2pdf直接嵌入JPEG数据）
+        
+        Returns:
+            str: 虚拟路径（解压时本应写入的路径），不能引用时返回None（按普通方式解压）
+        """
+        if self._is_junk_member(info.filename, info.file_size):
+            return None
+        target = self._member_target(extract_to, info.filename)
+        if target is None:
+            return None
+        offset = stored_data_offset(raw, info)
+        data = archive_view[offset:offset + info.file_size]
+        try:
+            if self.sniff_image_extension(bytes(data[:SNIFF_BYTES])) != '.jpg':
+                return None
+            # 不经过zipfile读取，需要自行校验CRC
+            if not verify_stored_member(data, info):
+                raise zipfile.BadZipFile(f"CRC校验失败: {info.filename}")
+        finally:
+            data.release()
+        
+        if not FileUtils.is_image_file(target):
+            target += '.jpg'
+        if self.guard:
+            self.guard.add_member(info.filename)
+            with zip_ref.open(info) as source:
+                self._check_image(source, os.path.basename(target))
+        stored_index.add(target, offset, info.file_size)
+        return target
+    
     def _extract_tar(self, file_path, extract_to):
         """解压TAR文件（包括.tar.gz, .tar.bz2）"""
         extracted_files = []
@@ -126,43 +541,73 @@ class CompressionHandler:
                 mode = 'r:bz2'
             
             with tarfile.open(file_path, mode) as tar_ref:
-                members = tar_ref.getmembers()
-                total_files = len(members)
-                
-                for i, member in enumerate(members):
-                    # 跳过目录
-                    if member.isdir():
+                # 按顺序读取成员，每个成员只读一遍（压缩的tar不适合回退读取）
+                for i, member in enumerate(tar_ref):
+                    # 只处理普通文件（跳过目录和链接）
+                    if not member.isfile():
                         continue
                     
-                    # 解压文件
-                    tar_ref.extract(member, extract_to)
-                    extracted_path = os.path.join(extract_to, member.name)
+                    if not self._worth_reading(member.name, member.size):
+                        self._skip_member(member.size)
+                        continue
+                    source = tar_ref.extractfile(member)
+                    extracted_path = self._stream_member(source, member.name, member.size, extract_to)
+                    if extracted_path is None:
+                        continue
                     extracted_files.append(extracted_path)
                     
-                    # 更新进度
-                    progress = (i + 1) / total_files * 100
-                    self._update_status(f"解压TAR文件: {member.name}", progress)
+                    self._update_status(f"解压TAR文件: {member.name}")
                 
             return extracted_files
+        except ResourceLimitExceeded:
+            raise
         except Exception as e:
             raise Exception(f"TAR解压失败: {str(e)}")
     
     def _extract_rar(self, file_path, extract_to):
-        """解压RAR文件"""
-        extracted_files = []
+        """
+        解压RAR文件
+        
+        找到unrar时一次调用解压所有需要的成员（rarfile逐个解压时每个成员启动一个unrar进程，
+        固实压缩包每次都要从头解压），找不到时逐个解压。
+        """
+        import rarfile
+        
         try:
             with rarfile.RarFile(file_path) as rar_ref:
                 file_list = rar_ref.namelist()
                 total_files = len(file_list)
                 
+                # 按名称和大小过滤（RAR按成员读取文件头需要单独启动解压进程）
+                targets = []
                 for i, file_info in enumerate(file_list):
                     # 跳过目录
                     if file_info.endswith('/') or file_info.endswith('\\'):
                         continue
                     
+                    member_size = rar_ref.getinfo(file_info).file_size
+                    if self.classify_member(file_info, member_size) is None:
+                        self._skip_member(member_size)
+                        continue
+                    if self._member_target(extract_to, file_info) is None:
+                        self._skip_member(member_size)
+                        continue
+                    if self.guard:
+                        self.guard.add_member(file_info, member_size)
+                    targets.append((i, file_info, member_size))
+                
+                unrar_tool = shutil.which(rarfile.UNRAR_TOOL)
+                if unrar_tool and len(targets) > 1:
+                    if self.guard:
+                        self.guard.check_declared(sum(size for _, _, size in targets), os.path.basename(file_path))
+                    return self._extract_rar_batch(unrar_tool, file_path, [name for _, name, _ in targets], extract_to)
+                
+                extracted_files = []
+                for i, file_info, _ in targets:
                     # 解压文件
                     rar_ref.extract(file_info, extract_to)
                     extracted_path = os.path.join(extract_to, file_info)
+                    self._check_extracted(extracted_path)
                     extracted_files.append(extracted_path)
                     
                     # 更新进度
@@ -170,27 +615,111 @@ class CompressionHandler:
                     self._update_status(f"解压RAR文件: {file_info}", progress)
                 
             return extracted_files
+        except ResourceLimitExceeded:
+            raise
         except Exception as e:
             raise Exception(f"RAR解压失败: {str(e)}")
     
+    def _extract_rar_batch(self, unrar_tool, file_path, names, extract_to):
+        """
+        一次调用unrar解压列表文件中的所有成员，按unrar输出的每个文件完成行更新进度
+        
+        Args:
+            unrar_tool: unrar可执行文件路径
+            file_path: RAR文件路径
+            names: 需要解压的成员名称
+            extract_to: 解压目标目录
+        
+        Returns:
+            list: 解压出的文件路径列表（与 names 顺序相同）
+        """
+        paths = {name: os.path.join(extract_to, name) for name in names}
+        checked = set()
+        output_tail = []
+        
+        # 成员名称写入列表文件（UTF-8），避免命令行过长
+        with tempfile.NamedTemporaryFile('w', encoding='utf-8', suffix='.lst', delete=False) as list_file:
+            for name in names:
+                list_file.write(name.replace('/', os.sep) + '\n')
+        try:
+            # x: 保留目录结构; -y -o+: 不询问，覆盖; -p-: 不询问密码; -idc -idp: 不输出版权信息和百分比;
+            # -scfl: 列表文件为UTF-8
+            command = [unrar_tool, 'x', '-y', '-o+', '-p-', '-idc', '-idp', '-scfl',
+                       file_path, '@' + list_file.name, os.path.join(os.path.abspath(extract_to), '')]
+            process = subprocess.Popen(
+                command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                text=True, encoding='utf-8', errors='replace'
+            )
+            try:
+                done = 0
+                for line in process.stdout:
+                    line = line.strip()
+                    output_tail = (output_tail + [line])[-5:]
+                    # 每个文件完成时输出 "Extracting  <名称>  OK"
+                    if not line.startswith('Extracting') or not line.endswith('OK'):
+                        continue
+                    name = line[len('Extracting'):-len('OK')].strip().replace(os.sep, '/')
+                    done += 1
+                    if name in paths:
+                        # 边解压边检查资源限制，超出时立即终止unrar
+                        self._check_extracted(paths[name])
+                        checked.add(name)
+                    self._update_status(f"解压RAR文件: {name}", min(done / len(names) * 100, 100))
+                returncode = process.wait()
+            except BaseException:
+                process.kill()
+                process.wait()
+                raise
+        finally:
+            try:
+                os.remove(list_file.name)
+            except OSError:
+                pass
+        
+        if returncode != 0:
+            raise Exception(f"unrar 返回 {returncode}: {' '.join(output_tail)}")
+        missing = [name for name in names if not os.path.isfile(paths[name])]
+        if missing:
+            raise Exception(f"unrar 未解压出 {len(missing)} 个文件，如 {missing[0]}")
+        for name in names:
+            if name not in checked:
+                self._check_extracted(paths[name])
+        return [paths[name] for name in names]
+    
     def _extract_7z(self, file_path, extract_to):
         """解压7z文件"""
+        import py7zr
+        
         extracted_files = []
         try:
             with py7zr.SevenZipFile(file_path, mode='r') as seven_zip_ref:
-                file_list = seven_zip_ref.getnames()
-                total_files = len(file_list)
+                # 按名称和大小过滤（7z固实压缩，读取单个成员的文件头需要解压之前的数据）
+                targets = []
+                target_bytes = 0
+                for info in seven_zip_ref.list():
+                    if info.is_directory:
+                        continue
+                    if self.classify_member(info.filename, info.uncompressed) is None or \
+                            self._member_target(extract_to, info.filename) is None:
+                        self._skip_member(info.uncompressed)
+                        continue
+                    targets.append(info.filename)
+                    target_bytes += info.uncompressed or 0
+                    if self.guard:
+                        self.guard.add_member(info.filename)
                 
-                for i, file_info in enumerate(file_list):
-                    # 解压文件
-                    seven_zip_ref.extract(targets=[file_info], path=extract_to)
-                    extracted_path = os.path.join(extract_to, file_info)
-                    extracted_files.append(extracted_path)
-                    
-                    # 更新进度
-                    progress = (i + 1) / total_files * 100
-                    self._update_status(f"解压7z文件: {file_info}", progress)
+                # 一次解压所有需要的成员（解压前按声明的总大小检查，解压后累计实际大小）
+                if self.guard:
+                    self.guard.check_declared(target_bytes, os.path.basename(file_path))
+                self._update_status(f"解压7z文件: {len(targets)} 个文件")
+                if targets:
+                    seven_zip_ref.extract(path=extract_to, targets=targets)
+                extracted_files = [os.path.join(extract_to, name) for name in targets]
+                for extracted_path in extracted_files:
+                    self._check_extracted(extracted_path)
                 
             return extracted_files
+        except ResourceLimitExceeded:
+            raise
         except Exception as e:
             raise Exception(f"7z解压失败: {str(e)}")
\ No newline at end of file
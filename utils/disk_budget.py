@@ -0,0 +1,202 @@
+import os
+import time
+import shutil
+import sqlite3
+from contextlib import closing
+
+
+class DiskBudget:
+    """
+    磁盘空间预留
+
+    任务开始写入前，按估算的磁盘占用峰值预留空间；已预留的空间从可用空间中扣除，
+    多个任务同时开始时不会都以为磁盘足够。预留记录保存在SQLite中，多个工作进程共用；
+    预留进程已退出的记录自动失效。
+
+    预留按卷（文件系统设备号）分别记录：临时目录可能在tmpfs或其他磁盘上，
+    解压和转换的空间预留在任务临时目录所在的卷，PDF的空间预留在输出目录所在的卷。
+    各方法的 amounts 参数为 {路径: 字节数}，同一卷上的多个路径合并计算；传入整数时表示 root 所在的卷。
+
+    任务写入的数据已经反映在磁盘可用空间中，任务通过 update_written 报告已写入的字节数，
+    只有尚未写入的部分（预留 - 已写入）继续从可用空间中扣除。
+    """
+
+    def __init__(self, db_path, root='.', min_free_bytes=0):
+        """
+        Args:
+            db_path: SQLite数据库路径
+            root: 未指定路径时计算可用空间的路径
+            min_free_bytes: 每个卷始终保留的最小可用空间
+        """
+        self.db_path = db_path
+        self.root = root
+        self.min_free_bytes = min_free_bytes
+        os.makedirs(os.path.dirname(db_path) or '.', exist_ok=True)
+        with closing(self._connect()) as conn, conn:
+            columns = [row[1] for row in conn.execute('PRAGMA table_info(disk_reservations)')]
+            if columns and not {'written', 'volume'} <= set(columns):
+                # 旧版本创建的表（预留只在任务执行期间有效，直接重建）
+                conn.execute('DROP TABLE disk_reservations')
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS disk_reservations ('
+                'task_id TEXT, volume INTEGER, bytes INTEGER, written INTEGER NOT NULL DEFAULT 0, '
+                'pid INTEGER, created REAL, PRIMARY KEY (task_id, volume))'
+            )
+
+    @classmethod
+    def from_config(cls, app_config):
+        """根据Flask配置创建（与产物索引使用同一个数据库）"""
+        return cls(
+            app_config.get('ARTIFACT_INDEX_PATH', 'task_state/artifacts.db'),
+            root=os.getcwd(),
+            min_free_bytes=app_config.get('DISK_MIN_FREE_BYTES', 0)
+        )
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.execute('PRAGMA journal_mode=WAL')
+        return conn
+
+    @staticmethod
+    def _is_process_alive(pid):
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return False
+        except PermissionError:
+            return True
+        return True
+
+    @staticmethod
+    def volume_of(path):
+        """路径所在卷的设备号（路径尚未创建时使用最近的已存在的上级目录）"""
+        path = os.path.abspath(path)
+        while not os.path.exists(path) and os.path.dirname(path) != path:
+            path = os.path.dirname(path)
+        return os.stat(path).st_dev
+
+    def _by_volume(self, amounts):
+        """将 {路径: 字节数} 按卷合并为 {设备号: (路径, 字节数)}"""
+        if not isinstance(amounts, dict):
+            amounts = {self.root: amounts}
+        volumes = {}
+        for path, nbytes in amounts.items():
+            volume = self.volume_of(path)
+            total = volumes[volume][1] if volume in volumes else 0
+            volumes[volume] = (path, total + int(nbytes or 0))
+        return volumes
+
+    def _free_bytes(self, path):
+        return shutil.disk_usage(path).free - self.min_free_bytes
+
+    def _reserved_bytes(self, conn, volume):
+        """卷上已预留但尚未写入的总字节数（删除进程已退出的预留）"""
+        total = 0
+        rows = conn.execute('SELECT task_id, volume, bytes, written, pid FROM disk_reservations').fetchall()
+        for task_id, row_volume, nbytes, written, pid in rows:
+            if pid != os.getpid() and not self._is_process_alive(pid):
+                conn.execute('DELETE FROM disk_reservations WHERE task_id = ?', (task_id,))
+                continue
+            if row_volume == volume:
+                total += max(0, nbytes - written)
+        return total
+
+    def available(self, path=None):
+        """路径所在的卷上可以预留的字节数（path为None时为 root 所在的卷）"""
+        path = path or self.root
+        with closing(self._connect()) as conn:
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                reserved = self._reserved_bytes(conn, self.volume_of(path))
+                conn.execute('COMMIT')
+            except BaseException:
+                conn.execute('ROLLBACK')
+                raise
+        return self._free_bytes(path) - reserved
+
+    def can_ever_fit(self, amounts):
+        """
+        其他任务释放预留后是否可能容纳 amounts（不可能时应直接拒绝任务）
+
+        每个卷以当前可用空间加上其他任务在该卷上的预留作为上限。
+        """
+        with closing(self._connect()) as conn:
+            for volume, (path, nbytes) in self._by_volume(amounts).items():
+                reserved = conn.execute(
+                    'SELECT COALESCE(SUM(MAX(bytes - written, 0)), 0) FROM disk_reservations WHERE volume = ?',
+                    (volume,)
+                ).fetchone()[0]
+                if self._free_bytes(path) + reserved < nbytes:
+                    return False
+        return True
+
+    def try_reserve(self, task_id, amounts):
+        """
+        预留空间（所有卷都足够时才预留；同一任务重复预留时替换原来的预留）
+
+        Returns:
+            bool: 空间足够并已预留时返回True
+        """
+        volumes = self._by_volume(amounts)
+        with closing(self._connect()) as conn:
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                conn.execute('DELETE FROM disk_reservations WHERE task_id = ?', (task_id,))
+                for volume, (path, nbytes) in volumes.items():
+                    if nbytes > self._free_bytes(path) - self._reserved_bytes(conn, volume):
+                        conn.execute('ROLLBACK')
+                        return False
+                now = time.time()
+                conn.executemany(
+                    'INSERT INTO disk_reservations (task_id, volume, bytes, pid, created) VALUES (?, ?, ?, ?, ?)',
+                    [(task_id, volume, nbytes, os.getpid(), now) for volume, (path, nbytes) in volumes.items()]
+                )
+                conn.execute('COMMIT')
+                return True
+            except BaseException:
+                conn.execute('ROLLBACK')
+                raise
+
+    def reserve(self, task_id, amounts, timeout=0, poll_interval=5, on_wait=None):
+        """
+        预留空间，空间不足时等待其他任务释放
+
+        Args:
+            task_id: 任务ID
+            amounts: 各卷的预留字节数 {路径: 字节数}
+            timeout: 最长等待时间（秒）
+            poll_interval: 检查间隔（秒）
+            on_wait: 开始等待时的回调 on_wait(available_bytes)，available_bytes 为各卷中最少的可用空间
+
+        Returns:
+            bool: 是否预留成功（超时返回False）
+        """
+        deadline = time.monotonic() + timeout
+        waiting = False
+        while True:
+            if self.try_reserve(task_id, amounts):
+                return True
+            if time.monotonic() >= deadline:
+                return False
+            if not waiting and on_wait:
+                on_wait(min(self.available(path) for path, _ in self._by_volume(amounts).values()))
+            waiting = True
+            time.sleep(poll_interval)
+
+    def update_written(self, task_id, amounts):
+        """
+        报告任务已写入磁盘的字节数 {路径: 字节数}（累计值，不是增量）
+
+        已写入的部分已经从磁盘可用空间中减去，预留中只保留尚未写入的部分。
+        """
+        volumes = self._by_volume(amounts)
+        with closing(self._connect()) as conn:
+            conn.executemany(
+                'UPDATE disk_reservations SET written = ? WHERE task_id = ? AND volume = ?',
+                [(nbytes, task_id, volume) for volume, (path, nbytes) in volumes.items()]
+            )
+
+    def release(self, task_id):
+        """任务结束后释放预留（所有卷）"""
+        with closing(self._connect()) as conn:
+            conn.execute('DELETE FROM disk_reservations WHERE task_id = ?', (task_id,))
@@ -0,0 +1,122 @@
+import threading
+
+
+class ResourceLimitExceeded(Exception):
+    """解压时超出资源限制（疑似压缩炸弹或异常文件）"""
+
+
+class ExtractionGuard:
+    """
+    解压资源限制
+
+    在解压过程中累计写入的字节数、成员数量和图片像素数，超过限制时抛出 ResourceLimitExceeded，
+    任务立即停止，不会等到磁盘写满。嵌套压缩包共用同一个计数，
+    压缩比按上传的（最外层）压缩包大小计算。
+    """
+
+    # 解压总量小于该值时不检查压缩比（小文件的压缩比波动大）
+    RATIO_CHECK_MIN_BYTES = 16 * 1024 * 1024
+
+    def __init__(self, max_total_bytes=0, max_members=0, max_ratio=0, max_image_pixels=0,
+                 max_total_pixels=0):
+        """
+        Args:
+            max_total_bytes: 解压总字节数上限
+            max_members: 解压成员数量上限（包括嵌套压缩包中的成员）
+            max_ratio: 解压总量与上传的压缩包大小之比的上限
+            max_image_pixels: 单张图片像素数上限
+            max_total_pixels: 所有图片像素数之和的上限
+            （以上为0时不限制）
+        """
+        self.max_total_bytes = max_total_bytes
+        self.max_members = max_members
+        self.max_ratio = max_ratio
+        self.max_image_pixels = max_image_pixels
+        self.max_total_pixels = max_total_pixels
+
+        self.total_bytes = 0
+        self.archive_bytes = 0
+        self.members = 0
+        self.total_pixels = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, app_config):
+        """根据Flask配置创建"""
+        return cls(
+            max_total_bytes=app_config.get('EXTRACT_MAX_TOTAL_BYTES', 0),
+            max_members=app_config.get('EXTRACT_MAX_MEMBERS', 0),
+            max_ratio=app_config.get('EXTRACT_MAX_RATIO', 0),
+            max_image_pixels=app_config.get('EXTRACT_MAX_IMAGE_PIXELS', 0),
+            max_total_pixels=app_config.get('EXTRACT_MAX_TOTAL_PIXELS', 0)
+        )
+
+    def add_archive(self, nbytes):
+        """
+        登记上传的压缩包大小（压缩比的分母）
+
+        只登记最外层压缩包：嵌套压缩包解压出来后已计入解压总量，再计入分母会放宽压缩比限制。
+        """
+        with self._lock:
+            self.archive_bytes += nbytes
+
+    def add_member(self, name, declared_size=None):
+        """
+        开始解压一个成员，按声明的大小预先检查
+
+        Raises:
+            ResourceLimitExceeded: 成员数量或声明的大小超过限制
+        """
+        with self._lock:
+            self.members += 1
+            if self.max_members and self.members > self.max_members:
+                raise ResourceLimitExceeded(f"压缩包文件数量超过限制 {self.max_members}")
+        if declared_size:
+            self.check_declared(declared_size, name)
+
+    def check_declared(self, nbytes, name=''):
+        """
+        检查即将解压的 nbytes 字节（压缩包元数据中声明的大小）是否会超过总量限制
+
+        Raises:
+            ResourceLimitExceeded: 解压后会超过总量限制
+        """
+        with self._lock:
+            if self.max_total_bytes and self.total_bytes + nbytes > self.max_total_bytes:
+                raise ResourceLimitExceeded(
+                    f"解压后大小超过限制 {self._format_bytes(self.max_total_bytes)}（{name}）"
+                )
+
+    def add_bytes(self, nbytes):
+        """
+        累计实际写入的字节数（解压时按数据块调用，声明的大小不可信）
+
+        Raises:
+            ResourceLimitExceeded: 解压总量或压缩比超过限制
+        """
+        with self._lock:
+            self.total_bytes += nbytes
+            if self.max_total_bytes and self.total_bytes > self.max_total_bytes:
+                raise ResourceLimitExceeded(f"解压后大小超过限制 {self._format_bytes(self.max_total_bytes)}")
+            if self.max_ratio and self.archive_bytes and self.total_bytes > self.RATIO_CHECK_MIN_BYTES and \
+                    self.total_bytes > self.archive_bytes * self.max_ratio:
+                raise ResourceLimitExceeded(f"压缩比超过限制 {self.max_ratio}:1，疑似压缩炸弹")
+
+    def add_image(self, width, height, name=''):
+        """
+        累计图片像素数（只读取图片头）
+
+        Raises:
+            ResourceLimitExceeded: 单张图片或总像素数超过限制
+        """
+        pixels = width * height
+        with self._lock:
+            if self.max_image_pixels and pixels > self.max_image_pixels:
+                raise ResourceLimitExceeded(f"图片尺寸过大 {width}x{height}（{name}）")
+            self.total_pixels += pixels
+            if self.max_total_pixels and self.total_pixels > self.max_total_pixels:
+                raise ResourceLimitExceeded(f"图片总像素数超过限制 {self.max_total_pixels}")
+
+    @staticmethod
+    def _format_bytes(nbytes):
+        return f"{nbytes / (1024 * 1024):.0f} MB"
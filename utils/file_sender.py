@@ -0,0 +1,143 @@
+import os
+import urllib.parse
+from flask import request, send_file
+from werkzeug.utils import send_file as werkzeug_send_file
+
+
+class FileSender:
+    """结果文件发送类，支持直接发送或交给前端代理（Nginx/Apache）零拷贝发送"""
+
+    # 支持的发送模式
+    MODE_DIRECT = 'direct'
+    MODE_X_ACCEL_REDIRECT = 'x-accel-redirect'
+    MODE_X_SENDFILE = 'x-sendfile'
+
+    def __init__(self, mode=MODE_DIRECT, accel_prefix='/protected/', accel_root=None, max_age=3600):
+        """
+        Args:
+            mode: 发送模式 direct / x-accel-redirect / x-sendfile
+            accel_prefix: X-Accel-Redirect 的内部location前缀
+            accel_root: 与 accel_prefix 对应的本地根目录（默认当前工作目录）
+            max_age: 缓存时间（秒）
+        """
+        self.mode = (mode or self.MODE_DIRECT).lower()
+        self.accel_prefix = '/' + accel_prefix.strip('/') + '/'
+        self.accel_root = os.path.abspath(accel_root or os.getcwd())
+        self.max_age = max_age
+
+    @classmethod
+    def from_config(cls, app_config):
+        """根据Flask配置创建发送器"""
+        return cls(
+            mode=app_config.get('SEND_FILE_MODE', cls.MODE_DIRECT),
+            accel_prefix=app_config.get('X_ACCEL_REDIRECT_PREFIX', '/protected/'),
+            accel_root=app_config.get('X_ACCEL_REDIRECT_ROOT'),
+            max_age=app_config.get('SEND_FILE_MAX_AGE', 3600)
+        )
+
+    def send(self, file_path, download_name, mimetype=None):
+        """
+        发送文件
+
+        Args:
+            file_path: 本地文件路径
+            download_name: 下载时的文件名
+            mimetype: MIME类型，默认根据文件名推断
+
+        Returns:
+            Response: Flask响应对象
+        """
+        if self.mode == self.MODE_DIRECT or not self._can_offload(os.path.abspath(file_path)):
+            # 由Werkzeug处理 ETag / Last-Modified / Range
+            return send_file(
+                file_path,
+                as_attachment=True,
+                download_name=download_name,
+                mimetype=mimetype,
+                conditional=True,
+                etag=True,
+                max_age=self.max_age
+            )
+
+        return self._send_offloaded(file_path, download_name, mimetype)
+
+    def send_stream(self, stream, download_name, mimetype=None):
+        """
+        发送按需生成的文件（如 ZipStream，不在磁盘上，始终由Flask发送）
+
+        Args:
+            stream: 可seek的只读文件对象，需要提供 size、etag、last_modified 属性
+            download_name: 下载时的文件名
+            mimetype: MIME类型，默认根据文件名推断
+
+        Returns:
+            Response: Flask响应对象（支持ETag、Last-Modified和Range）
+        """
+        response = send_file(
+            stream,
+            as_attachment=True,
+            download_name=download_name,
+            mimetype=mimetype,
+            conditional=False,
+            etag=stream.etag,
+            last_modified=stream.last_modified,
+            max_age=self.max_age
+        )
+        # 文件对象没有大小，由长度已知的流提供，Werkzeug据此处理304和Range
+        response.content_length = stream.size
+        return response.make_conditional(request, accept_ranges=True, complete_length=stream.size)
+
+    def _can_offload(self, abs_path):
+        """代理能否发送该文件（不在代理根目录下或路径无法写入响应头时由Flask直接发送）"""
+        if self.mode == self.MODE_X_ACCEL_REDIRECT:
+            return self._get_accel_path(abs_path) is not None
+        try:
+            # X-Sendfile 的值是本地路径，不能编码，响应头只支持latin-1
+            abs_path.encode('latin-1')
+        except UnicodeEncodeError:
+            return False
+        return True
+
+    def _send_offloaded(self, file_path, download_name, mimetype=None):
+        """只返回响应头，由前端代理发送文件内容（Range由代理处理）"""
+        abs_path = os.path.abspath(file_path)
+
+        # use_x_sendfile=True 时Werkzeug不会打开文件，只生成响应头和ETag
+        response = werkzeug_send_file(
+            abs_path,
+            request.environ,
+            mimetype=mimetype,
+            as_attachment=True,
+            download_name=download_name,
+            conditional=False,
+            etag=True,
+            max_age=self.max_age,
+            use_x_sendfile=True
+        )
+
+        if self.mode == self.MODE_X_ACCEL_REDIRECT:
+            response.headers.pop('X-Sendfile', None)
+            response.headers['X-Accel-Redirect'] = self._get_accel_path(abs_path)
+
+        # 处理 If-None-Match / If-Modified-Since，命中时返回304
+        response = response.make_conditional(request)
+
+        # 响应体由代理填充，长度和Range都交给代理处理（make_conditional会按空响应体设置长度，这里再去掉）
+        response.headers.pop('Content-Length', None)
+        response.headers['Accept-Ranges'] = 'bytes'
+        if response.status_code == 304:
+            # 部分代理会忽略304继续发送文件
+            response.headers.pop('X-Accel-Redirect', None)
+            response.headers.pop('X-Sendfile', None)
+        return response
+
+    def _get_accel_path(self, abs_path):
+        """将本地路径映射为代理的内部URI（百分号编码，文件不在根目录下时返回None）"""
+        try:
+            if os.path.commonpath([self.accel_root, abs_path]) != self.accel_root:
+                return None
+        except ValueError:
+            # Windows下不同盘符
+            return None
+        rel_path = os.path.relpath(abs_path, self.accel_root)
+        return self.accel_prefix + urllib.parse.quote(rel_path.replace(os.sep, '/'))
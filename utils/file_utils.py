@@ -1,5 +1,6 @@
 import os
 import shutil
+import hashlib
 import mimetypes
 from pathlib import Path
 from config import config
@@ -62,7 +63,9 @@ class FileUtils:
         directories = [
             config['default'].UPLOAD_FOLDER,
             config['default'].TEMP_FOLDER,
-            config['default'].OUTPUT_FOLDER
+            config['default'].OUTPUT_FOLDER,
+            config['default'].CHECKPOINT_FOLDER,
+            config['default'].TASK_STATE_FOLDER
         ]
         
         for directory in directories:
@@ -94,6 +97,25 @@ class FileUtils:
         except OSError:
             return 0
     
+    @staticmethod
+    def get_file_hash(file_path, chunk_size=1024 * 1024):
+        """计算文件的SHA-256哈希（分块读取）"""
+        sha256 = hashlib.sha256()
+        with open(file_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(chunk_size), b''):
+                sha256.update(chunk)
+        return sha256.hexdigest()
+    
+    @staticmethod
+    def save_with_hash(file_storage, file_path, chunk_size=1024 * 1024):
+        """保存上传的文件，同时计算SHA-256哈希（不需要保存后再读取一遍）"""
+        sha256 = hashlib.sha256()
+        with open(file_path, 'wb') as f:
+            for chunk in iter(lambda: file_storage.stream.read(chunk_size), b''):
+                sha256.update(chunk)
+                f.write(chunk)
+        return sha256.hexdigest()
+    
     @staticmethod
     def safe_remove(path):
         """安全删除文件或目录"""
@@ -133,6 +155,11 @@ class FileUtils:
         if os.path.exists(zip_file):
             FileUtils.safe_remove(zip_file)
         
+        # 清理任务检查点
+        checkpoint_file = os.path.join(config['default'].CHECKPOINT_FOLDER, f"{task_id}.json")
+        if os.path.exists(checkpoint_file):
+            FileUtils.safe_remove(checkpoint_file)
+        
         print(f"任务 {task_id} 文件清理完成")
 
     @staticmethod
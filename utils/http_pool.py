@@ -0,0 +1,243 @@
+import os
+import time
+import queue
+import threading
+import http.client
+import urllib.parse
+
+from utils.metrics import metrics
+
+
+class TokenBucket:
+    """令牌桶限速（每秒 rate 个请求，最多突发 burst 个）"""
+
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.capacity = burst or max(1, int(rate))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """取得一个令牌，没有令牌时等待"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait_time = (1 - self.tokens) / self.rate
+            time.sleep(wait_time)
+
+
+class PooledHTTPFetcher:
+    """
+    连接池HTTP下载器
+
+    按主机复用keep-alive连接，限制每个主机的并发连接数和请求速率，
+    响应内容分块写入磁盘（先写 .part 文件，完成后再重命名）。
+    """
+
+    # 复用的连接可能已被服务器关闭，遇到这些错误时用新连接重试一次
+    STALE_CONNECTION_ERRORS = (
+        http.client.RemoteDisconnected,
+        http.client.BadStatusLine,
+        ConnectionResetError,
+        BrokenPipeError
+    )
+
+    def __init__(self, max_connections_per_host=4, rate_per_host=0, timeout=30,
+                 headers=None, chunk_size=64 * 1024, max_redirects=3):
+        """
+        Args:
+            max_connections_per_host: 每个主机的最大并发连接数
+            rate_per_host: 每个主机每秒最多请求数（0为不限制）
+            timeout: 连接和读取超时时间（秒）
+            headers: 默认请求头
+            chunk_size: 写入磁盘的分块大小
+            max_redirects: 最多跟随的重定向次数
+        """
+        self.max_connections_per_host = max(1, max_connections_per_host)
+        self.rate_per_host = rate_per_host
+        self.timeout = timeout
+        self.headers = dict(headers or {})
+        self.chunk_size = chunk_size
+        self.max_redirects = max_redirects
+
+        self._hosts = {}
+        self._lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self.stats = {'requests': 0, 'reused_connections': 0, 'new_connections': 0, 'bytes': 0}
+
+    def _get_host(self, scheme, netloc):
+        """获取主机的连接池、并发限制和限速器"""
+        key = (scheme, netloc)
+        with self._lock:
+            host = self._hosts.get(key)
+            if host is None:
+                host = {
+                    'idle': queue.LifoQueue(),
+                    'semaphore': threading.BoundedSemaphore(self.max_connections_per_host),
+                    'bucket': TokenBucket(self.rate_per_host) if self.rate_per_host else None
+                }
+                self._hosts[key] = host
+            return host
+
+    def _new_connection(self, scheme, netloc):
+        self._count('new_connections')
+        if scheme == 'https':
+            return http.client.HTTPSConnection(netloc, timeout=self.timeout)
+        return http.client.HTTPConnection(netloc, timeout=self.timeout)
+
+    def _count(self, name, value=1):
+        with self._stats_lock:
+            self.stats[name] += value
+
+    def fetch_to_file(self, url, dest_path, headers=None):
+        """
+        下载URL到文件
+
+        Args:
+            url: 下载地址
+            dest_path: 保存路径
+            headers: 额外的请求头
+
+        Returns:
+            int: 写入的字节数
+
+        Raises:
+            IOError: HTTP状态码不是200或重定向次数过多
+        """
+        for _ in range(self.max_redirects + 1):
+            location = self._fetch_once(url, dest_path, headers)
+            if location is None:
+                return os.path.getsize(dest_path)
+            url = urllib.parse.urljoin(url, location)
+        raise IOError(f"重定向次数过多: {url}")
+
+    def _fetch_once(self, url, dest_path, headers):
+        """执行一次请求，返回重定向地址或None（已写入文件）"""
+        parsed = urllib.parse.urlsplit(url)
+        path = parsed.path or '/'
+        if parsed.query:
+            path += '?' + parsed.query
+
+        request_headers = dict(self.headers)
+        request_headers.update(headers or {})
+
+        host = self._get_host(parsed.scheme, parsed.netloc)
+        with host['semaphore']:
+            if host['bucket']:
+                host['bucket'].acquire()
+
+            conn, reused = self._acquire_connection(host, parsed.scheme, parsed.netloc)
+            try:
+                try:
+                    conn.request('GET', path, headers=request_headers)
+                    response = conn.getresponse()
+                except self.STALE_CONNECTION_ERRORS:
+                    if not reused:
+                        raise
+                    conn.close()
+                    conn = self._new_connection(parsed.scheme, parsed.netloc)
+                    conn.request('GET', path, headers=request_headers)
+                    response = conn.getresponse()
+
+                self._count('requests')
+                if response.status in (301, 302, 303, 307, 308):
+                    response.read()
+                    location = response.getheader('Location')
+                    self._release_connection(host, conn, response)
+                    conn = None
+                    if not location:
+                        raise IOError(f"重定向缺少Location: {url}")
+                    return location
+
+                if response.status != 200:
+                    response.read()
+                    self._release_connection(host, conn, response)
+                    conn = None
+                    raise IOError(f"HTTP {response.status}: {url}")
+
+                self._write_response(response, dest_path)
+                self._release_connection(host, conn, response)
+                conn = None
+                return None
+            finally:
+                if conn is not None:
+                    conn.close()
+
+    def _acquire_connection(self, host, scheme, netloc):
+        """取出空闲连接，没有时新建"""
+        try:
+            conn = host['idle'].get_nowait()
+            self._count('reused_connections')
+            return conn, True
+        except queue.Empty:
+            return self._new_connection(scheme, netloc), False
+
+    def _release_connection(self, host, conn, response):
+        """响应读取完毕后将连接放回连接池"""
+        if response.will_close:
+            conn.close()
+        else:
+            host['idle'].put(conn)
+
+    def _write_response(self, response, dest_path):
+        """分块写入响应内容"""
+        os.makedirs(os.path.dirname(dest_path) or '.', exist_ok=True)
+        partial_path = dest_path + '.part'
+        written = 0
+        try:
+            with open(partial_path, 'wb') as f:
+                while True:
+                    chunk = response.read(self.chunk_size)
+                    if not chunk:
+                        break
+                    f.write(chunk)
+                    written += len(chunk)
+            expected = response.getheader('Content-Length')
+            if expected is not None and expected.isdigit() and written != int(expected):
+                raise IOError(f"响应数据不完整: {written}/{expected} 字节")
+            os.replace(partial_path, dest_path)
+        except BaseException:
+            try:
+                os.remove(partial_path)
+            except OSError:
+                pass
+            raise
+        self._count('bytes', written)
+        metrics.incr('download_bytes', written)
+
+    def close(self):
+        """关闭所有空闲连接"""
+        with self._lock:
+            hosts = list(self._hosts.values())
+        for host in hosts:
+            while True:
+                try:
+                    host['idle'].get_nowait().close()
+                except queue.Empty:
+                    break
+
+
+_http_fetcher = None
+_http_fetcher_lock = threading.Lock()
+
+
+def get_http_fetcher(headers=None):
+    """获取进程内共享的下载器（所有任务共用连接池和主机限速）"""
+    global _http_fetcher
+    with _http_fetcher_lock:
+        if _http_fetcher is None:
+            from config import config
+            config_obj = config['default']
+            _http_fetcher = PooledHTTPFetcher(
+                max_connections_per_host=config_obj.JM_HOST_CONNECTIONS,
+                rate_per_host=config_obj.JM_HOST_RATE_LIMIT,
+                timeout=config_obj.JM_PAGE_TIMEOUT,
+                headers=headers
+            )
+        return _http_fetcher
@@ -1,7 +1,8 @@
 import os
 from pathlib import Path
-from PIL import Image
 from utils.file_utils import FileUtils
+from utils.memory_budget import MemoryBudget, get_memory_budget
+from utils.metrics import metrics
 
 class ImageProcessor:
     """图片处理类"""
@@ -18,12 +19,13 @@ class ImageProcessor:
         if self.status_callback:
             self.status_callback(message, progress)
     
-    def collect_and_sort_images(self, root_dir):
+    def collect_and_sort_images(self, root_dir, extra_files=None):
         """
         收集并排序图片文件，按文件夹分组
         
         Args:
             root_dir: 根目录路径
+            extra_files: 不在磁盘上的图片路径（直接引用压缩包中的成员），按所在文件夹并入分组
             
         Returns:
             dict: 按文件夹分组的图片路径字典 {folder_path: [sorted_image_paths]}
@@ -48,9 +50,43 @@ class ImageProcessor:
                 image_files.sort(key=FileUtils.natural_sort_key)
                 image_groups[root] = image_files
         
+        extra_groups = {}
+        for file_path in extra_files or []:
+            extra_groups.setdefault(os.path.dirname(file_path), []).append(file_path)
+        if extra_groups:
+            for folder, extra in extra_groups.items():
+                image_files = image_groups.get(folder, []) + extra
+                image_files.sort(key=FileUtils.natural_sort_key)
+                image_groups[folder] = image_files
+            # 只包含引用成员的文件夹不在 os.walk 结果中，合并后按文件夹名重新排序
+            image_groups = {
+                folder: image_groups[folder]
+                for folder in sorted(image_groups, key=FileUtils.natural_sort_key)
+            }
+        
         self._update_status(f"找到 {len(image_groups)} 个包含图片的文件夹")
         return image_groups
     
+    def collect_image_list(self, root_dir):
+        """
+        收集目录下的所有图片（不按文件夹分组），按完整路径自然排序
+        
+        Args:
+            root_dir: 根目录路径
+            
+        Returns:
+            list: 排序后的图片路径列表
+        """
+        image_files = []
+        for root, dirs, files in os.walk(root_dir):
+            for file in files:
+                file_path = os.path.join(root, file)
+                if FileUtils.is_image_file(file_path):
+                    image_files.append(file_path)
+        
+        image_files.sort(key=FileUtils.natural_sort_key)
+        return image_files
+    
     def convert_to_supported_format(self, image_path, output_dir):
         """
         将图片转换为PDF支持的格式
@@ -62,6 +98,8 @@ class ImageProcessor:
         Returns:
             str: 转换后的图片路径
         """
+        from PIL import Image
+        
         try:
             # 打开图片
             with Image.open(image_path) as img:
@@ -71,18 +109,22 @@ class ImageProcessor:
                 
                 # 如果已经是PNG格式且不需要转换，直接返回原路径
                 if image_path.lower().endswith('.png'):
+                    metrics.incr('convert_pages')
                     return image_path
                 
                 # 转换图片格式为PNG（PDF生成最兼容的格式）
-                if img.mode in ('P', 'RGBA'):
-                    # 处理带透明度的图片
-                    img = img.convert('RGBA')
-                else:
-                    img = img.convert('RGB')
+                target_mode = 'RGBA' if img.mode in ('P', 'RGBA') else 'RGB'
                 
-                # 保存为PNG格式
-                img.save(output_path, 'PNG', optimize=True)
+                # 解码原图和转换后的副本同时占用内存，预算不足时等待
+                estimated_bytes = MemoryBudget.estimate_image_bytes(img, extra_bands=len(target_mode))
+                with get_memory_budget().reserve(estimated_bytes):
+                    # 处理带透明度的图片时转换为RGBA
+                    img = img.convert(target_mode)
+                    
+                    # 保存为PNG格式
+                    img.save(output_path, 'PNG', optimize=True)
                 
+                metrics.incr('convert_pages')
                 return output_path
                 
         except Exception as e:
@@ -100,6 +142,8 @@ class ImageProcessor:
         Returns:
             str: 优化后的图片路径
         """
+        from PIL import Image
+        
         try:
             with Image.open(image_path) as img:
                 # 获取原始尺寸
@@ -118,11 +162,14 @@ class ImageProcessor:
                 new_width = int(original_width * scale_ratio)
                 new_height = int(original_height * scale_ratio)
                 
-                # 调整图片大小
-                resized_img = img.resize((new_width, new_height), Image.Resampling.LANCZOS)
-                
-                # 保存优化后的图片（覆盖原文件）
-                resized_img.save(image_path, optimize=True)
+                # 原图和缩小后的副本（不大于原图）同时占用内存
+                estimated_bytes = MemoryBudget.estimate_image_bytes(img, extra_bands=len(img.getbands()))
+                with get_memory_budget().reserve(estimated_bytes):
+                    # 调整图片大小
+                    resized_img = img.resize((new_width, new_height), Image.Resampling.LANCZOS)
+                    
+                    # 保存优化后的图片（覆盖原文件）
+                    resized_img.save(image_path, optimize=True)
                 
                 self._update_status(f"优化图片尺寸: {original_width}x{original_height} -> {new_width}x{new_height}")
                 return image_path
@@ -131,13 +178,14 @@ class ImageProcessor:
             self._update_status(f"图片优化失败 {image_path}: {str(e)}")
             return image_path  # 返回原路径，不中断流程
     
-    def process_image_group(self, image_group, output_dir):
+    def process_image_group(self, image_group, output_dir, passthrough=None):
         """
         处理一组图片，进行格式转换和优化
         
         Args:
             image_group: 图片路径列表
             output_dir: 输出目录
+            passthrough: 不转换、直接交给PDF生成的图片路径（压缩包中直接引用的JPEG）
             
         Returns:
             list: 处理后的图片路径列表
@@ -150,6 +198,11 @@ class ImageProcessor:
             progress = (i + 1) / total_images * 100
             self._update_status(f"处理图片: {Path(image_path).name}", progress)
             
+            if passthrough and image_path in passthrough:
+                metrics.incr('convert_pages')
+                processed_images.append(image_path)
+                continue
+            
             # 转换图片格式
             converted_path = self.convert_to_supported_format(image_path, output_dir)
             if converted_path:
@@ -173,6 +226,8 @@ class ImageProcessor:
         Returns:
             dict: 图片信息字典
         """
+        from PIL import Image
+        
         try:
             with Image.open(image_path) as img:
                 return {
@@ -188,4 +243,22 @@ class ImageProcessor:
                 'mode': 'Unknown',
                 'filename': Path(image_path).name,
                 'error': str(e)
-            }
\ No newline at end of file
+            }
+
+    @staticmethod
+    def is_valid_image(image_path):
+        """检查图片文件是否完整（文件为空或数据被截断时返回False）"""
+        from PIL import Image
+        
+        try:
+            if os.path.getsize(image_path) == 0:
+                return False
+            with Image.open(image_path) as img:
+                img.verify()
+            # verify 不会解码像素数据，截断的图片需要完整加载才能发现
+            with Image.open(image_path) as img:
+                with get_memory_budget().reserve(MemoryBudget.estimate_image_bytes(img)):
+                    img.load()
+            return True
+        except Exception:
+            return False
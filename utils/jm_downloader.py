@@ -0,0 +1,137 @@
+"""
+JM漫画图片下载器
+
+漫画和章节信息仍由jmcomic获取，图片通过共享的连接池下载并由jmcomic解密。
+单张图片失败时按重试策略单独重试，重试用完后退回jmcomic自带的下载方式。
+每张图片保存后通知图片回调，转换可以在下载过程中进行。
+"""
+import os
+
+from jmcomic import JmDownloader, JmImageTool, JmModuleConfig
+
+from utils.http_pool import get_http_fetcher
+from utils.image_processor import ImageProcessor
+from utils.memory_budget import MemoryBudget, get_memory_budget
+from utils.metrics import metrics
+from utils.retry_policy import RetryPolicy
+
+
+class NotifyingJmDownloader(JmDownloader):
+    """每张图片保存后调用图片回调的JmDownloader"""
+
+    def __init__(self, option, page_callback=None):
+        """
+        Args:
+            option: JmOption
+            page_callback: 图片回调 page_callback(img_save_path)
+        """
+        super().__init__(option)
+        self.page_callback = page_callback
+
+    def after_image(self, image, img_save_path):
+        super().after_image(image, img_save_path)
+        if not (image.cache and image.exists):
+            metrics.incr('download_pages')
+        if self.page_callback and os.path.exists(img_save_path):
+            self.page_callback(img_save_path)
+
+
+class PooledJmDownloader(NotifyingJmDownloader):
+    """使用连接池下载图片的JmDownloader"""
+
+    def __init__(self, option, retry_policy=None, page_retry_callback=None, page_callback=None):
+        """
+        Args:
+            option: JmOption
+            retry_policy: 单张图片的重试策略
+            page_retry_callback: 图片重试回调 page_retry_callback(page_name, attempt, error)
+            page_callback: 图片回调 page_callback(img_save_path)
+        """
+        super().__init__(option, page_callback)
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.page_retry_callback = page_retry_callback
+
+    def download_by_image_detail(self, image):
+        img_save_path = self.option.decide_image_filepath(image)
+        image.save_path = img_save_path
+        image.exists = os.path.exists(img_save_path)
+        image.cache = self.option.decide_download_cache(image)
+
+        # 上次下载中断留下的损坏图片需要重新下载
+        if image.cache and image.exists and not ImageProcessor.is_valid_image(img_save_path):
+            os.remove(img_save_path)
+            image.exists = False
+
+        self.before_image(image, img_save_path)
+        if image.skip:
+            return
+
+        if not (image.cache and image.exists):
+            page_name = os.path.join(
+                os.path.basename(os.path.dirname(img_save_path)),
+                os.path.basename(img_save_path)
+            )
+            try:
+                self.retry_policy.call(
+                    self._fetch_image, image, img_save_path,
+                    on_retry=lambda attempt, error, delay: self._on_page_retry(page_name, attempt, error)
+                )
+            except Exception as e:
+                print(f"连接池下载图片失败，改用jmcomic下载: {image.download_url} ({e})")
+                return super().download_by_image_detail(image)
+
+        self.after_image(image, img_save_path)
+
+    def _on_page_retry(self, page_name, attempt, error):
+        print(f"图片下载失败，第{attempt}次重试: {page_name} ({error})")
+        if self.page_retry_callback:
+            self.page_retry_callback(page_name, attempt, error)
+
+    def _fetch_image(self, image, img_save_path):
+        """下载原图，需要时解密后保存"""
+        fetcher = get_http_fetcher(JmModuleConfig.new_html_headers())
+        source_path = img_save_path + '.src'
+        fetcher.fetch_to_file(image.download_url, source_path)
+
+        try:
+            decode_image = self.option.decide_download_image_decode(image)
+            same_suffix = os.path.splitext(image.img_url.split('?')[0])[1].lower() == \
+                os.path.splitext(img_save_path)[1].lower()
+
+            if decode_image and image.scramble_id is not None:
+                num = JmImageTool.get_num_by_url(int(image.scramble_id), image.img_url)
+                with JmImageTool.open_image(source_path) as img_src:
+                    # 解密时原图和拼接后的新图同时占用内存
+                    estimated_bytes = MemoryBudget.estimate_image_bytes(img_src, extra_bands=len(img_src.getbands()))
+                    with get_memory_budget().reserve(estimated_bytes):
+                        JmImageTool.decode_and_save(num, img_src, img_save_path)
+            elif same_suffix:
+                os.replace(source_path, img_save_path)
+            else:
+                with JmImageTool.open_image(source_path) as img_src:
+                    with get_memory_budget().reserve(MemoryBudget.estimate_image_bytes(img_src)):
+                        JmImageTool.save_image(img_src, img_save_path)
+        finally:
+            if os.path.exists(source_path):
+                os.remove(source_path)
+
+        if not ImageProcessor.is_valid_image(img_save_path):
+            os.remove(img_save_path)
+            raise IOError(f"图片数据不完整: {image.download_url}")
+
+
+def create_jm_downloader(option, engine='pooled', retry_policy=None, page_retry_callback=None,
+                         page_callback=None):
+    """
+    按配置创建下载器
+
+    Args:
+        option: JmOption
+        engine: pooled 使用连接池下载图片; jmcomic 使用jmcomic自带下载（由jmcomic的client重试）
+        retry_policy: 单张图片的重试策略（仅pooled）
+        page_retry_callback: 图片重试回调（仅pooled）
+        page_callback: 图片保存后的回调 page_callback(img_save_path)
+    """
+    if engine == 'pooled':
+        return PooledJmDownloader(option, retry_policy, page_retry_callback, page_callback)
+    return NotifyingJmDownloader(option, page_callback)
@@ -0,0 +1,94 @@
+import threading
+from contextlib import contextmanager
+
+
+class MemoryBudget:
+    """
+    图片解码内存预算
+
+    解码前根据图片头信息估算解码后的大小（宽 × 高 × 通道数），从预算中预留；
+    预算不足时等待其他图片处理完成。同时处理多张大图时进程的内存峰值不超过预算。
+    单张图片超过预算时，等到没有其他图片占用预算后单独处理。
+    """
+
+    def __init__(self, limit_bytes):
+        """
+        Args:
+            limit_bytes: 预算上限（字节，0为不限制）
+        """
+        self.limit_bytes = limit_bytes or 0
+        self.used = 0
+        self.peak = 0
+        self.waits = 0
+        self._condition = threading.Condition()
+
+    def _can_acquire(self, nbytes):
+        if self.used == 0:
+            return True
+        return self.used + nbytes <= self.limit_bytes
+
+    def acquire(self, nbytes):
+        """预留 nbytes 字节，预算不足时等待"""
+        if not self.limit_bytes or nbytes <= 0:
+            return
+        with self._condition:
+            if not self._can_acquire(nbytes):
+                self.waits += 1
+                self._condition.wait_for(lambda: self._can_acquire(nbytes))
+            self.used += nbytes
+            self.peak = max(self.peak, self.used)
+
+    def release(self, nbytes):
+        """归还预留的字节数"""
+        if not self.limit_bytes or nbytes <= 0:
+            return
+        with self._condition:
+            self.used -= nbytes
+            self._condition.notify_all()
+
+    @contextmanager
+    def reserve(self, nbytes):
+        """在 with 代码块执行期间预留 nbytes 字节"""
+        self.acquire(nbytes)
+        try:
+            yield
+        finally:
+            self.release(nbytes)
+
+    @staticmethod
+    def estimate_image_bytes(img, extra_bands=0):
+        """
+        估算图片解码后占用的内存（只读取图片头，不解码像素）
+
+        Args:
+            img: 已打开（尚未加载）的PIL图片
+            extra_bands: 处理过程中同尺寸副本的通道数（如转换为RGB时为3）
+
+        Returns:
+            int: 估算的字节数
+        """
+        width, height = img.size
+        return width * height * (len(img.getbands()) + extra_bands)
+
+    def get_stats(self):
+        with self._condition:
+            return {
+                'limit_bytes': self.limit_bytes,
+                'used_bytes': self.used,
+                'peak_bytes': self.peak,
+                'waits': self.waits
+            }
+
+
+_memory_budget = None
+_memory_budget_lock = threading.Lock()
+
+
+def get_memory_budget():
+    """获取进程内共享的图片解码内存预算（每个工作进程各自一份）"""
+    global _memory_budget
+    with _memory_budget_lock:
+        if _memory_budget is None:
+            from config import config
+            _memory_budget = MemoryBudget(config['default'].IMAGE_MEMORY_BUDGET)
+        return _memory_budget
@@ -0,0 +1,142 @@
+import os
+import time
+import threading
+from collections import deque
+
+
+class RateCounter:
+    """累计计数器，同时按秒分桶记录最近一段时间的数量，用于计算速率"""
+
+    def __init__(self, window=60):
+        """
+        Args:
+            window: 计算速率的时间窗口（秒）
+        """
+        self.window = window
+        self.total = 0
+        self._buckets = deque()
+        self._lock = threading.Lock()
+
+    def _trim(self, now):
+        while self._buckets and self._buckets[0][0] <= now - self.window:
+            self._buckets.popleft()
+
+    def add(self, value=1):
+        now = int(time.monotonic())
+        with self._lock:
+            self.total += value
+            if self._buckets and self._buckets[-1][0] == now:
+                self._buckets[-1][1] += value
+            else:
+                self._buckets.append([now, value])
+            self._trim(now)
+
+    def rate(self):
+        """最近 window 秒内的平均每秒数量"""
+        with self._lock:
+            self._trim(int(time.monotonic()))
+            return sum(value for _, value in self._buckets) / self.window
+
+
+class SystemMetrics:
+    """
+    系统运行指标
+
+    各处理阶段直接累加计数器（下载页数、字节数、转换页数等），查询时只读取当前值，
+    不需要遍历任务列表。多进程部署时每个进程定期把自己的指标写入共享目录，
+    查询接口汇总所有存活进程的指标。
+    """
+
+    def __init__(self, window=60):
+        self.window = window
+        self._counters = {}
+        self._gauges = {}
+        self._gauge_providers = {}
+        self._lock = threading.Lock()
+        self._publisher_pid = None
+
+    def incr(self, name, value=1):
+        """累加计数器"""
+        counter = self._counters.get(name)
+        if counter is None:
+            with self._lock:
+                counter = self._counters.setdefault(name, RateCounter(self.window))
+        counter.add(value)
+
+    def gauge_add(self, name, delta):
+        """调整当前值（如排队数量：入队+1，出队-1）"""
+        with self._lock:
+            self._gauges[name] = self._gauges.get(name, 0) + delta
+
+    def register_gauge(self, name, func):
+        """注册查询时才读取的当前值 func()"""
+        self._gauge_providers[name] = func
+
+    def snapshot(self):
+        """
+        当前进程的指标
+
+        Returns:
+            dict: {'pid', 'updated', 'counters': {name: {'total', 'rate'}}, 'gauges': {name: value}}
+        """
+        with self._lock:
+            counters = dict(self._counters)
+            gauges = dict(self._gauges)
+        for name, func in list(self._gauge_providers.items()):
+            try:
+                gauges[name] = func()
+            except Exception:
+                gauges[name] = 0
+        return {
+            'pid': os.getpid(),
+            'updated': time.time(),
+            'counters': {
+                name: {'total': counter.total, 'rate': counter.rate()}
+                for name, counter in counters.items()
+            },
+            'gauges': gauges
+        }
+
+    def start_publisher(self, store, interval=2):
+        """
+        在后台线程中定期把本进程的指标写入 store（SharedTaskStore，fork后的子进程需要重新启动）
+
+        Args:
+            store: 以进程号为键的共享存储
+            interval: 写入间隔（秒）
+        """
+        if self._publisher_pid == os.getpid():
+            return
+        with self._lock:
+            if self._publisher_pid == os.getpid():
+                return
+            self._publisher_pid = os.getpid()
+
+        def publish_loop():
+            while True:
+                try:
+                    store[str(os.getpid())] = self.snapshot()
+                except Exception as e:
+                    print(f"写入运行指标失败: {e}")
+                time.sleep(interval)
+
+        thread = threading.Thread(target=publish_loop)
+        thread.daemon = True
+        thread.start()
+
+    @staticmethod
+    def aggregate(snapshots):
+        """汇总多个进程的指标（计数和速率相加）"""
+        counters = {}
+        gauges = {}
+        for snapshot in snapshots:
+            for name, values in snapshot.get('counters', {}).items():
+                merged = counters.setdefault(name, {'total': 0, 'rate': 0.0})
+                merged['total'] += values['total']
+                merged['rate'] += values['rate']
+            for name, value in snapshot.get('gauges', {}).items():
+                gauges[name] = gauges.get(name, 0) + value
+        return {'counters': counters, 'gauges': gauges}
+
+
+metrics = SystemMetrics()
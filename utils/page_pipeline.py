@@ -0,0 +1,95 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from utils.image_processor import ImageProcessor
+from utils.metrics import metrics
+
+
+class PageConvertPipeline:
+    """
+    图片转换流水线
+
+    下载器每保存一张图片就提交到转换线程池（生产者/消费者），下载和转换同时进行；
+    全部下载完成后只需等待最后几张图片转换完成即可生成PDF。
+    """
+
+    def __init__(self, output_dir, image_processor=None, max_workers=2):
+        """
+        Args:
+            output_dir: 转换后图片的保存目录
+            image_processor: ImageProcessor 实例
+            max_workers: 转换线程数
+        """
+        self.output_dir = output_dir
+        self.image_processor = image_processor or ImageProcessor()
+        self._executor = ThreadPoolExecutor(max_workers=max(1, max_workers or 1))
+        self._futures = {}
+        self._convert_dirs = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def page_key(image_path):
+        """图片标识（章节目录名 + 文件名），下载目录和缓存目录中的同一张图片标识相同"""
+        return os.path.join(
+            os.path.basename(os.path.dirname(image_path)),
+            os.path.basename(image_path)
+        )
+
+    def submit(self, image_path):
+        """提交一张已下载的图片（可作为下载器的图片回调）"""
+        key = self.page_key(image_path)
+        with self._lock:
+            if key not in self._futures:
+                metrics.gauge_add('queued_pages', 1)
+                self._futures[key] = self._executor.submit(self._convert, image_path)
+
+    def _get_convert_dir(self, image_path):
+        """每个章节目录使用单独的转换目录，避免不同章节的同名图片冲突"""
+        source_dir = os.path.dirname(image_path)
+        with self._lock:
+            convert_dir = self._convert_dirs.get(source_dir)
+            if convert_dir is None:
+                convert_dir = os.path.join(self.output_dir, str(len(self._convert_dirs)))
+                self._convert_dirs[source_dir] = convert_dir
+        os.makedirs(convert_dir, exist_ok=True)
+        return convert_dir
+
+    def _convert(self, image_path):
+        """转换单张图片，失败时使用原图"""
+        metrics.gauge_add('queued_pages', -1)
+        converted_path = self.image_processor.convert_to_supported_format(
+            image_path, self._get_convert_dir(image_path)
+        )
+        # 无需转换的图片就是下载目录（或缓存）中的原图，不在原图上做尺寸优化
+        if not converted_path or converted_path == image_path:
+            return image_path
+        return self.image_processor.optimize_image_for_pdf(converted_path)
+
+    def finish(self, image_files):
+        """
+        等待所有图片转换完成
+
+        Args:
+            image_files: 按页码排序的完整图片列表（未提交过的图片在这里补充转换）
+
+        Returns:
+            list: 与 image_files 顺序相同的转换后图片路径
+        """
+        for image_path in image_files:
+            self.submit(image_path)
+
+        try:
+            return [self._futures[self.page_key(p)].result() for p in image_files]
+        finally:
+            self.close()
+
+    def close(self):
+        """停止转换线程池（未开始的转换任务会被取消）"""
+        self._executor.shutdown(wait=True, cancel_futures=True)
+        with self._lock:
+            cancelled = [key for key, future in self._futures.items() if future.cancelled()]
+            for key in cancelled:
+                del self._futures[key]
+        if cancelled:
+            metrics.gauge_add('queued_pages', -len(cancelled))
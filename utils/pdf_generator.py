@@ -1,24 +1,29 @@
 import os
-import img2pdf
 from pathlib import Path
 from utils.file_utils import FileUtils
+from utils.metrics import metrics
 
 class PDFGenerator:
     """PDF生成类"""
     
     def __init__(self):
         self.status_callback = None
+        self.pdf_callback = None
     
     def set_status_callback(self, callback):
         """设置状态回调函数"""
         self.status_callback = callback
     
+    def set_pdf_callback(self, callback):
+        """设置PDF生成完成回调函数 callback(folder_name, pdf_path)"""
+        self.pdf_callback = callback
+    
     def _update_status(self, message, progress=None):
         """更新处理状态"""
         if self.status_callback:
             self.status_callback(message, progress)
     
-    def generate_pdf_from_images(self, image_paths, output_pdf_path, page_size='A4'):
+    def generate_pdf_from_images(self, image_paths, output_pdf_path, page_size='A4', stored_members=None):
         """
         从图片列表生成PDF
         
@@ -26,10 +31,15 @@ class PDFGenerator:
             image_paths: 图片路径列表
             output_pdf_path: 输出PDF路径
             page_size: 页面尺寸
+            stored_members: StoredMemberIndex，其中的路径从压缩包直接读取（mmap，不复制到临时文件）
             
         Returns:
             bool: 是否成功生成
         """
+        import img2pdf
+        
+        # 先写入临时文件再重命名，避免未写完的PDF被下载
+        partial_pdf_path = output_pdf_path + '.part'
         try:
             if not image_paths:
                 self._update_status("没有图片可生成PDF")
@@ -40,7 +50,7 @@ class PDFGenerator:
             # 验证所有图片文件都存在
             valid_images = []
             for img_path in image_paths:
-                if os.path.exists(img_path):
+                if (stored_members is not None and img_path in stored_members) or os.path.exists(img_path):
                     valid_images.append(img_path)
                 else:
                     self._update_status(f"图片文件不存在: {img_path}")
@@ -52,12 +62,27 @@ class PDFGenerator:
             # 设置PDF页面参数
             pdf_layout_fun = self._get_pdf_layout_function(page_size)
             
-            # 生成PDF
-            with open(output_pdf_path, "wb") as pdf_file:
-                pdf_file.write(img2pdf.convert(
-                    valid_images,
-                    layout_fun=pdf_layout_fun
-                ))
+            convert_options = {'layout_fun': pdf_layout_fun}
+            reader = None
+            if stored_members is not None and any(p in stored_members for p in valid_images):
+                reader = stored_members.open_reader()
+                if hasattr(img2pdf, 'Engine'):
+                    # pikepdf引擎只接受bytes，内置引擎可以直接写入memoryview
+                    convert_options['engine'] = img2pdf.Engine.internal
+            
+            try:
+                images = [
+                    reader.member(p) if reader is not None and p in stored_members else p
+                    for p in valid_images
+                ]
+                with open(partial_pdf_path, "wb") as pdf_file:
+                    pdf_file.write(img2pdf.convert(images, **convert_options))
+            finally:
+                if reader is not None:
+                    reader.close()
+            os.replace(partial_pdf_path, output_pdf_path)
+            metrics.incr('pdf_pages', len(valid_images))
+            metrics.incr('pdf_bytes', os.path.getsize(output_pdf_path))
             
             # 验证生成的PDF文件
             if os.path.exists(output_pdf_path) and os.path.getsize(output_pdf_path) > 0:
@@ -68,11 +93,15 @@ class PDFGenerator:
                 return False
                 
         except Exception as e:
+            # 删除未写完的临时文件
+            FileUtils.safe_remove(partial_pdf_path)
             self._update_status(f"PDF生成失败: {str(e)}")
             return False
     
     def _get_pdf_layout_function(self, page_size):
         """获取PDF布局函数"""
+        import img2pdf
+        
         if page_size.upper() == 'A4':
             # A4尺寸：210mm x 297mm
             return img2pdf.get_layout_fun((img2pdf.mm_to_pt(210), img2pdf.mm_to_pt(297)))
@@ -83,7 +112,7 @@ class PDFGenerator:
             # 默认使用A4
             return img2pdf.get_layout_fun((img2pdf.mm_to_pt(210), img2pdf.mm_to_pt(297)))
     
-    def generate_pdfs_by_folder(self, image_groups, output_dir, base_name="output"):
+    def generate_pdfs_by_folder(self, image_groups, output_dir, base_name="output", stored_members=None):
         """
         按文件夹分组生成多个PDF
         
@@ -91,6 +120,7 @@ class PDFGenerator:
             image_groups: 按文件夹分组的图片字典 {folder_path: [image_paths]}
             output_dir: 输出目录
             base_name: 基础文件名
+            stored_members: StoredMemberIndex，其中的图片直接从压缩包读取
             
         Returns:
             dict: 生成的PDF文件路径字典 {folder_name: pdf_path}
@@ -108,9 +138,11 @@ class PDFGenerator:
             pdf_filename = f"{base_name}_{folder_name}.pdf"
             pdf_path = os.path.join(output_dir, pdf_filename)
             
-            # 生成PDF
-            if self.generate_pdf_from_images(image_paths, pdf_path):
+            # 生成PDF，每完成一个立即通知，便于提前下载
+            if self.generate_pdf_from_images(image_paths, pdf_path, stored_members=stored_members):
                 generated_pdfs[folder_name] = pdf_path
+                if self.pdf_callback:
+                    self.pdf_callback(folder_name, pdf_path)
         
         return generated_pdfs
     
@@ -125,17 +157,15 @@ class PDFGenerator:
         Returns:
             bool: 是否成功打包
         """
-        import zipfile
+        from config import config
+        from utils.zip_packager import ZipPackager
         
         try:
             self._update_status("正在打包PDF文件...")
             
-            with zipfile.ZipFile(output_zip_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
-                for pdf_path in pdf_files:
-                    if os.path.exists(pdf_path):
-                        # 使用相对路径存储
-                        arcname = Path(pdf_path).name
-                        zipf.write(pdf_path, arcname)
+            # PDF内部已经压缩，自适应打包时会直接存储
+            packager = ZipPackager.from_config(config['default'])
+            packager.create_package(pdf_files, output_zip_path)
             
             # 验证生成的ZIP文件
             if os.path.exists(output_zip_path) and os.path.getsize(output_zip_path) > 0:
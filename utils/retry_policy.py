@@ -0,0 +1,69 @@
+import time
+import random
+
+
+class RetryPolicy:
+    """
+    重试策略：指数退避 + 随机抖动
+
+    第 n 次重试前等待 min(max_delay, base_delay * 2^n) 的 50%~100%，
+    避免大量失败的请求在同一时刻重试。
+    """
+
+    def __init__(self, max_retry=3, base_delay=1.0, max_delay=30.0, deadline=None):
+        """
+        Args:
+            max_retry: 最多尝试次数
+            base_delay: 第一次重试前的基础等待时间（秒）
+            max_delay: 单次等待时间上限（秒）
+            deadline: 重试总时长上限（秒），从第一次尝试开始计算；None为不限制
+        """
+        self.max_retry = max(1, max_retry)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.deadline = deadline
+
+    @classmethod
+    def from_config(cls, config_obj, **kwargs):
+        """根据配置创建重试策略（JM_MAX_RETRY、JM_DOWNLOAD_TIMEOUT）"""
+        kwargs.setdefault('max_retry', getattr(config_obj, 'JM_MAX_RETRY', 3))
+        kwargs.setdefault('deadline', getattr(config_obj, 'JM_DOWNLOAD_TIMEOUT', None))
+        return cls(**kwargs)
+
+    def get_delay(self, attempt):
+        """第 attempt 次失败后的等待时间（attempt 从0开始）"""
+        delay = min(self.max_delay, self.base_delay * (2 ** attempt))
+        return delay * random.uniform(0.5, 1.0)
+
+    def should_retry(self, attempt, started_at, delay=0):
+        """第 attempt 次失败后是否还可以重试"""
+        if attempt + 1 >= self.max_retry:
+            return False
+        if self.deadline is not None and time.monotonic() - started_at + delay > self.deadline:
+            return False
+        return True
+
+    def call(self, func, *args, on_retry=None, **kwargs):
+        """
+        执行函数，失败时按策略重试
+
+        Args:
+            func: 要执行的函数
+            on_retry: 重试回调 on_retry(attempt, error, delay)，attempt 为已失败的次数
+
+        Returns:
+            func 的返回值；重试次数用完后抛出最后一次的异常
+        """
+        started_at = time.monotonic()
+        attempt = 0
+        while True:
+            try:
+                return func(*args, **kwargs)
+            except Exception as e:
+                delay = self.get_delay(attempt)
+                if not self.should_retry(attempt, started_at, delay):
+                    raise
+                attempt += 1
+                if on_retry:
+                    on_retry(attempt, e, delay)
+                time.sleep(delay)
@@ -0,0 +1,189 @@
+import os
+import time
+import shutil
+import sqlite3
+import threading
+from contextlib import closing
+
+
+class ScratchPool:
+    """
+    临时工作目录池
+
+    解压和图片转换的临时目录可以分布在多个卷上（如小任务使用tmpfs，大任务使用大容量磁盘）。
+    每个任务按估算的磁盘占用选择目录：
+    - 只考虑单任务上限（max_task_bytes）不小于估算大小的卷，上限越小越优先（小任务放在内存盘）
+    - 上限相同时选择剩余空间（扣除已分配给其他任务的空间）最多的卷，大任务分散到各个卷
+
+    指定 db_path 时分配记录保存在SQLite中，多个工作进程共用（分配进程已退出的记录自动失效）。
+    """
+
+    def __init__(self, volumes, db_path=None):
+        """
+        Args:
+            volumes: [(目录, 单任务最大字节数或None)]
+            db_path: SQLite数据库路径（None时分配记录只保存在进程内）
+        """
+        self.volumes = [(os.path.abspath(path), max_task_bytes) for path, max_task_bytes in volumes]
+        self.db_path = db_path
+        self._allocations = {}
+        self._lock = threading.Lock()
+        if db_path:
+            os.makedirs(os.path.dirname(db_path) or '.', exist_ok=True)
+            with closing(self._connect()) as conn:
+                conn.execute(
+                    'CREATE TABLE IF NOT EXISTS scratch_allocations ('
+                    'task_id TEXT PRIMARY KEY, volume TEXT, bytes INTEGER, pid INTEGER, created REAL)'
+                )
+
+    @classmethod
+    def from_config(cls, app_config):
+        """根据Flask配置创建（未配置 SCRATCH_DIRS 时只使用 TEMP_FOLDER；与产物索引使用同一个数据库）"""
+        volumes = app_config.get('SCRATCH_DIRS')
+        if isinstance(volumes, str):
+            volumes = cls.parse_volumes(volumes)
+        return cls(
+            volumes or [(app_config.get('TEMP_FOLDER', 'temp'), None)],
+            db_path=app_config.get('ARTIFACT_INDEX_PATH', 'task_state/artifacts.db')
+        )
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.execute('PRAGMA journal_mode=WAL')
+        return conn
+
+    @staticmethod
+    def _is_process_alive(pid):
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return False
+        except PermissionError:
+            return True
+        return True
+
+    def _allocated_by_volume(self, conn=None):
+        """各卷已分配给任务的字节数（忽略分配进程已退出的记录）"""
+        if not self.db_path:
+            rows = [(volume, nbytes, None) for volume, nbytes in self._allocations.values()]
+        elif conn is None:
+            with closing(self._connect()) as conn:
+                rows = conn.execute('SELECT volume, bytes, pid FROM scratch_allocations').fetchall()
+        else:
+            rows = conn.execute('SELECT volume, bytes, pid FROM scratch_allocations').fetchall()
+        allocated = {}
+        for volume, nbytes, pid in rows:
+            if pid is None or pid == os.getpid() or self._is_process_alive(pid):
+                allocated[volume] = allocated.get(volume, 0) + (nbytes or 0)
+        return allocated
+
+    @staticmethod
+    def parse_volumes(value):
+        """
+        解析环境变量格式的卷配置
+
+        格式为逗号分隔的 目录[:单任务最大字节数]，如 "/dev/shm/zip2pdf:268435456,/mnt/scratch"
+        """
+        volumes = []
+        for item in (value or '').split(','):
+            item = item.strip()
+            if not item:
+                continue
+            path, _, limit = item.rpartition(':')
+            if path and limit.isdigit():
+                volumes.append((path, int(limit)))
+            else:
+                volumes.append((item, None))
+        return volumes
+
+    @property
+    def paths(self):
+        return [path for path, _ in self.volumes]
+
+    def _free_bytes(self, path, allocated=None):
+        try:
+            os.makedirs(path, exist_ok=True)
+            free = shutil.disk_usage(path).free
+        except OSError:
+            return -1
+        if allocated is None:
+            allocated = self._allocated_by_volume()
+        return free - allocated.get(path, 0)
+
+    def choose(self, estimated_bytes=0, allocated=None):
+        """选择卷（没有满足条件的卷时返回剩余空间最多的卷）"""
+        estimated_bytes = estimated_bytes or 0
+        if allocated is None:
+            allocated = self._allocated_by_volume()
+        candidates = []
+        for path, max_task_bytes in self.volumes:
+            if max_task_bytes is not None and estimated_bytes > max_task_bytes:
+                continue
+            free = self._free_bytes(path, allocated)
+            if free < estimated_bytes:
+                continue
+            limit = max_task_bytes if max_task_bytes is not None else float('inf')
+            candidates.append((limit, -free, path))
+        if candidates:
+            return min(candidates)[2]
+        return max(self.paths, key=lambda path: self._free_bytes(path, allocated))
+
+    def allocate(self, task_id, estimated_bytes=0):
+        """
+        为任务分配临时目录（同一任务重复分配时返回已分配的目录）
+
+        Returns:
+            str: 任务临时目录 <卷>/temp_<task_id>
+        """
+        with self._lock:
+            if self.db_path:
+                volume = self._allocate_shared(task_id, estimated_bytes or 0)
+            else:
+                allocation = self._allocations.get(task_id)
+                if allocation is None:
+                    allocation = (self.choose(estimated_bytes), estimated_bytes or 0)
+                    self._allocations[task_id] = allocation
+                volume = allocation[0]
+        task_dir = os.path.join(volume, f"temp_{task_id}")
+        os.makedirs(task_dir, exist_ok=True)
+        return task_dir
+
+    def _allocate_shared(self, task_id, estimated_bytes):
+        """在共享数据库中选择卷并记录分配（选择和记录在同一个事务中，多个进程不会同时选中同一份空间）"""
+        with closing(self._connect()) as conn:
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                row = conn.execute(
+                    'SELECT volume FROM scratch_allocations WHERE task_id = ?', (task_id,)
+                ).fetchone()
+                if row:
+                    volume = row[0]
+                    # 恢复的任务由当前进程继续执行
+                    conn.execute('UPDATE scratch_allocations SET pid = ? WHERE task_id = ?', (os.getpid(), task_id))
+                else:
+                    volume = self.choose(estimated_bytes, self._allocated_by_volume(conn))
+                    conn.execute(
+                        'INSERT INTO scratch_allocations (task_id, volume, bytes, pid, created) VALUES (?, ?, ?, ?, ?)',
+                        (task_id, volume, estimated_bytes, os.getpid(), time.time())
+                    )
+                conn.execute('COMMIT')
+                return volume
+            except BaseException:
+                conn.execute('ROLLBACK')
+                raise
+
+    def release(self, task_id):
+        """任务结束后释放分配记录（不删除目录）"""
+        with self._lock:
+            self._allocations.pop(task_id, None)
+            if self.db_path:
+                with closing(self._connect()) as conn:
+                    conn.execute('DELETE FROM scratch_allocations WHERE task_id = ?', (task_id,))
+
+    def find_task_dirs(self, task_id):
+        """查找任务在各个卷上的临时目录"""
+        return [
+            os.path.join(path, f"temp_{task_id}")
+            for path in self.paths
+            if os.path.isdir(os.path.join(path, f"temp_{task_id}"))
+        ]
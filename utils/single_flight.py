@@ -0,0 +1,159 @@
+import os
+import sqlite3
+import threading
+import time
+from contextlib import closing
+
+
+class SingleFlight:
+    """
+    相同请求合并类
+
+    同一个键（如 jm:<id> 或上传文件的哈希）同时只允许一个任务执行：
+    - claim/release: 任务级合并，后提交的请求直接使用正在执行的任务ID
+    - do: 调用级合并，并发调用同一个键时只执行一次，其余调用等待并共享结果
+
+    指定 db_path 时登记记录保存在SQLite中，多个工作进程共用（登记进程已退出的记录自动失效）：
+    - claim 在所有进程之间合并，其他进程的请求也会得到正在执行的任务ID
+    - do 在进程内共享结果；其他进程正在执行同一个键时等待其完成后再执行，
+      被调用的函数应能直接使用前一次执行留下的结果（如漫画缓存）
+    """
+
+    def __init__(self, db_path=None, poll_interval=0.5):
+        """
+        Args:
+            db_path: SQLite数据库路径（None时只在进程内合并）
+            poll_interval: 等待其他进程执行完成时的检查间隔（秒）
+        """
+        self.db_path = db_path
+        self.poll_interval = poll_interval
+        self._lock = threading.Lock()
+        self._owners = {}  # 键 -> 正在执行的任务ID
+        self._calls = {}  # 键 -> 正在执行的调用
+        if db_path:
+            os.makedirs(os.path.dirname(db_path) or '.', exist_ok=True)
+            with closing(self._connect()) as conn:
+                conn.execute(
+                    'CREATE TABLE IF NOT EXISTS single_flight ('
+                    'key TEXT PRIMARY KEY, owner TEXT, pid INTEGER, created REAL)'
+                )
+
+    @classmethod
+    def from_config(cls, app_config):
+        """根据Flask配置创建（与产物索引使用同一个数据库）"""
+        return cls(app_config.get('ARTIFACT_INDEX_PATH', 'task_state/artifacts.db'))
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.execute('PRAGMA journal_mode=WAL')
+        return conn
+
+    @staticmethod
+    def _is_process_alive(pid):
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return False
+        except PermissionError:
+            return True
+        return True
+
+    def _acquire_shared(self, key, owner):
+        """
+        在共享数据库中登记键
+
+        本进程的登记与进程内记录同时释放，数据库中残留的本进程记录视为已失效。
+
+        Returns:
+            str: 键已被其他存活进程登记时返回其登记者，登记成功时返回None
+        """
+        with closing(self._connect()) as conn:
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                row = conn.execute('SELECT owner, pid FROM single_flight WHERE key = ?', (key,)).fetchone()
+                if row and row[1] != os.getpid() and self._is_process_alive(row[1]):
+                    conn.execute('COMMIT')
+                    return row[0]
+                conn.execute(
+                    'INSERT OR REPLACE INTO single_flight (key, owner, pid, created) VALUES (?, ?, ?, ?)',
+                    (key, owner, os.getpid(), time.time())
+                )
+                conn.execute('COMMIT')
+                return None
+            except BaseException:
+                conn.execute('ROLLBACK')
+                raise
+
+    def _release_shared(self, column, value):
+        with closing(self._connect()) as conn:
+            conn.execute(f'DELETE FROM single_flight WHERE {column} = ?', (value,))
+
+    def claim(self, key, task_id):
+        """
+        登记任务
+
+        Args:
+            key: 任务键
+            task_id: 新任务ID
+
+        Returns:
+            tuple: (实际执行的任务ID, 是否为新任务)；键已有任务在执行时返回该任务ID
+        """
+        with self._lock:
+            owner = self._owners.get(key)
+            if owner is not None:
+                return owner, False
+            if self.db_path:
+                owner = self._acquire_shared(key, task_id)
+                if owner is not None:
+                    return owner, False
+            self._owners[key] = task_id
+            return task_id, True
+
+    def release(self, task_id):
+        """任务结束后释放其登记的所有键"""
+        with self._lock:
+            for key in [k for k, owner in self._owners.items() if owner == task_id]:
+                del self._owners[key]
+            if self.db_path:
+                self._release_shared('owner', task_id)
+
+    def do(self, key, func, *args, **kwargs):
+        """
+        执行调用，同一个键正在执行时等待其结果
+
+        Returns:
+            func 的返回值（进程内等待的调用共享同一个结果，异常也会在等待的调用中重新抛出）
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = {'event': threading.Event(), 'result': None, 'error': None}
+                self._calls[key] = call
+
+        if not leader:
+            call['event'].wait()
+            if call['error'] is not None:
+                raise call['error']
+            return call['result']
+
+        shared_key = f"call:{key}"
+        acquired = False
+        try:
+            if self.db_path:
+                # 其他进程正在执行同一个键时等待其完成
+                while self._acquire_shared(shared_key, shared_key) is not None:
+                    time.sleep(self.poll_interval)
+                acquired = True
+            call['result'] = func(*args, **kwargs)
+            return call['result']
+        except Exception as e:
+            call['error'] = e
+            raise
+        finally:
+            if acquired:
+                self._release_shared('key', shared_key)
+            with self._lock:
+                del self._calls[key]
+            call['event'].set()
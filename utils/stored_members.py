@@ -0,0 +1,131 @@
+import mmap
+import zlib
+import struct
+import zipfile
+
+# ZIP本地文件头: 签名, 版本, 标志, 压缩方法, 时间, 日期, CRC, 压缩后大小, 原始大小, 文件名长度, 扩展字段长度
+LOCAL_HEADER_FORMAT = '<IHHHHHIIIHH'
+LOCAL_HEADER_SIZE = struct.calcsize(LOCAL_HEADER_FORMAT)
+LOCAL_HEADER_SIGNATURE = 0x04034b50
+
+
+def is_stored_member(info):
+    """成员是否未压缩、未加密存储（数据在压缩包中连续存放，可以直接引用）"""
+    return (
+        info.compress_type == zipfile.ZIP_STORED
+        and not info.flag_bits & 0x1
+        and info.compress_size == info.file_size
+    )
+
+
+def stored_data_offset(fp, info):
+    """
+    从本地文件头计算成员数据在压缩包中的偏移
+
+    中央目录中的扩展字段长度可能与本地文件头不同，必须读取本地文件头。
+    """
+    fp.seek(info.header_offset)
+    header = fp.read(LOCAL_HEADER_SIZE)
+    if len(header) != LOCAL_HEADER_SIZE:
+        raise zipfile.BadZipFile(f"本地文件头不完整: {info.filename}")
+    fields = struct.unpack(LOCAL_HEADER_FORMAT, header)
+    if fields[0] != LOCAL_HEADER_SIGNATURE:
+        raise zipfile.BadZipFile(f"本地文件头签名错误: {info.filename}")
+    return info.header_offset + LOCAL_HEADER_SIZE + fields[9] + fields[10]
+
+
+def verify_stored_member(view, info):
+    """校验成员数据的CRC（引用的成员不经过解压，需要单独校验）"""
+    return zlib.crc32(view) & 0xffffffff == info.CRC
+
+
+class StoredMemberIndex:
+    """
+    ZIP中直接存储的成员索引
+
+    漫画ZIP中的JPEG通常未压缩存储，不需要解压到临时目录：解压时只记录成员数据在压缩包中的位置，
+    生成PDF时通过mmap把数据直接交给img2pdf。索引以虚拟路径（解压时本应写入的路径）为键，
+    图片分组、检查点和PDF生成都可以像普通文件一样使用这些路径。
+    """
+
+    def __init__(self, archive_path, members=None):
+        """
+        Args:
+            archive_path: 压缩包路径（生成PDF前不能删除）
+            members: {虚拟路径: [数据偏移, 大小]}
+        """
+        self.archive_path = archive_path
+        self.members = {path: tuple(location) for path, location in (members or {}).items()}
+
+    def __contains__(self, path):
+        return path in self.members
+
+    def __len__(self):
+        return len(self.members)
+
+    def add(self, path, offset, size):
+        self.members[path] = (offset, size)
+
+    def paths(self):
+        return list(self.members)
+
+    def to_dict(self):
+        """保存到检查点的数据"""
+        return {
+            'archive_path': self.archive_path,
+            'members': {path: list(location) for path, location in self.members.items()}
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data['archive_path'], data.get('members'))
+
+    def open_reader(self):
+        return StoredMemberReader(self)
+
+
+class StoredMemberReader:
+    """以mmap方式读取压缩包中的成员数据（不复制）"""
+
+    def __init__(self, index):
+        self.index = index
+        self._file = open(index.archive_path, 'rb')
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._view = memoryview(self._mmap)
+        self._slices = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def view(self, path):
+        """成员数据的 memoryview"""
+        offset, size = self.index.members[path]
+        data = self._view[offset:offset + size]
+        self._slices.append(data)
+        return data
+
+    def member(self, path):
+        """可以直接传给 img2pdf.convert 的对象（img2pdf 调用 read() 读取数据）"""
+        return _MemberData(self.view(path))
+
+    def close(self):
+        try:
+            for data in self._slices:
+                data.release()
+            self._view.release()
+            self._mmap.close()
+        except BufferError:
+            # img2pdf 内部仍引用成员数据时，mmap 在引用释放后由垃圾回收关闭
+            pass
+        self._file.close()
+
+
+class _MemberData:
+    def __init__(self, view):
+        self._view = view
+
+    def read(self):
+        return self._view
@@ -0,0 +1,137 @@
+import os
+import json
+import time
+import threading
+from collections.abc import MutableMapping
+
+
+class SharedTaskStore(MutableMapping):
+    """
+    多进程共享的任务状态字典
+
+    本进程创建的任务保存在内存中，后台线程定期把它们写入 <directory>/<name>/<task_id>.json；
+    读取不属于本进程的任务时从文件读取。多个Web工作进程之间因此可以互相查询任务状态，
+    任务代码仍然像使用普通字典一样直接修改状态。任务结束后调用 release 写入最终状态并移出内存，
+    之后只从文件读取。
+    """
+
+    def __init__(self, name, directory, flush_interval=0.5):
+        """
+        Args:
+            name: 状态名称（对应子目录）
+            directory: 状态文件根目录
+            flush_interval: 写入文件的间隔（秒）
+        """
+        self.directory = os.path.join(directory, name)
+        self.flush_interval = flush_interval
+        self._local = {}
+        self._written = {}
+        self._lock = threading.Lock()
+        self._flusher_pid = None
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.json")
+
+    def _ensure_flusher(self):
+        """启动后台写入线程（fork后的子进程中需要重新启动）"""
+        if self._flusher_pid == os.getpid():
+            return
+        with self._lock:
+            if self._flusher_pid == os.getpid():
+                return
+            self._flusher_pid = os.getpid()
+            thread = threading.Thread(target=self._flush_loop)
+            thread.daemon = True
+            thread.start()
+
+    def _flush_loop(self):
+        while True:
+            time.sleep(self.flush_interval)
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"写入任务状态失败: {e}")
+
+    def _write(self, key, value):
+        """写入单个任务（内容未变化时跳过）"""
+        data = json.dumps(value, ensure_ascii=False, default=str)
+        if self._written.get(key) == data:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        temp_path = f"{self._path(key)}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            f.write(data)
+        os.replace(temp_path, self._path(key))
+        with self._lock:
+            # 已 release 的任务不再记录
+            if key in self._local:
+                self._written[key] = data
+
+    def flush(self):
+        """将本进程的任务状态写入文件"""
+        with self._lock:
+            items = list(self._local.items())
+        for key, value in items:
+            self._write(key, value)
+
+    def release(self, key):
+        """
+        任务结束后写入最终状态并从内存中移除（之后的读取和修改都通过状态文件）
+
+        Returns:
+            str: 状态文件路径，不是本进程的任务时返回None
+        """
+        with self._lock:
+            value = self._local.get(key)
+        if value is None:
+            return None
+        self._write(key, value)
+        with self._lock:
+            if self._local.get(key) is value:
+                del self._local[key]
+                self._written.pop(key, None)
+        return self._path(key)
+
+    def __setitem__(self, key, value):
+        with self._lock:
+            self._local[key] = value
+        self._write(key, value)
+        self._ensure_flusher()
+
+    def __getitem__(self, key):
+        with self._lock:
+            if key in self._local:
+                return self._local[key]
+        try:
+            with open(self._path(key), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            raise KeyError(key)
+
+    def __delitem__(self, key):
+        with self._lock:
+            found = self._local.pop(key, None) is not None
+            self._written.pop(key, None)
+        try:
+            os.remove(self._path(key))
+            found = True
+        except OSError:
+            pass
+        if not found:
+            raise KeyError(key)
+
+    def __contains__(self, key):
+        with self._lock:
+            if key in self._local:
+                return True
+        return os.path.exists(self._path(key))
+
+    def __iter__(self):
+        with self._lock:
+            keys = set(self._local)
+        if os.path.isdir(self.directory):
+            keys.update(f[:-len('.json')] for f in os.listdir(self.directory) if f.endswith('.json'))
+        return iter(sorted(keys))
+
+    def __len__(self):
+        return sum(1 for _ in self)
@@ -0,0 +1,71 @@
+import os
+import signal
+import threading
+
+
+class TaskTracker:
+    """
+    工作进程任务计数
+
+    记录本进程正在执行和已完成的后台任务数量。启用回收后，进程完成指定数量的任务
+    且没有正在执行的任务时向自身发送SIGTERM，由gunicorn主进程平滑重启工作进程，
+    释放Pillow等库长期运行后累积的内存。
+    """
+
+    def __init__(self):
+        self.active = 0
+        self.finished = 0
+        self.max_tasks = 0
+        self._lock = threading.Lock()
+
+    def enable_recycle(self, max_tasks):
+        """启用回收（max_tasks 为0时不回收），只应在gunicorn工作进程中调用"""
+        with self._lock:
+            self.max_tasks = max_tasks or 0
+            self.finished = 0
+
+    def run(self, target, *args):
+        """执行后台任务并计数"""
+        with self._lock:
+            self.active += 1
+        try:
+            return target(*args)
+        finally:
+            with self._lock:
+                self.active -= 1
+                self.finished += 1
+                recycle = self.max_tasks and self.finished >= self.max_tasks and self.active == 0
+            if recycle:
+                print(f"工作进程 {os.getpid()} 已完成 {self.finished} 个任务，平滑重启")
+                os.kill(os.getpid(), signal.SIGTERM)
+
+    def start_thread(self, target, args=()):
+        """在后台线程中执行任务"""
+        thread = threading.Thread(target=self.run, args=(target,) + tuple(args))
+        thread.daemon = True
+        thread.start()
+        return thread
+
+
+task_tracker = TaskTracker()
+
+
+def preload_codecs():
+    """
+    预加载图片编解码器和压缩库
+
+    在gunicorn主进程fork之前调用，工作进程共享已加载的模块，
+    不必在第一个请求时再导入和注册Pillow插件。
+    """
+    from PIL import Image
+    Image.init()
+
+    import img2pdf  # noqa: F401
+    import zipfile  # noqa: F401
+    import tarfile  # noqa: F401
+
+    for module_name in ('rarfile', 'py7zr'):
+        try:
+            __import__(module_name)
+        except ImportError:
+            print(f"预加载 {module_name} 失败（未安装）")
@@ -0,0 +1,406 @@
+import bisect
+import functools
+import hashlib
+import io
+import os
+import struct
+import time
+import zipfile
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+
+class ZipPackager:
+    """
+    ZIP打包类
+
+    PDF、JPEG等文件本身已经压缩过，再用DEFLATE压缩只能节省约1%的空间却要消耗大量CPU。
+    adaptive 模式会先在线程池中并行抽样估算每个成员的可压缩性，不可压缩的成员直接存储（ZIP_STORED），
+    可压缩的成员才使用DEFLATE压缩。线程池只用于抽样，成员的压缩和写入由 ZipFile 按顺序进行。
+    """
+
+    # 打包模式
+    MODE_ADAPTIVE = 'adaptive'
+    MODE_DEFLATED = 'deflated'
+    MODE_STORED = 'stored'
+
+    def __init__(self, mode=MODE_ADAPTIVE, compress_level=6, max_workers=None,
+                 sample_size=64 * 1024, sample_count=4, min_saving=0.05):
+        """
+        Args:
+            mode: 打包模式 adaptive / deflated / stored
+            compress_level: DEFLATE压缩级别
+            max_workers: 并行抽样估算可压缩性的线程数（不用于压缩），默认CPU核数
+            sample_size: 每个抽样块的大小（字节）
+            sample_count: 每个成员的抽样块数量
+            min_saving: 抽样压缩率至少节省多少比例才使用DEFLATE
+        """
+        self.mode = (mode or self.MODE_ADAPTIVE).lower()
+        self.compress_level = compress_level
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.sample_size = sample_size
+        self.sample_count = sample_count
+        self.min_saving = min_saving
+        self.status_callback = None
+
+    @classmethod
+    def from_config(cls, config_obj):
+        """根据配置类创建打包器"""
+        return cls(
+            mode=getattr(config_obj, 'ZIP_PACKAGE_MODE', cls.MODE_ADAPTIVE),
+            compress_level=getattr(config_obj, 'ZIP_COMPRESS_LEVEL', 6),
+            max_workers=getattr(config_obj, 'ZIP_COMPRESS_WORKERS', None)
+        )
+
+    def set_status_callback(self, callback):
+        """设置状态回调函数"""
+        self.status_callback = callback
+
+    def _update_status(self, message, progress=None):
+        """更新处理状态"""
+        if self.status_callback:
+            self.status_callback(message, progress)
+
+    def is_compressible(self, file_path):
+        """
+        抽样估算文件是否值得压缩
+
+        从文件头、中间和尾部均匀抽取若干块，用最快的压缩级别试压，
+        节省比例低于 min_saving 时认为不可压缩。
+
+        Args:
+            file_path: 文件路径
+
+        Returns:
+            bool: 是否值得使用DEFLATE压缩
+        """
+        try:
+            file_size = os.path.getsize(file_path)
+            if file_size == 0:
+                return False
+
+            if file_size <= self.sample_size * self.sample_count:
+                offsets = [0]
+                read_size = file_size
+            else:
+                step = (file_size - self.sample_size) // max(self.sample_count - 1, 1)
+                offsets = [i * step for i in range(self.sample_count)]
+                read_size = self.sample_size
+
+            raw_bytes = 0
+            compressed_bytes = 0
+            with open(file_path, 'rb') as f:
+                for offset in offsets:
+                    f.seek(offset)
+                    chunk = f.read(read_size)
+                    raw_bytes += len(chunk)
+                    compressed_bytes += len(zlib.compress(chunk, 1))
+
+            return compressed_bytes < raw_bytes * (1 - self.min_saving)
+        except OSError:
+            return False
+
+    def choose_compress_type(self, file_path):
+        """为单个成员选择压缩方式"""
+        if self.mode == self.MODE_STORED:
+            return zipfile.ZIP_STORED
+        if self.mode == self.MODE_DEFLATED:
+            return zipfile.ZIP_DEFLATED
+        return zipfile.ZIP_DEFLATED if self.is_compressible(file_path) else zipfile.ZIP_STORED
+
+    def create_package(self, members, output_zip_path):
+        """
+        将文件打包成ZIP
+
+        Args:
+            members: 文件路径列表，或 (文件路径, 包内名称) 元组列表
+            output_zip_path: 输出ZIP文件路径
+
+        Returns:
+            bool: 是否成功打包
+        """
+        entries = self._resolve_entries(members)
+        if not entries:
+            self._update_status("没有可打包的文件")
+            return False
+
+        # 抽样估算可压缩性需要读取文件，在线程池中并行进行；压缩和写入在当前线程中按顺序进行
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            compress_types = list(executor.map(self.choose_compress_type, [path for path, _ in entries]))
+        stored_count = compress_types.count(zipfile.ZIP_STORED)
+        self._update_status(f"打包 {len(entries)} 个文件（直接存储 {stored_count} 个）")
+
+        with zipfile.ZipFile(output_zip_path, 'w', zipfile.ZIP_STORED) as zipf:
+            for index, ((file_path, arcname), compress_type) in enumerate(zip(entries, compress_types)):
+                zipf.write(file_path, arcname, compress_type=compress_type, compresslevel=self.compress_level)
+
+                progress = (index + 1) / len(entries) * 100
+                self._update_status(f"打包文件: {arcname}", progress)
+
+        return os.path.exists(output_zip_path) and os.path.getsize(output_zip_path) > 0
+
+    @staticmethod
+    def _resolve_entries(members):
+        """整理成员列表为 (文件路径, 包内名称)，忽略不存在的文件"""
+        entries = []
+        for member in members:
+            if isinstance(member, (tuple, list)):
+                file_path, arcname = member
+            else:
+                file_path, arcname = member, Path(member).name
+            if os.path.exists(file_path):
+                entries.append((file_path, arcname))
+        return entries
+
+
+
+@functools.lru_cache(maxsize=1024)
+def _file_crc(path, size, mtime_ns):
+    """计算文件的CRC32（按路径、大小和修改时间缓存，文件变化后重新计算）"""
+    crc = 0
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(1024 * 1024)
+            if not chunk:
+                break
+            crc = zlib.crc32(chunk, crc)
+    return crc
+
+
+class ZipStream(io.RawIOBase):
+    """
+    按需生成的ZIP文件（只读、可seek，不在磁盘上生成ZIP）
+
+    成员全部直接存储（ZIP_STORED），每个部分的位置和总长度在读取前就能确定，
+    发送时可以设置Content-Length、ETag并支持Range请求。
+    成员的CRC写在数据之后的数据描述符中，顺序读取时边读边计算；
+    Range请求跳过的成员在需要其CRC时（数据描述符、中央目录）单独读取文件计算。
+    """
+
+    # 超过该值的大小和偏移使用ZIP64扩展字段
+    ZIP64_LIMIT = 0xFFFFFFFF
+    ZIP64_COUNT_LIMIT = 0xFFFF
+
+    _PART_HEADER = 'header'
+    _PART_DATA = 'data'
+    _PART_DESCRIPTOR = 'descriptor'
+    _PART_CENTRAL = 'central'
+
+    def __init__(self, members):
+        """
+        Args:
+            members: 文件路径列表，或 (文件路径, 包内名称) 元组列表（不存在的文件被忽略）
+        """
+        super().__init__()
+        self.members = []
+        for file_path, arcname in ZipPackager._resolve_entries(members):
+            stat = os.stat(file_path)
+            self.members.append({
+                'path': file_path,
+                'arcname': arcname,
+                'size': stat.st_size,
+                'mtime': stat.st_mtime,
+                'mtime_ns': stat.st_mtime_ns
+            })
+
+        self._crcs = {}
+        self._running_crc = None  # (成员序号, 已读取的字节数, CRC)
+        self._file = None
+        self._file_index = None
+        self._central = None
+        self._pos = 0
+
+        # 各部分 (偏移, 长度, 类型, 成员序号或数据)
+        self._parts = []
+        offset = 0
+        for index, member in enumerate(self.members):
+            member['offset'] = offset
+            header = self._local_header(member)
+            for kind, length, data in (
+                (self._PART_HEADER, len(header), header),
+                (self._PART_DATA, member['size'], index),
+                (self._PART_DESCRIPTOR, 24 if self._is_zip64(member) else 16, index)
+            ):
+                self._parts.append((offset, length, kind, data))
+                offset += length
+        self._central_offset = offset
+        central_length = sum(46 + len(self._encode_name(m)[0]) + len(self._central_extra(m)) for m in self.members)
+        central_length += 22 + (56 + 20 if self._needs_zip64_end(offset, central_length) else 0)
+        self._parts.append((offset, central_length, self._PART_CENTRAL, None))
+        self.size = offset + central_length
+        self._offsets = [part[0] for part in self._parts]
+
+        self.last_modified = max((m['mtime'] for m in self.members), default=time.time())
+        digest = hashlib.sha1()
+        for member in self.members:
+            digest.update(f"{member['arcname']}\0{member['size']}\0{member['mtime_ns']}\0".encode('utf-8'))
+        self.etag = digest.hexdigest()
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._pos
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self._pos
+        elif whence == io.SEEK_END:
+            offset += self.size
+        if offset < 0:
+            raise ValueError('negative seek position')
+        self._pos = offset
+        return self._pos
+
+    def readinto(self, buffer):
+        if self._pos >= self.size or not len(buffer):
+            return 0
+        part_index = bisect.bisect_right(self._offsets, self._pos) - 1
+        offset, length, kind, data = self._parts[part_index]
+        skip = self._pos - offset
+        count = min(len(buffer), length - skip)
+
+        if kind == self._PART_DATA:
+            chunk = self._read_member(data, skip, count)
+        elif kind == self._PART_HEADER:
+            chunk = data[skip:skip + count]
+        elif kind == self._PART_DESCRIPTOR:
+            chunk = self._descriptor(self.members[data], self._crc(data))[skip:skip + count]
+        else:
+            if self._central is None:
+                self._central = self._central_directory()
+            chunk = self._central[skip:skip + count]
+
+        buffer[:len(chunk)] = chunk
+        self._pos += len(chunk)
+        return len(chunk)
+
+    def close(self):
+        if self._file:
+            self._file.close()
+            self._file = None
+        super().close()
+
+    def _read_member(self, index, skip, count):
+        """读取成员数据，从头顺序读取时同时计算CRC"""
+        member = self.members[index]
+        if self._file_index != index:
+            if self._file:
+                self._file.close()
+            self._file = open(member['path'], 'rb')
+            self._file_index = index
+        if self._file.tell() != skip:
+            self._file.seek(skip)
+        chunk = self._file.read(count)
+        if len(chunk) != count:
+            raise IOError(f"打包过程中文件被修改: {member['path']}")
+
+        running = self._running_crc
+        if running and running[0] == index and running[1] == skip:
+            crc = zlib.crc32(chunk, running[2])
+        elif skip == 0:
+            crc = zlib.crc32(chunk)
+        else:
+            self._running_crc = None
+            return chunk
+        if skip + count == member['size']:
+            self._crcs[index] = crc
+            self._running_crc = None
+        else:
+            self._running_crc = (index, skip + count, crc)
+        return chunk
+
+    def _crc(self, index):
+        if index not in self._crcs:
+            member = self.members[index]
+            self._crcs[index] = _file_crc(member['path'], member['size'], member['mtime_ns'])
+        return self._crcs[index]
+
+    def _is_zip64(self, member):
+        return member['size'] >= self.ZIP64_LIMIT
+
+    def _needs_zip64_end(self, central_offset, central_length):
+        return (len(self.members) >= self.ZIP64_COUNT_LIMIT
+                or central_offset >= self.ZIP64_LIMIT or central_length >= self.ZIP64_LIMIT)
+
+    @staticmethod
+    def _encode_name(member):
+        """包内名称编码（非ASCII名称使用UTF-8并设置标志位）"""
+        try:
+            return member['arcname'].encode('ascii'), 0
+        except UnicodeEncodeError:
+            return member['arcname'].encode('utf-8'), 0x800
+
+    @staticmethod
+    def _dos_time(mtime):
+        year, month, day, hour, minute, second = time.localtime(mtime)[:6]
+        if year < 1980:
+            year, month, day, hour, minute, second = 1980, 1, 1, 0, 0, 0
+        return (hour << 11) | (minute << 5) | (second // 2), ((year - 1980) << 9) | (month << 5) | day
+
+    def _local_header(self, member):
+        name, name_flag = self._encode_name(member)
+        dos_time, dos_date = self._dos_time(member['mtime'])
+        # 数据描述符标志：CRC在数据之后给出
+        flags = 0x08 | name_flag
+        if self._is_zip64(member):
+            version, size_field = 45, 0xFFFFFFFF
+            extra = struct.pack('<HHQQ', 1, 16, member['size'], member['size'])
+        else:
+            version, size_field, extra = 20, member['size'], b''
+        return struct.pack(
+            '<4s2B4HL2L2H', b'PK\x03\x04', version, 0, flags, zipfile.ZIP_STORED,
+            dos_time, dos_date, 0, size_field, size_field, len(name), len(extra)
+        ) + name + extra
+
+    def _descriptor(self, member, crc):
+        if self._is_zip64(member):
+            return struct.pack('<4sLQQ', b'PK\x07\x08', crc, member['size'], member['size'])
+        return struct.pack('<4sLLL', b'PK\x07\x08', crc, member['size'], member['size'])
+
+    def _central_extra(self, member):
+        values = []
+        if self._is_zip64(member):
+            values += [member['size'], member['size']]
+        if member['offset'] >= self.ZIP64_LIMIT:
+            values.append(member['offset'])
+        if not values:
+            return b''
+        return struct.pack(f'<HH{len(values)}Q', 1, 8 * len(values), *values)
+
+    def _central_directory(self):
+        """中央目录和目录结束记录（需要所有成员的CRC）"""
+        records = []
+        for index, member in enumerate(self.members):
+            name, name_flag = self._encode_name(member)
+            dos_time, dos_date = self._dos_time(member['mtime'])
+            extra = self._central_extra(member)
+            size_field = 0xFFFFFFFF if self._is_zip64(member) else member['size']
+            offset_field = 0xFFFFFFFF if member['offset'] >= self.ZIP64_LIMIT else member['offset']
+            version = 45 if extra else 20
+            records.append(struct.pack(
+                '<4s4B4HL2L5H2L', b'PK\x01\x02', version, 3, version, 0, 0x08 | name_flag,
+                zipfile.ZIP_STORED, dos_time, dos_date, self._crc(index), size_field, size_field,
+                len(name), len(extra), 0, 0, 0, 0o100644 << 16, offset_field
+            ) + name + extra)
+        central = b''.join(records)
+
+        count = len(self.members)
+        end = b''
+        if self._needs_zip64_end(self._central_offset, len(central)):
+            zip64_end_offset = self._central_offset + len(central)
+            end += struct.pack(
+                '<4sQ2H2L4Q', b'PK\x06\x06', 44, 45, 45, 0, 0,
+                count, count, len(central), self._central_offset
+            )
+            end += struct.pack('<4sLQL', b'PK\x06\x07', 0, zip64_end_offset, 1)
+        end += struct.pack(
+            '<4s4H2LH', b'PK\x05\x06', 0, 0,
+            min(count, 0xFFFF), min(count, 0xFFFF),
+            min(len(central), 0xFFFFFFFF), min(self._central_offset, 0xFFFFFFFF), 0
+        )
+        return central + end
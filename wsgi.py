@@ -0,0 +1,16 @@
+"""
+生产环境WSGI入口
+
+用法: gunicorn -c gunicorn.conf.py wsgi:application
+（或 python run.py --production）
+
+主进程导入本模块时预加载图片编解码器和压缩库，并导入Flask应用；
+gunicorn fork出的工作进程直接共享这些已加载的模块。
+"""
+from utils.worker_lifecycle import preload_codecs
+from utils.file_utils import FileUtils
+
+preload_codecs()
+FileUtils.create_directories()
+
+from app import app as application  # noqa: E402